@@ -1,14 +1,21 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory, send_file
+from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory, send_file, make_response, stream_with_context
 from functools import wraps
 from datetime import timedelta
+import hashlib
+import codecs
 from dotenv import load_dotenv
+from sqlalchemy.orm import joinedload
 import os
 import time
-import re
 
-from models import db, Niveau, Chapitre, Question, QuestionsATrous
-from services import QCMService
-from mathml_utils import mathml_filter, mathml_clean_filter, generate_mathml_examples, clean_display_filter
+from models import db, Niveau, Chapitre, Question, QuestionsATrous, CompteurQuestions, mettre_a_jour_schema
+from services import QCMService, catalogue_cache, CHAMPS_QUESTIONS_ADMIN
+from recherche import mots_recherche
+from cache import CachePages
+from import_export import importer_questions, ErreurImport, TAILLE_LOT, EXPORTS, MODELES_IMPORT
+from sql_profiler import init_sql_profiler
+from session_store import init_sessions
+from mathml_utils import mathml_filter, mathml_clean_filter, generate_mathml_examples, clean_display_filter, configurer_cache_mathml, configurer_limites_mathml, strip_paragraphs, statistiques_cache_mathml, statistiques_garde_mathml
 
 app = Flask(__name__, static_folder='static')
 
@@ -23,34 +30,42 @@ app.secret_key = os.getenv('SECRET_KEY', 'fallback_secret_key_for_development')
 # Configuration SQLAlchemy
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///qcm_database.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Intervalle (secondes) de relecture de la version du catalogue écrite par les autres processus
+app.config['CATALOGUE_CACHE_VERIFICATION'] = float(os.getenv('CATALOGUE_CACHE_VERIFICATION', 5))
 
 # Initialiser SQLAlchemy
 db.init_app(app)
+catalogue_cache.intervalle_verification = app.config['CATALOGUE_CACHE_VERIFICATION']
+
+# Cache des pages publiques rendues (PAGE_CACHE=1 pour l'activer) : durée de vie et taille maximale
+app.config['PAGE_CACHE'] = os.getenv('PAGE_CACHE', '0') == '1'
+app.config['PAGE_CACHE_TTL'] = float(os.getenv('PAGE_CACHE_TTL', 60))
+app.config['PAGE_CACHE_MAX_MB'] = float(os.getenv('PAGE_CACHE_MAX_MB', 32))
+cache_pages = CachePages(ttl=app.config['PAGE_CACHE_TTL'],
+                         taille_max=int(app.config['PAGE_CACHE_MAX_MB'] * 1024 * 1024))
+
+# Nombre maximal de rendus MathML gardés en mémoire par les filtres Jinja2 (0 : pas de cache)
+app.config['MATHML_CACHE_SIZE'] = int(os.getenv('MATHML_CACHE_SIZE', 2048))
+configurer_cache_mathml(app.config['MATHML_CACHE_SIZE'])
+
+# Limites d'analyse des expressions [math:...] : au-delà, l'expression est affichée en texte
+app.config['MATHML_MAX_LENGTH'] = int(os.getenv('MATHML_MAX_LENGTH', 5000))
+app.config['MATHML_MAX_DEPTH'] = int(os.getenv('MATHML_MAX_DEPTH', 50))
+app.config['MATHML_MAX_NODES'] = int(os.getenv('MATHML_MAX_NODES', 5000))
+configurer_limites_mathml(app.config['MATHML_MAX_LENGTH'], app.config['MATHML_MAX_DEPTH'],
+                          app.config['MATHML_MAX_NODES'])
+
+# Instrumentation SQL optionnelle (SQL_PROFILING=1) : en-tête Server-Timing et journal des requêtes lentes
+init_sql_profiler(app)
 
 # Configuration pour la persistance des sessions
 app.permanent_session_lifetime = timedelta(days=30)  # Session valide 30 jours
+# Sessions stockées côté serveur (SESSION_BACKEND=sqlite|filesystem|cookie) : le cookie ne contient qu'un identifiant
+init_sessions(app)
 
 ADMIN_PWD = os.getenv('ADMIN_PWD')
 QCM_ADMIN_PWD = os.getenv('QCM_ADMIN_PWD')
 
-# Fonction utilitaire pour retirer <p> et <br> en début/fin
-def strip_paragraphs(text):
-    if not text:
-        return text
-    text = str(text).strip()
-    # Retirer <p>...</p> encadrant tout
-    text = re.sub(r'^\s*<p[^>]*>(.*)</p>\s*$', r'\1', text, flags=re.DOTALL | re.IGNORECASE)
-    # Retirer balises vides en début/fin
-    text = re.sub(r'^(<p>\s*</p>\s*)+', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'(<p>\s*</p>\s*)+$', '', text, flags=re.IGNORECASE)
-    # Retirer <br> en début/fin (boucle pour cas résiduels)
-    prev = None
-    while prev != text:
-        prev = text
-        text = re.sub(r'^(<br\s*/?>\s*)+', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'(<br\s*/?>\s*)+$', '', text, flags=re.IGNORECASE)
-    return text.strip()
-
 # Fonction utilitaire pour nettoyer un tableau d'options
 def clean_options(options):
     return [strip_paragraphs(opt) if opt is not None else '' for opt in options]
@@ -145,11 +160,115 @@ def ressources_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+
+def empreinte_deploiement():
+    """Empreinte du code et des templates déployés : une mise à jour change tous les ETag"""
+    racine = os.path.dirname(os.path.abspath(__file__))
+    empreinte = hashlib.sha1()
+    for dossier in (racine, os.path.join(racine, 'templates')):
+        for nom in sorted(os.listdir(dossier)):
+            if nom.endswith(('.py', '.html')):
+                empreinte.update(f"{nom}:{os.path.getmtime(os.path.join(dossier, nom))}".encode())
+    return empreinte.hexdigest()[:12]
+
+app.config['ETAG_BUILD'] = os.getenv('ETAG_BUILD') or empreinte_deploiement()
+
+def page_personnalisee():
+    """Vrai si la page rendue dépend de la session (tests en cours, accès admin, messages flash)"""
+    return ('_flashes' in session or session.get('admin_access') or session.get('qcm_admin_access')
+            or any(cle.startswith('progress_') for cle in session.keys()))
+
+def messages_en_attente():
+    """Vrai si des messages flash attendent d'être affichés par la page"""
+    return '_flashes' in session
+
+def etag_catalogue(personnalisable=False):
+    """
+    Décorateur : ETag fort dérivé de la version du catalogue. Tant que le catalogue
+    n'a pas changé, une requête avec If-None-Match reçoit 304 sans exécuter la vue.
+    personnalisable : la page dépend de la session ; pas d'ETag si page_personnalisee().
+    """
+    def decorateur(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if personnalisable and page_personnalisee():
+                return f(*args, **kwargs)
+
+            etag = hashlib.sha1(
+                f"{catalogue_cache.version}|{app.config['ETAG_BUILD']}|{request.full_path}".encode()
+            ).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            # Toujours revalider : la réponse change dès la prochaine écriture du catalogue
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorateur
+
+def cle_page():
+    """Clé d'une page dans cache_pages : vue et paramètres d'URL"""
+    return request.endpoint, tuple(sorted((request.view_args or {}).items()))
+
+def cache_page(personnalisee=page_personnalisee):
+    """
+    Décorateur : quand PAGE_CACHE est activé, sert la page déjà rendue pour la même
+    version du catalogue sans exécuter la vue. La page est rendue normalement si
+    personnalisee() est vrai, et n'est gardée que si la vue renvoie 200 sans toucher
+    à la session. À placer sous les décorateurs de contrôle d'accès.
+    """
+    def decorateur(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not app.config['PAGE_CACHE'] or personnalisee():
+                return f(*args, **kwargs)
+
+            cle = cle_page()
+            version = catalogue_cache.version
+            page = cache_pages.get(cle, version)
+            if page is not None:
+                corps, entetes = page
+                return app.response_class(corps, headers=entetes)
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough and not session.modified:
+                corps = response.get_data()
+                entetes = [(nom, valeur) for nom, valeur in response.headers
+                           if nom.lower() not in ('set-cookie', 'content-length')]
+                cache_pages.set(cle, version, (corps, entetes), len(corps))
+            return response
+        return decorated_function
+    return decorateur
+
+def rendu_en_cache(rendu):
+    """
+    Rendu HTML de la page courante, pris dans cache_pages quand PAGE_CACHE est activé.
+    Pour les vues qui modifient la session : elles s'exécutent toujours, seul le rendu
+    du template (fonction `rendu`, qui ne doit dépendre que de l'URL) est gardé.
+    """
+    if not app.config['PAGE_CACHE'] or messages_en_attente():
+        return rendu()
+
+    cle = cle_page()
+    version = catalogue_cache.version
+    html = cache_pages.get(cle, version)
+    if html is None:
+        html = rendu()
+        cache_pages.set(cle, version, html, len(html))
+    return html
+
 def initialiser_base_donnees():
     """Initialise la base de données SQLAlchemy"""
     with app.app_context():
-        # Créer les tables
-        db.create_all()
+        # Créer les tables, et ajouter colonnes et index manquants d'une base existante
+        for changement in mettre_a_jour_schema():
+            print(f"🔧 {changement}")
 
         # Vérifier si des données existent déjà
         if Niveau.query.count() == 0:
@@ -157,6 +276,12 @@ def initialiser_base_donnees():
             QCMService.initialiser_donnees_test()
             print("✅ Données de test créées")
 
+        # Base antérieure aux compteurs de questions : les calculer une fois
+        if CompteurQuestions.query.first() is None and (Question.query.first() or QuestionsATrous.query.first()):
+            nb_compteurs = CompteurQuestions.reconstruire()
+            QCMService.valider_catalogue()
+            print(f"🔧 Compteurs de questions calculés ({nb_compteurs} lignes)")
+
         return True
 
 # Initialiser la base au démarrage
@@ -176,6 +301,7 @@ with app.app_context():
         exit(1)
 
 @app.route('/')
+@cache_page()
 def index():
     return render_template('index.html')
 
@@ -195,8 +321,9 @@ def choisir_niveau(niveau):
     session['niveau'] = niveau
     session['score'] = 0
     session['question_courante'] = 0
+    # Tentative compacte : id de la question et option choisie, indexés par position
+    session['question_ids'] = []
     session['reponses'] = []
-    session['reponses_dict'] = {}  # Nouveau dictionnaire pour navigation libre
     session.pop('mode', None)
     session.pop('chapitre', None)
 
@@ -207,21 +334,22 @@ def choisir_niveau(niveau):
 
     # Servir directement la première question au lieu de rediriger
     # Cela permet à Google d'indexer correctement la page
-    questions_niveau = QCMService.get_questions_niveau(niveau)
-    if not questions_niveau:
+    total_questions = QCMService.compter_questions(niveau)
+    if not total_questions:
         flash('Aucune question disponible pour ce niveau')
         return redirect(url_for('index'))
 
     # Afficher la première question directement
-    question = questions_niveau[0]
+    question = QCMService.get_question_position(niveau, 0)
     contexte = f"Niveau {niveau.upper()}"
 
-    return render_template('question.html',
-                         question=question,
-                         question_num=1,
-                         total_questions=len(questions_niveau),
-                         niveau=niveau,
-                         contexte=contexte)
+    # Le rendu ne dépend que du niveau : la session vient d'être réinitialisée
+    return rendu_en_cache(lambda: render_template('question.html',
+                                                  question=question,
+                                                  question_num=1,
+                                                  total_questions=total_questions,
+                                                  niveau=niveau,
+                                                  contexte=contexte))
 
 @app.route('/question')
 def question():
@@ -231,24 +359,25 @@ def question():
     niveau = session['niveau']
     question_num = session['question_courante']
 
-    # Déterminer les questions à utiliser (niveau complet ou chapitre spécifique)
+    # Déterminer la portée des questions (niveau complet ou chapitre spécifique)
     if session.get('mode') == 'chapitre' and 'chapitre' in session:
         chapitre = session['chapitre']
-        questions_niveau = QCMService.get_questions_chapitre(niveau, chapitre)
         chapitre_info = QCMService.get_chapitre_info(niveau, chapitre)
         contexte = f"Chapitre : {chapitre_info['titre']} ({niveau.upper()})"
     else:
-        questions_niveau = QCMService.get_questions_niveau(niveau)
+        chapitre = None
         contexte = f"Niveau {niveau.upper()}"
 
-    if question_num >= len(questions_niveau):
+    # Seule la question courante est chargée, quel que soit le nombre de questions
+    total_questions = QCMService.compter_questions(niveau, chapitre)
+    question = QCMService.get_question_position(niveau, question_num, chapitre)
+    if question is None:
         return redirect(url_for('resultats'))
 
-    question = questions_niveau[question_num]
     return render_template('question.html',
                          question=question,
                          question_num=question_num + 1,
-                         total_questions=len(questions_niveau),
+                         total_questions=total_questions,
                          niveau=niveau,
                          contexte=contexte)
 
@@ -271,41 +400,32 @@ def repondre():
     niveau = session['niveau']
     question_num = session['question_courante']
 
-    # Déterminer les questions à utiliser
+    # Déterminer la question à laquelle l'utilisateur répond
     if session.get('mode') == 'chapitre' and 'chapitre' in session:
         chapitre = session['chapitre']
-        questions_niveau = QCMService.get_questions_chapitre(niveau, chapitre)
     else:
-        questions_niveau = QCMService.get_questions_niveau(niveau)
+        chapitre = None
 
-    question = questions_niveau[question_num]
+    question = QCMService.get_question_position(niveau, question_num, chapitre)
+    if question is None:
+        return redirect(url_for('resultats'))
 
     reponse_utilisateur = int(request.form.get('reponse', -1))
     # Validation : s'assurer que la réponse est dans le range 0-3
     if not (0 <= reponse_utilisateur <= 3):
         reponse_utilisateur = -1  # Valeur invalide
-    est_correcte = reponse_utilisateur == question['reponse_correcte']
-
-    # Initialiser le dictionnaire de réponses s'il n'existe pas
-    if 'reponses_dict' not in session:
-        session['reponses_dict'] = {}
-
-    # Sauvegarder la réponse avec l'index de la question comme clé
-    session['reponses_dict'][str(question_num)] = {
-        'question': question,
-        'reponse_utilisateur': reponse_utilisateur,
-        'correcte': est_correcte
-    }
-
-    # Recalculer le score total basé sur toutes les réponses données
-    session['score'] = sum(1 for rep in session['reponses_dict'].values() if rep['correcte'])
 
-    # Reconstruire la liste des réponses pour compatibilité avec les résultats
-    session['reponses'] = []
-    for i in range(len(questions_niveau)):
-        if str(i) in session['reponses_dict']:
-            session['reponses'].append(session['reponses_dict'][str(i)])
-        # Supprimer le break pour inclure toutes les réponses, même non consécutives
+    # Enregistrer l'option choisie à la position de la question (navigation libre :
+    # les positions non répondues restent à None)
+    question_ids = session.get('question_ids') or []
+    reponses = session.get('reponses') or []
+    for positions in (question_ids, reponses):
+        if len(positions) <= question_num:
+            positions.extend([None] * (question_num + 1 - len(positions)))
+    question_ids[question_num] = question['id']
+    reponses[question_num] = reponse_utilisateur
+    session['question_ids'] = question_ids
+    session['reponses'] = reponses
 
     session['question_courante'] += 1
 
@@ -317,12 +437,21 @@ def resultats():
         return redirect(url_for('index'))
 
     niveau = session['niveau']
-    score = session['score']
-    reponses = session['reponses']
-
-    # Recalculer la correction basée sur les données actuelles de la DB
-    for rep in reponses:
-        rep['correcte'] = rep['reponse_utilisateur'] == rep['question']['reponse_correcte']
+    question_ids = session.get('question_ids') or []
+    choix = session.get('reponses') or []
+
+    # Recharger les questions répondues en une requête et corriger avec les données actuelles de la DB
+    questions = QCMService.get_questions_par_ids([qid for qid in question_ids if qid is not None])
+    reponses = []
+    for question_id, reponse_utilisateur in zip(question_ids, choix):
+        question = questions.get(question_id)
+        if question is None or reponse_utilisateur is None:
+            continue
+        reponses.append({
+            'question': question,
+            'reponse_utilisateur': reponse_utilisateur,
+            'correcte': reponse_utilisateur == question['reponse_correcte']
+        })
 
     # Recalculer le score
     score = sum(1 for rep in reponses if rep['correcte'])
@@ -336,8 +465,7 @@ def resultats():
         contexte = f"{chapitre_info['titre']} ({niveau.upper()})"
         type_test = 'chapitre'
     else:
-        questions_niveau = QCMService.get_questions_niveau(niveau)
-        total_questions = len(questions_niveau)
+        total_questions = QCMService.compter_questions(niveau)
         contexte = f"Niveau {niveau.upper()}"
         type_test = 'niveau'
 
@@ -362,6 +490,7 @@ def recommencer():
     session.pop('niveau', None)
     session.pop('score', None)
     session.pop('question_courante', None)
+    session.pop('question_ids', None)
     session.pop('reponses', None)
     session.pop('mode', None)
     session.pop('chapitre', None)
@@ -445,6 +574,7 @@ def telecharger_pdf_3eme():
 @app.route('/ressources')
 @login_required
 @ressources_required
+@cache_page(personnalisee=messages_en_attente)
 def ressources():
     """Page listant les ressources disponibles"""
     return render_template('ressources.html')
@@ -503,50 +633,98 @@ def admin():
 @app.route('/admin/api/questions')
 @login_required
 @qcm_admin_required
+@etag_catalogue()
 def admin_api_questions():
-    """API pour récupérer toutes les questions avec filtres optionnels"""
-    niveau = request.args.get('niveau')
-    chapitre = request.args.get('chapitre')
-
-    # Récupérer toutes les questions
-    questions = db.session.query(Question).join(Chapitre).join(Niveau)
-
-    # Appliquer les filtres si spécifiés
-    if niveau:
-        questions = questions.filter(Niveau.nom == niveau)
-    if chapitre:
-        questions = questions.filter(Chapitre.nom == chapitre)
-
-    questions = questions.all()
+    """
+    API paginée des questions : filtres niveau, chapitre et difficulte, pagination
+    par curseur (limit, cursor = dernier id reçu) et choix des champs (fields=id,probleme,...).
+    q : recherche plein texte, résultats triés par pertinence et paginés par décalage
+    (offset = decalage_suivant reçu)
+    """
+    niveau = request.args.get('niveau') or None
+    chapitre = request.args.get('chapitre') or None
+    difficulte = request.args.get('difficulte') or None
+    recherche = request.args.get('q', '').strip() or None
 
-    # Formater les données pour l'API
-    result = []
-    for question in questions:
-        result.append({
-            'id': question.id,
-            'probleme': question.probleme,
-            'options': question.options,
-            'reponse_correcte': question.reponse_correcte,
-            'explication': question.explication,
-            'difficulte': question.difficulte,
-            'chapitre_id': question.chapitre_id,
-            'chapitre_nom': question.chapitre.nom,
-            'chapitre_titre': question.chapitre.titre,
-            'niveau_nom': question.chapitre.niveau.nom
-        })
+    try:
+        limite = int(request.args.get('limit', 100))
+        curseur = request.args.get('cursor')
+        apres_id = int(curseur) if curseur else None
+        decalage = max(int(request.args.get('offset') or 0), 0)
+    except ValueError:
+        return {'success': False, 'error': 'Paramètres limit, cursor ou offset invalides'}, 400
+    if not 1 <= limite <= 500:
+        return {'success': False, 'error': 'limit doit être compris entre 1 et 500'}, 400
+    if mots_recherche(recherche):
+        if apres_id is not None:
+            return {'success': False, 'error': 'Une recherche se pagine avec offset, pas cursor'}, 400
+    elif decalage:
+        return {'success': False, 'error': 'offset ne s\'applique qu\'à une recherche (q) : utiliser cursor'}, 400
+
+    champs = [champ for champ in request.args.get('fields', '').split(',') if champ]
+    inconnus = [champ for champ in champs if champ not in CHAMPS_QUESTIONS_ADMIN]
+    if inconnus:
+        return {'success': False, 'error': f"Champs inconnus : {', '.join(inconnus)}"}, 400
+
+    questions, curseur_suivant, decalage_suivant = QCMService.lister_questions_admin(
+        niveau, chapitre, difficulte, apres_id=apres_id, limite=limite, champs=champs,
+        recherche=recherche, decalage=decalage
+    )
+
+    return {
+        'questions': questions,
+        'curseur_suivant': curseur_suivant,
+        'decalage_suivant': decalage_suivant,
+        'total': QCMService.compter_questions_admin(niveau, chapitre, difficulte, recherche) or 0
+    }
 
-    return {'questions': result}
+@app.route('/admin/api/questions_trous')
+@login_required
+@qcm_admin_required
+@etag_catalogue()
+def admin_api_questions_trous():
+    """Recherche dans les questions à trous : q, niveau, chapitre, limit et cursor (décalage)"""
+    try:
+        limite = int(request.args.get('limit', 50))
+        decalage = max(int(request.args.get('cursor') or 0), 0)
+    except ValueError:
+        return {'success': False, 'error': 'Paramètres limit ou cursor invalides'}, 400
+    if not 1 <= limite <= 500:
+        return {'success': False, 'error': 'limit doit être compris entre 1 et 500'}, 400
+
+    questions, total, curseur_suivant = QCMService.rechercher_questions_trous(
+        request.args.get('q', '').strip(),
+        request.args.get('niveau') or None,
+        request.args.get('chapitre') or None,
+        decalage=decalage, limite=limite
+    )
+    return {'questions': questions, 'curseur_suivant': curseur_suivant, 'total': total}
 
 @app.route('/admin/api/statistiques')
 @login_required
 @qcm_admin_required
+@etag_catalogue()
 def admin_api_statistiques():
     """API pour récupérer les statistiques"""
     return QCMService.get_statistiques()
 
+@app.route('/admin/api/statistiques/mathml')
+@login_required
+@qcm_admin_required
+def admin_api_statistiques_mathml():
+    """
+    Compteurs du rendu MathML du processus qui répond, depuis son démarrage : cache des
+    rendus et expressions [math:...] refusées par les limites d'analyse
+    """
+    response = make_response({'cache': statistiques_cache_mathml(), 'limites': statistiques_garde_mathml()})
+    # Compteurs vivants : pas d'ETag ni de mise en cache
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @app.route('/admin/api/chapitres/<niveau>')
 @login_required
 @qcm_admin_required
+@etag_catalogue()
 def admin_api_chapitres(niveau):
     """API pour récupérer les chapitres d'un niveau"""
     chapitres = QCMService.get_chapitres_par_niveau(niveau)
@@ -590,6 +768,53 @@ def admin_api_ajouter_question():
     except Exception as e:
         return {'success': False, 'error': str(e)}, 400
 
+@app.route('/admin/api/import', methods=['POST'])
+@login_required
+@qcm_admin_required
+def admin_api_importer():
+    """
+    Import en masse : corps de la requête (ou fichier envoyé dans le champ « fichier »)
+    au format NDJSON ou tableau JSON, lu au fil de l'eau. Paramètre lot : lignes par INSERT.
+    """
+    try:
+        taille_lot = int(request.args.get('lot', TAILLE_LOT))
+    except ValueError:
+        return {'success': False, 'error': 'Paramètre lot invalide'}, 400
+    if not 1 <= taille_lot <= 10000:
+        return {'success': False, 'error': 'lot doit être compris entre 1 et 10000'}, 400
+
+    fichier = request.files.get('fichier')
+    flux = codecs.getreader('utf-8-sig')(fichier.stream if fichier else request.stream)
+    try:
+        rapport = importer_questions(flux, taille_lot)
+    except (ErreurImport, UnicodeDecodeError) as e:
+        return {'success': False, 'error': f"Import annulé : {e}"}, 400
+
+    return {'success': True, **rapport.to_dict()}
+
+@app.route('/admin/api/export')
+@login_required
+@qcm_admin_required
+def admin_api_exporter():
+    """
+    Export du catalogue au fil de l'eau, réimportable par /admin/api/import :
+    format=ndjson (par défaut) ou csv, type=qcm, trous ou qcm,trous (par défaut)
+    """
+    format_export = request.args.get('format', 'ndjson')
+    if format_export not in EXPORTS:
+        return {'success': False, 'error': f"Format inconnu : {format_export}"}, 400
+    types = [type_question for type_question in request.args.get('type', '').split(',') if type_question]
+    inconnus = [type_question for type_question in types if type_question not in MODELES_IMPORT]
+    if inconnus:
+        return {'success': False, 'error': f"Types inconnus : {', '.join(inconnus)}"}, 400
+
+    exporter, mimetype = EXPORTS[format_export]
+    return app.response_class(
+        stream_with_context(exporter(types)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=catalogue.{format_export}'}
+    )
+
 @app.route('/admin/api/question/<int:question_id>', methods=['PUT'])
 @login_required
 @qcm_admin_required
@@ -627,7 +852,9 @@ def admin_api_modifier_question(question_id):
 def admin_api_get_question(question_id):
     """API pour récupérer une question spécifique"""
     try:
-        question = Question.query.get(question_id)
+        question = Question.query.options(
+            joinedload(Question.chapitre).joinedload(Chapitre.niveau)
+        ).get(question_id)
 
         if not question:
             return {'success': False, 'error': 'Question non trouvée'}, 404
@@ -683,6 +910,7 @@ def choisir_chapitre_niveau(niveau, chapitre):
     session['niveau'] = niveau
     session['score'] = 0
     session['question_courante'] = 0
+    session['question_ids'] = []
     session['reponses'] = []
 
     # Restaurer l'authentification des ressources
@@ -703,6 +931,8 @@ def chapitres():
     return redirect(url_for('chapitres_niveau', niveau='6eme'))
 
 @app.route('/chapitres/<niveau>')
+@etag_catalogue(personnalisable=True)
+@cache_page()
 def chapitres_niveau(niveau):
     """Page de sélection des chapitres pour un niveau donné"""
     # Récupérer les chapitres du niveau
@@ -730,11 +960,6 @@ def chapitres_niveau(niveau):
 @app.route('/question_trous/<int:question_id>', methods=['GET', 'POST'])
 def repondre_question_trous(question_id):
     question = QuestionsATrous.query.get_or_404(question_id)
-    # Générer la liste des mots à proposer (results + distracteurs, sans doublons)
-    mots = set(question.results_list)
-    for distracteurs in question.distracteurs_list:
-        mots.update(distracteurs)
-    choix_mots = sorted(mots)
     if request.method == 'POST':
         import json
         reponses = request.form.get('reponses_a_trous')
@@ -748,7 +973,7 @@ def repondre_question_trous(question_id):
         session['reponses_a_trous'][str(question_id)] = reponses_list
         flash('Réponse enregistrée.', 'success')
         return redirect(url_for('resultats_trous'))
-    return render_template('question_trous.html', question=question, choix_mots=choix_mots)
+    return render_template('question_trous.html', question=question)
 
 @app.route('/resultats_trous')
 def resultats_trous():
@@ -757,8 +982,14 @@ def resultats_trous():
     resultats = []
     score = 0
     total = len(reponses)
+    # Charger toutes les questions répondues en une seule requête
+    questions = {}
+    if reponses:
+        questions = {q.id: q for q in QuestionsATrous.query.options(
+            joinedload(QuestionsATrous.chapitre).joinedload(Chapitre.niveau)
+        ).filter(QuestionsATrous.id.in_([int(qid) for qid in reponses]))}
     for qid, user_reponses in reponses.items():
-        question = QuestionsATrous.query.get(int(qid))
+        question = questions.get(int(qid))
         correctes = question.results_list if question else []
         est_correcte = user_reponses == correctes
         if est_correcte:
@@ -793,19 +1024,23 @@ def edit_question_trous(question_id):
         difficulte = request.form['difficulte']
         niveau_id = request.form['niveau_id']
         chapitre_id = request.form['chapitre_id']
-        import json
         nb_trous = probleme.count('[TROU]')
         results = [request.form.get(f'result_{i}', '').strip() for i in range(nb_trous)]
         distracteurs = []
         for i in range(nb_trous):
             d = request.form.get(f'distracteurs_{i}', '').strip()
             distracteurs.append([mot.strip() for mot in d.split(',') if mot.strip()])
+        ancien_compteur = (question.chapitre_id, 'trous', question.difficulte)
         question.probleme = probleme
-        question.results = json.dumps(results)
-        question.distracteurs = json.dumps(distracteurs)
+        question.results = results
+        question.distracteurs = distracteurs
         question.difficulte = difficulte
-        question.chapitre_id = chapitre_id
-        db.session.commit()
+        question.chapitre_id = int(chapitre_id)
+        question.mettre_a_jour_html()
+        nouveau_compteur = (question.chapitre_id, 'trous', question.difficulte)
+        if nouveau_compteur != ancien_compteur:
+            CompteurQuestions.ajuster({ancien_compteur: -1, nouveau_compteur: 1})
+        QCMService.valider_catalogue()
         flash('Question à trous modifiée avec succès.', 'success')
         return redirect(url_for('edit_question_trous', question_id=question.id))
     return render_template('admin_edit_question_trous.html', question=question, niveaux=niveaux, chapitres=chapitres)
@@ -820,7 +1055,6 @@ def create_question_trous():
         difficulte = request.form['difficulte']
         niveau_id = request.form['niveau_id']
         chapitre_id = request.form['chapitre_id']
-        import json
         nb_trous = probleme.count('[TROU]')
         results = [request.form.get(f'result_{i}', '').strip() for i in range(nb_trous)]
         distracteurs = []
@@ -829,43 +1063,36 @@ def create_question_trous():
             distracteurs.append([mot.strip() for mot in d.split(',') if mot.strip()])
         question = QuestionsATrous(
             probleme=probleme,
-            results=json.dumps(results),
-            distracteurs=json.dumps(distracteurs),
+            results=results,
+            distracteurs=distracteurs,
             difficulte=difficulte,
             chapitre_id=chapitre_id
         )
+        question.mettre_a_jour_html()
         db.session.add(question)
-        db.session.commit()
+        CompteurQuestions.ajuster({(chapitre_id, 'trous', difficulte): 1})
+        QCMService.valider_catalogue()
         flash('Question à trous créée avec succès.', 'success')
         return redirect(url_for('create_question_trous'))
     return render_template('admin_create_question_trous.html', niveaux=niveaux, chapitres=chapitres)
 
 @app.route('/test_trous')
+@cache_page()
 def test_trous():
-    niveaux = ['6eme', '5eme', '4eme', '3eme']
-    questions_par_niveau = {}
-    for niveau in niveaux:
-        question = QuestionsATrous.query.join(Chapitre).join(Niveau).filter(Niveau.nom == niveau).order_by(QuestionsATrous.id.asc()).first()
-        questions_par_niveau[niveau] = question.id if question else None
-    return render_template('test_trous.html', questions_par_niveau=questions_par_niveau)
+    return render_template('test_trous.html', niveaux_trous=QCMService.get_niveaux_trous())
 
 @app.route('/lancer_test_trous/<niveau>', methods=['GET', 'POST'])
 def lancer_test_trous(niveau):
-    # Récupérer dynamiquement toutes les questions à trous du niveau
-    questions = QuestionsATrous.query.join(Chapitre).join(Niveau).filter(Niveau.nom == niveau).order_by(QuestionsATrous.id.asc()).all()
-    total = len(questions)
+    total = QCMService.compter_questions_trous(niveau)
     # Réinitialiser l'index et les réponses uniquement au tout début du test
     if request.method == 'GET' and (session.get('test_trous_index') is None or session.get('test_trous_index', 0) == 0):
         session['test_trous_index'] = 0
         session['reponses_a_trous'] = {}
     index = session.get('test_trous_index', 0)
-    if index >= total or total == 0:
+    # Seule la question courante est chargée
+    question = QCMService.get_question_trous_position(niveau, index) if index < total else None
+    if question is None:
         return redirect(url_for('resultats_trous'))
-    question = questions[index]
-    mots = set(question.results_list)
-    for distracteurs in question.distracteurs_list:
-        mots.update(distracteurs)
-    choix_mots = sorted(mots)
     if request.method == 'POST':
         import json
         reponses = request.form.get('reponses_a_trous')
@@ -879,7 +1106,7 @@ def lancer_test_trous(niveau):
             return redirect(url_for('resultats_trous'))
         else:
             return redirect(url_for('lancer_test_trous', niveau=niveau))
-    return render_template('question_trous.html', question=question, choix_mots=choix_mots, index=index+1, total=total, niveau=niveau)
+    return render_template('question_trous.html', question=question, index=index+1, total=total, niveau=niveau)
 
 @app.route('/annuler_test_trous')
 def annuler_test_trous():
@@ -919,6 +1146,7 @@ def sauvegarder_et_quitter():
             'chapitre': session.get('chapitre'),
             'question_courante': session.get('question_courante', 0),
             'score': session.get('score', 0),
+            'question_ids': session.get('question_ids', []),
             'reponses': session.get('reponses', []),
             'timestamp': time.time()
         }
@@ -929,6 +1157,7 @@ def sauvegarder_et_quitter():
         session.pop('niveau', None)
         session.pop('score', None)
         session.pop('question_courante', None)
+        session.pop('question_ids', None)
         session.pop('reponses', None)
         session.pop('mode', None)
         session.pop('chapitre', None)
@@ -998,7 +1227,8 @@ def reprendre_test(niveau, chapitre=None):
     session['chapitre'] = progress_data.get('chapitre')
     session['question_courante'] = progress_data['question_courante']
     session['score'] = progress_data['score']
-    session['reponses'] = progress_data['reponses']
+    session['question_ids'] = progress_data.get('question_ids', [])
+    session['reponses'] = progress_data.get('reponses', [])
 
     # Supprimer la sauvegarde
     session.pop(save_key, None)
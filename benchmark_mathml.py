@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai de la conversion des notations mathématiques
+
+comparaison : vérifie que les nouvelles implémentations (mathml_utils)
+produisent le même MathML que les anciennes (tests/mathml_reference.py) puis compare
+leurs temps d'exécution sur des expressions longues et imbriquées. Les mêmes
+vérifications d'équivalence sont lancées par tests/test_mathml_equivalence.py.
+
+suite : mesure le débit (opérations/s) et la mémoire allouée du pipeline de
+rendu (mathml_filter, mathml_clean_filter, parse_math_expression,
+clean_display_filter) sur un corpus d'énoncés générés et des cas extrêmes,
+et compare le résultat à la référence benchmark_mathml_baseline.json.
+Les débits sont rapportés à une boucle de calibration pour rester comparables
+d'une machine à l'autre.
+
+Usage :
+    python benchmark_mathml.py                          # vérification + ancien/nouveau
+    python benchmark_mathml.py --repetitions 20 --graine 7
+    python benchmark_mathml.py suite                    # débit et mémoire du pipeline
+    python benchmark_mathml.py suite --comparer         # code de sortie 1 en cas de régression
+    python benchmark_mathml.py suite --enregistrer      # met à jour la référence
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import re
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+import mathml_utils
+
+# Les anciennes implémentations ne servent qu'aux vérifications : elles sont rangées avec les tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests'))
+import mathml_reference  # noqa: E402
+
+FICHIER_REFERENCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_mathml_baseline.json')
+
+# Écarts tolérés par rapport à la référence avant de signaler une régression
+TOLERANCE_DEBIT = 0.30
+TOLERANCE_MEMOIRE = 0.50
+
+
+def generer_expression(rng, profondeur=3):
+    """Expression bien formée aléatoire : nombres, variables, opérateurs, parenthèses et fonctions"""
+    if profondeur <= 0 or rng.random() < 0.3:
+        return rng.choice(['x', 'y', 'a', 'b', 'n', 'x_1', 'aire']) if rng.random() < 0.5 \
+            else rng.choice(['1', '2', '3', '10', '0.5', '-4', '12.75'])
+
+    choix = rng.random()
+    espace = rng.choice(['', ' '])
+    if choix < 0.35:
+        nb = rng.randint(2, 4)
+        operandes = [generer_expression(rng, profondeur - 1) for _ in range(nb)]
+        expr = operandes[0]
+        for operande in operandes[1:]:
+            expr += f"{espace}{rng.choice('+-*/')}{espace}{operande}"
+        return expr
+    if choix < 0.45:
+        return f"({generer_expression(rng, profondeur - 1)})"
+    if choix < 0.6:
+        return f"sqrt({generer_expression(rng, profondeur - 1)})"
+    if choix < 0.8:
+        return f"pow({generer_expression(rng, profondeur - 1)},{espace}{generer_expression(rng, profondeur - 1)})"
+    return f"frac({generer_expression(rng, profondeur - 1)},{espace}{generer_expression(rng, profondeur - 1)})"
+
+
+def generer_expression_valide(rng):
+    """Expression dont le rendu par l'ancien analyseur n'est pas cassé"""
+    while True:
+        expr = generer_expression(rng, rng.randint(1, 3))
+        if mathml_bien_forme(mathml_reference.parse_math_expression(expr)):
+            return expr
+
+
+def generer_texte(rng):
+    """Énoncé aléatoire mêlant texte, notations valides, invalides et crochets ordinaires"""
+    notations = [
+        lambda: f"[frac:{rng.randint(1, 9)}/{rng.randint(2, 12)}]",
+        lambda: f"[frac:{rng.choice(list(mathml_utils.UNICODE_FRACTIONS))}]",
+        lambda: f"[pow:{rng.choice(['x', '2', 'a'])}^{rng.randint(2, 4)}]",
+        lambda: f"[sqrt:{rng.choice([16, 25, 2, 'x'])}]",
+        lambda: f"[root:{rng.randint(2, 64)},{rng.randint(3, 5)}]",
+        lambda: f"[var:{rng.choice(['x_1', 'y_2', 'x', 'u_n'])}]",
+        lambda: f"[math:{generer_expression_valide(rng)}]",
+        lambda: rng.choice(['[pow:x]', '[frac:abc]', '[root:8]', '[1 ; 3]', '[AB]', '[', ']', '[math:]']),
+    ]
+    mots = ['Calculer', 'la', 'valeur', 'de', 'Si', 'alors', 'et', 'sachant que', '=', '+', '×', 'cm']
+    morceaux = []
+    for _ in range(rng.randint(0, 12)):
+        morceaux.append(rng.choice(notations)() if rng.random() < 0.4 else rng.choice(mots))
+    return rng.choice([' ', '']).join(morceaux)
+
+
+def generer_html(rng):
+    """Fragment HTML d'éditeur : <p>, <br>, &nbsp; et espaces autour d'un contenu"""
+    morceaux = ['<p>', '</p>', '<P>', '<p class="ql-align-center">', '<br>', '<br/>', '<BR />', '&nbsp;',
+                ' ', '\n', '\xa0', 'x', 'Calculer', '<math><mi>x</mi></math>', '<p> </p>', '<pre>', '<br']
+    return ''.join(rng.choice(morceaux) for _ in range(rng.randint(0, 14)))
+
+
+def mathml_bien_forme(mathml):
+    """
+    Vrai si le MathML est du XML valide sans texte hors des éléments feuilles.
+    L'ancien analyseur découpe parfois à l'intérieur de balises déjà produites
+    (ex. le '/' de '</mi>') : ces rendus cassés sont exclus de la comparaison.
+    """
+    try:
+        racine = ET.fromstring(f"<math>{mathml}</math>")
+    except ET.ParseError:
+        return False
+    for element in racine.iter():
+        if len(element) and (element.text or '').strip():
+            return False
+        if element is not racine and (element.tail or '').strip():
+            return False
+    return True
+
+
+def corpus_exemples():
+    """Expressions [math:...] des exemples de la documentation"""
+    expressions = []
+    for exemple in mathml_utils.EXAMPLES.values():
+        expressions.extend(re.findall(r'\[math:([^\]]+)\]', exemple))
+    return expressions
+
+
+def verifier_equivalence(nb_expressions, graine):
+    """Compare les anciennes et nouvelles implémentations ; renvoie les textes divergents"""
+    divergences = []
+
+    for expr in corpus_exemples():
+        if mathml_utils.parse_math_expression(expr) != mathml_reference.parse_math_expression(expr):
+            divergences.append(f"[math:{expr}]")
+    print(f"✅ {len(corpus_exemples())} expressions des exemples comparées")
+
+    rng = random.Random(graine)
+    comparees = ignorees = 0
+    for _ in range(nb_expressions):
+        expr = generer_expression(rng, rng.randint(1, 4))
+        attendu = mathml_reference.parse_math_expression(expr)
+        if not mathml_bien_forme(attendu):
+            ignorees += 1
+            continue
+        comparees += 1
+        if mathml_utils.parse_math_expression(expr) != attendu:
+            divergences.append(f"[math:{expr}]")
+    print(f"✅ {comparees} expressions générées comparées ({ignorees} ignorées : rendu de référence cassé)")
+
+    textes = list(mathml_utils.EXAMPLES.values()) + [generer_texte(rng) for _ in range(nb_expressions)]
+    for texte in textes:
+        if mathml_utils.convert_math_notation(texte) != mathml_reference.convert_math_notation(texte):
+            divergences.append(texte)
+    print(f"✅ {len(textes)} énoncés comparés (convert_math_notation)")
+
+    fragments = [generer_html(rng) for _ in range(nb_expressions * 5)]
+    for fragment in fragments:
+        if (str(mathml_utils.clean_display_filter(fragment)) != str(mathml_reference.clean_display_filter(fragment))
+                or mathml_utils.strip_paragraphs(fragment) != mathml_reference.strip_paragraphs(fragment)):
+            divergences.append(fragment)
+    print(f"✅ {len(fragments)} fragments HTML comparés (clean_display_filter, strip_paragraphs)")
+
+    return divergences
+
+
+def cas_de_mesure():
+    """Expressions longues (chaînes d'opérations) et profondément imbriquées"""
+    cas = {}
+    for n in (50, 200, 800):
+        cas[f"somme de {n} termes"] = ' + '.join(f"x_{i}" for i in range(n))
+        cas[f"produit de {n} facteurs"] = ' * '.join(str(i) for i in range(1, n + 1))
+    for n in (10, 50, 150):
+        cas[f"sqrt imbriqués x{n}"] = 'sqrt(' * n + '1 + x' + ')' * n
+        cas[f"parenthèses imbriquées x{n}"] = '(' * n + 'a - b' + ')' * n
+        cas[f"frac imbriquées x{n}"] = 'frac(1, ' * n + 'x' + ')' * n
+    return cas
+
+
+def cas_de_mesure_nettoyage():
+    """Fragments HTML courants et longues suites de <br>"""
+    return {
+        "paragraphe simple": "<p>Calculer l'aire du rectangle.</p>",
+        "bords chargés": "<p></p><br>&nbsp;<p>Calculer <b>x</b></p><br/><br>&nbsp; ",
+        "2000 <br> puis texte": "<br>" * 2000 + "x",
+        "texte puis 2000 <br>": "x" + "<br> " * 2000,
+    }
+
+
+def cas_de_mesure_textes():
+    """Énoncés sans notation, courants et chargés en notations"""
+    phrase = "Un rectangle a pour longueur 12 cm et pour largeur 5 cm. Calculer son aire. "
+    return {
+        "énoncé sans notation": phrase * 3,
+        "énoncé courant": "Calculer [frac:3/4] + [frac:1/2] puis [math:sqrt(1 + sqrt(x))]",
+        "200 notations": ' et '.join(['[frac:1/2]', '[pow:x^2]', '[sqrt:16]', '[var:x_1]'] * 50),
+    }
+
+
+def mesurer(fonction, expr, repetitions):
+    """Meilleur temps (ms) sur `repetitions` exécutions"""
+    meilleur = float('inf')
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction(expr)
+        meilleur = min(meilleur, time.perf_counter() - debut)
+    return meilleur * 1000
+
+
+def generer_enonce(rng):
+    """Énoncé de collège réaliste, tel qu'il sort de l'éditeur (avec <p>, <br> et &nbsp;)"""
+    a, b, c = rng.randint(2, 12), rng.randint(2, 12), rng.randint(2, 30)
+    carre = rng.randint(2, 12) ** 2
+    modeles = [
+        f"<p>Calculer [frac:{a}/{b}] + [frac:1/{c}] et donner le résultat sous forme irréductible.</p>",
+        f"Résoudre l'équation [math:{a}*x + {b}] = {c}.",
+        f"<p>Un rectangle a pour longueur {a} cm et pour largeur {b} cm.</p><p>Calculer son aire.</p>",
+        f"Développer et réduire [math:pow(x + {a}, 2)].<br>",
+        f"Simplifier [sqrt:{carre}] + [root:{a ** 3},3]",
+        f"Si [var:x_1] = {a} et [var:x_2] = {b}, calculer [var:x_1] + [var:x_2]",
+        f"Calculer [math:frac({a} + {b}, {c})] puis [math:sqrt({carre})]<br><br>",
+        f"&nbsp;Quel est le périmètre d'un carré de côté {a} cm ?",
+        f"<p>On lance un dé équilibré. Quelle est la probabilité d'obtenir {rng.randint(1, 6)} ?</p>",
+        f"{a} cm²",
+        f"[frac:{rng.choice(list(mathml_utils.UNICODE_FRACTIONS))}]",
+        f"[math:pow({a}, 2) - {b}*{c}]",
+    ]
+    return rng.choice(modeles)
+
+
+def corpus_suite(graine, taille=300):
+    """Corpus d'énoncés générés et cas extrêmes, identique d'une exécution à l'autre"""
+    rng = random.Random(graine)
+    enonces = [generer_enonce(rng) for _ in range(taille)]
+    expressions = [expr for enonce in enonces for expr in re.findall(r'\[math:([^\]]+)\]', enonce)]
+    return {
+        'enonces': enonces,
+        'expressions': expressions,
+        'sqrt_imbriques': ['sqrt(' * 40 + '1 + x' + ')' * 40],
+        'longue_somme': [' + '.join(f"{i}*x_{i}" for i in range(400))],
+        'hors_limites': ['Calculer [math:' + 'sqrt(' * 200 + 'x' + ')' * 200 + ']',
+                         'Calculer [math:' + ' + '.join(['x'] * 3000) + ']'],
+        'cent_notations': [' puis '.join(['[frac:1/2]', '[pow:x^2]', '[math:frac(a+1, 2)]', '[var:x_1]',
+                                          '[sqrt:16]'] * 100)],
+        'fin_br': ["<p>Calculer.</p>" + "<br>" * 2000],
+    }
+
+
+def cas_suite(corpus):
+    """Cas mesurés : (fonction, entrées, cache MathML activé)"""
+    return {
+        'mathml_filter (énoncés)': (mathml_utils.mathml_filter, corpus['enonces'], False),
+        'mathml_filter (énoncés, cache chaud)': (mathml_utils.mathml_filter, corpus['enonces'], True),
+        'mathml_clean_filter (énoncés)': (mathml_utils.mathml_clean_filter, corpus['enonces'], False),
+        'clean_display_filter (énoncés)': (mathml_utils.clean_display_filter, corpus['enonces'], False),
+        'parse_math_expression (expressions)': (mathml_utils.parse_math_expression, corpus['expressions'], False),
+        'parse_math_expression (sqrt imbriqués x40)': (mathml_utils.parse_math_expression,
+                                                       corpus['sqrt_imbriques'], False),
+        'parse_math_expression (somme de 400 termes)': (mathml_utils.parse_math_expression,
+                                                        corpus['longue_somme'], False),
+        'mathml_filter (expressions hors limites)': (mathml_utils.mathml_filter, corpus['hors_limites'], False),
+        'mathml_filter (500 notations)': (mathml_utils.mathml_filter, corpus['cent_notations'], False),
+        'clean_display_filter (2000 <br> en fin)': (mathml_utils.clean_display_filter, corpus['fin_br'], False),
+    }
+
+
+def debit(fonction, entrees, duree_min, repetitions):
+    """Opérations par seconde (meilleure des `repetitions` mesures d'au moins `duree_min` s)"""
+    meilleur = 0.0
+    for _ in range(repetitions):
+        operations = 0
+        debut = time.perf_counter()
+        while True:
+            for entree in entrees:
+                fonction(entree)
+            operations += len(entrees)
+            duree = time.perf_counter() - debut
+            if duree >= duree_min:
+                break
+        meilleur = max(meilleur, operations / duree)
+    return meilleur
+
+
+def memoire(fonction, entrees):
+    """Pic de mémoire allouée (Ko) et nombre de blocs encore alloués après un passage sur les entrées"""
+    tracemalloc.start()
+    try:
+        avant = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        depart, _ = tracemalloc.get_traced_memory()
+        resultats = [fonction(entree) for entree in entrees]
+        _, pic = tracemalloc.get_traced_memory()
+        apres = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    blocs = sum(stat.count_diff for stat in apres.compare_to(avant, 'filename'))
+    del resultats
+    return (pic - depart) / 1024, blocs
+
+
+def calibration(duree_min, repetitions):
+    """Débit d'une boucle Python fixe, pour rapporter les mesures à la vitesse de la machine"""
+    def charge(n):
+        return ''.join(str(i * i) for i in range(n))
+    return debit(charge, [200], duree_min, repetitions)
+
+
+def executer_suite(graine, duree_min, repetitions, noms=None):
+    """
+    Mesure les cas de la suite (tous, ou seulement `noms`) avec les limites
+    d'analyse par défaut ; renvoie un dictionnaire sérialisable en JSON
+    """
+    mathml_utils.configurer_limites_mathml()
+    logging.getLogger('mathml').setLevel(logging.ERROR)
+    calibrations = []
+    resultats = {}
+
+    for nom, (fonction, entrees, avec_cache) in cas_suite(corpus_suite(graine)).items():
+        if noms is not None and nom not in noms:
+            continue
+        mathml_utils.configurer_cache_mathml(2048 if avec_cache else 0)
+        if avec_cache:
+            for entree in entrees:
+                fonction(entree)
+        # Calibration juste avant chaque cas : la charge de la machine varie pendant la suite
+        reference_machine = calibration(duree_min, repetitions)
+        calibrations.append(reference_machine)
+        ops = debit(fonction, entrees, duree_min, repetitions)
+        pic_ko, blocs = memoire(fonction, entrees)
+        resultats[nom] = {
+            'ops_par_seconde': round(ops, 1),
+            'relatif': round(ops / reference_machine, 6),
+            'pic_memoire_ko': round(pic_ko, 1),
+            'blocs_retenus': blocs,
+        }
+
+    mathml_utils.configurer_cache_mathml(2048)
+    return {
+        'graine': graine,
+        'python': platform.python_version(),
+        'calibration_ops_par_seconde': round(max(calibrations, default=0), 1),
+        'resultats': resultats,
+    }
+
+
+def ecarts(mesure, base):
+    """Rapports débit et mémoire d'un cas par rapport à la référence, et régression éventuelle"""
+    ratio_debit = mesure['relatif'] / base['relatif']
+    # Quelques Ko de marge : les petits pics varient d'une version de Python à l'autre
+    ratio_memoire = (mesure['pic_memoire_ko'] + 4) / (base['pic_memoire_ko'] + 4)
+    regression = ratio_debit < 1 - TOLERANCE_DEBIT or ratio_memoire > 1 + TOLERANCE_MEMOIRE
+    return ratio_debit, ratio_memoire, regression
+
+
+def regressions(mesures, reference):
+    """Noms des cas en régression par rapport à la référence"""
+    return [nom for nom, mesure in mesures['resultats'].items()
+            if nom in reference['resultats'] and ecarts(mesure, reference['resultats'][nom])[2]]
+
+
+def afficher_comparaison(mesures, reference):
+    """Affiche l'écart de chaque cas avec la référence"""
+    print(f"   {'cas':<46} {'ops/s':>12} {'vs réf.':>8} {'pic Ko':>9} {'vs réf.':>8}")
+    for nom, mesure in mesures['resultats'].items():
+        base = reference['resultats'].get(nom)
+        if base is None:
+            print(f"   {nom:<46} {mesure['ops_par_seconde']:>12.0f} {'nouveau':>8} {mesure['pic_memoire_ko']:>9.1f}")
+            continue
+        ratio_debit, ratio_memoire, regression = ecarts(mesure, base)
+        print(f"{'❌' if regression else '✅'} {nom:<46} {mesure['ops_par_seconde']:>12.0f} {ratio_debit:>7.2f}x "
+              f"{mesure['pic_memoire_ko']:>9.1f} {ratio_memoire:>7.2f}x")
+
+
+def lancer_suite(args):
+    """Commande suite : mesures, puis enregistrement ou comparaison avec la référence"""
+    print("⏱️  Mesure du pipeline de rendu MathML...")
+    mesures = executer_suite(args.graine, args.duree, args.repetitions)
+
+    if args.enregistrer:
+        with open(FICHIER_REFERENCE, 'w', encoding='utf-8') as f:
+            json.dump(mesures, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        for nom, mesure in mesures['resultats'].items():
+            print(f"   {nom:<46} {mesure['ops_par_seconde']:>12.0f} ops/s {mesure['pic_memoire_ko']:>9.1f} Ko")
+        print(f"✅ Référence enregistrée dans {os.path.basename(FICHIER_REFERENCE)}")
+        return 0
+
+    try:
+        with open(FICHIER_REFERENCE, encoding='utf-8') as f:
+            reference = json.load(f)
+    except FileNotFoundError:
+        reference = {'resultats': {}}
+        print("⚠️  Aucune référence : lancer `python benchmark_mathml.py suite --enregistrer`")
+
+    # Un cas en retrait est remesuré avant d'être signalé : une seule mesure peut
+    # être faussée par un autre processus sur une machine partagée (CI)
+    for _ in range(2):
+        a_remesurer = regressions(mesures, reference)
+        if not a_remesurer:
+            break
+        nouvelles = executer_suite(args.graine, args.duree, args.repetitions, noms=a_remesurer)
+        for nom, mesure in nouvelles['resultats'].items():
+            precedente = mesures['resultats'][nom]
+            precedente['ops_par_seconde'] = max(precedente['ops_par_seconde'], mesure['ops_par_seconde'])
+            precedente['relatif'] = max(precedente['relatif'], mesure['relatif'])
+            precedente['pic_memoire_ko'] = min(precedente['pic_memoire_ko'], mesure['pic_memoire_ko'])
+
+    afficher_comparaison(mesures, reference)
+    en_retrait = regressions(mesures, reference)
+    if en_retrait and args.comparer:
+        print(f"❌ {len(en_retrait)} régression(s) par rapport à la référence")
+        return 1
+    if en_retrait:
+        print(f"⚠️  {len(en_retrait)} cas en retrait par rapport à la référence")
+    else:
+        print("✅ Aucune régression")
+    return 0
+
+
+def comparer_implementations(args):
+    """Commande comparaison : équivalence puis temps des anciennes et nouvelles implémentations"""
+    # L'ancienne implémentation n'a pas de limites : les deux sont mesurées sans garde
+    mathml_utils.configurer_limites_mathml(None, None, None)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+    print("🔍 Vérification de l'équivalence des rendus...")
+    divergences = verifier_equivalence(args.expressions, args.graine)
+    if divergences:
+        print(f"❌ {len(divergences)} divergence(s) :")
+        for texte in divergences[:10]:
+            print(f"   {texte}")
+            print(f"     ancien  : {mathml_reference.convert_math_notation(texte)}")
+            print(f"     nouveau : {mathml_utils.convert_math_notation(texte)}")
+        return 1
+
+    print("\n⏱️  Temps d'analyse (meilleur de {} exécutions) :".format(args.repetitions))
+    print(f"   {'cas':<32} {'ancien (ms)':>12} {'nouveau (ms)':>13} {'gain':>8}")
+    for nom, expr in cas_de_mesure().items():
+        ancien = mesurer(mathml_reference.parse_math_expression, expr, args.repetitions)
+        nouveau = mesurer(mathml_utils.parse_math_expression, expr, args.repetitions)
+        print(f"   {nom:<32} {ancien:>12.3f} {nouveau:>13.3f} {ancien / nouveau:>7.1f}x")
+
+    print("\n⏱️  Conversion d'énoncés complets (convert_math_notation) :")
+    for nom, texte in cas_de_mesure_textes().items():
+        ancien = mesurer(mathml_reference.convert_math_notation, texte, args.repetitions)
+        nouveau = mesurer(mathml_utils.convert_math_notation, texte, args.repetitions)
+        print(f"   {nom:<32} {ancien:>12.3f} {nouveau:>13.3f} {ancien / nouveau:>7.1f}x")
+
+    print("\n⏱️  Nettoyage HTML (strip_paragraphs) :")
+    for nom, fragment in cas_de_mesure_nettoyage().items():
+        ancien = mesurer(mathml_reference.strip_paragraphs, fragment, args.repetitions)
+        nouveau = mesurer(mathml_utils.strip_paragraphs, fragment, args.repetitions)
+        print(f"   {nom:<32} {ancien:>12.3f} {nouveau:>13.3f} {ancien / nouveau:>7.1f}x")
+
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai de la conversion MathML")
+    parser.add_argument('commande', nargs='?', default='comparaison', choices=['comparaison', 'suite'],
+                        help="comparaison : anciennes et nouvelles implémentations ; "
+                             "suite : débit et mémoire du pipeline, comparés à la référence")
+    parser.add_argument('--repetitions', type=int, default=5, help="nombre de mesures par cas")
+    parser.add_argument('--expressions', type=int, default=2000, help="taille du corpus généré (comparaison)")
+    parser.add_argument('--graine', type=int, default=42, help="graine du générateur aléatoire")
+    parser.add_argument('--duree', type=float, default=0.2, help="durée minimale d'une mesure en secondes (suite)")
+    parser.add_argument('--comparer', action='store_true', help="code de sortie 1 en cas de régression (suite)")
+    parser.add_argument('--enregistrer', action='store_true', help="enregistre les mesures comme référence (suite)")
+    args = parser.parse_args()
+
+    if args.commande == 'suite':
+        return lancer_suite(args)
+    return comparer_implementations(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Caches en mémoire : catalogue QCM (niveaux, chapitres, listes de questions) et pages publiques rendues
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class CatalogueCache:
+    """
+    Cache versionné en lecture seule du catalogue.
+
+    Chaque écriture du catalogue incrémente une version stockée en base : le
+    processus qui écrit vide son cache immédiatement, les autres processus
+    relisent la version au plus toutes les `intervalle_verification` secondes
+    (None : jamais, 0 : à chaque accès).
+
+    Les valeurs renvoyées sont partagées entre les requêtes : ne pas les modifier.
+    """
+
+    def __init__(self, lire_version, intervalle_verification=5.0):
+        self._lire_version = lire_version
+        self.intervalle_verification = intervalle_verification
+        self._donnees = {}
+        self._verrou = threading.Lock()
+        self._version = None
+        self._derniere_verification = None
+
+    @property
+    def version(self):
+        """Version du catalogue connue par ce processus"""
+        self._verifier_version()
+        return self._version
+
+    def _verifier_version(self):
+        """Relit la version en base si l'intervalle de vérification est écoulé"""
+        maintenant = time.monotonic()
+        if self._version is not None and self._derniere_verification is not None:
+            if self.intervalle_verification is None:
+                return
+            if maintenant - self._derniere_verification < self.intervalle_verification:
+                return
+
+        version = self._lire_version()
+        with self._verrou:
+            if version != self._version:
+                self._donnees.clear()
+                self._version = version
+            self._derniere_verification = maintenant
+
+    def get(self, cle, chargeur):
+        """Renvoie la valeur en cache pour `cle`, ou la charge via `chargeur()`"""
+        self._verifier_version()
+        with self._verrou:
+            if cle in self._donnees:
+                return self._donnees[cle]
+            version = self._version
+
+        valeur = chargeur()
+
+        # Les résultats vides ne sont pas conservés : les clés viennent souvent
+        # de l'URL et le cache ne doit pas grossir avec des noms inexistants
+        if valeur:
+            with self._verrou:
+                # Une écriture pendant le chargement rendrait la valeur périmée
+                if self._version == version:
+                    self._donnees[cle] = valeur
+        return valeur
+
+    def invalider(self):
+        """Vide le cache ; la version sera relue en base au prochain accès"""
+        with self._verrou:
+            self._donnees.clear()
+            self._version = None
+            self._derniere_verification = None
+
+
+class CachePages:
+    """
+    Cache LRU en mémoire de pages rendues, borné en durée de vie (`ttl`, en secondes)
+    et en taille totale (`taille_max`, en octets). Chaque page porte la version du
+    catalogue avec laquelle elle a été rendue : elle n'est plus servie après une écriture.
+    """
+
+    def __init__(self, ttl=60.0, taille_max=32 * 1024 * 1024):
+        self.ttl = ttl
+        self.taille_max = taille_max
+        self._pages = OrderedDict()
+        self._taille = 0
+        self._verrou = threading.Lock()
+
+    def get(self, cle, version):
+        """Page en cache pour `cle` et cette version du catalogue, ou None"""
+        with self._verrou:
+            entree = self._pages.get(cle)
+            if entree is None:
+                return None
+            page, version_page, expiration, _ = entree
+            if version_page != version or time.monotonic() >= expiration:
+                self._retirer(cle)
+                return None
+            self._pages.move_to_end(cle)
+            return page
+
+    def set(self, cle, version, page, taille):
+        """Garde `page` (de `taille` octets), en évinçant les pages les moins récemment servies"""
+        if taille > self.taille_max:
+            return
+        with self._verrou:
+            if cle in self._pages:
+                self._retirer(cle)
+            self._pages[cle] = (page, version, time.monotonic() + self.ttl, taille)
+            self._taille += taille
+            while self._taille > self.taille_max:
+                self._retirer(next(iter(self._pages)))
+
+    def _retirer(self, cle):
+        self._taille -= self._pages.pop(cle)[3]
+
+    def vider(self):
+        with self._verrou:
+            self._pages.clear()
+            self._taille = 0
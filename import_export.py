@@ -0,0 +1,414 @@
+"""
+Import et export en masse du catalogue (questions QCM et questions à trous)
+
+Formats : NDJSON (un objet JSON par ligne), tableau JSON (import seulement) ou CSV
+(colonnes CHAMPS_CSV, listes encodées en JSON), lus et écrits par blocs sans
+charger le catalogue en mémoire. Chaque objet décrit une question :
+
+    {"type": "qcm", "niveau": "6eme", "chapitre": "fractions", "difficulte": "facile",
+     "probleme": "...", "options": ["...", "...", "...", "..."],
+     "reponse_correcte": 0, "explication": "..."}
+
+    {"type": "trous", "niveau": "6eme", "chapitre": "fractions", "difficulte": "facile",
+     "probleme": "Le [TROU] ...", "results": ["..."], "distracteurs": [["...", "..."]]}
+
+"type" vaut "qcm" par défaut ; "id" est facultatif (sinon attribué par la base).
+Un export réimporté dans une base sans questions redonne le même catalogue.
+"""
+
+import csv
+import io
+import json
+from sqlalchemy import insert, select
+from collections import Counter
+from models import db, Niveau, Chapitre, Question, QuestionsATrous, CompteurQuestions
+from services import QCMService
+
+TAILLE_BLOC = 64 * 1024
+TAILLE_LOT = 1000
+
+# Au-delà, les erreurs sont comptées mais plus détaillées dans le rapport
+ERREURS_MAX = 1000
+
+# Colonnes du format CSV ; les listes (options, results, distracteurs) y sont en JSON
+CHAMPS_CSV = ['type', 'id', 'niveau', 'chapitre', 'difficulte', 'probleme', 'options',
+              'reponse_correcte', 'explication', 'results', 'distracteurs']
+CHAMPS_CSV_JSON = ('options', 'results', 'distracteurs')
+CHAMPS_CSV_ENTIERS = ('id', 'reponse_correcte')
+
+
+class ErreurImport(ValueError):
+    """Entrée illisible (tableau JSON ou CSV mal formé) : l'import est annulé"""
+
+
+class RapportImport:
+    """Bilan d'un import : questions insérées par type et erreurs par position dans l'entrée"""
+
+    def __init__(self):
+        self.importees = {'qcm': 0, 'trous': 0}
+        self.erreurs = []
+        self.nb_erreurs = 0
+
+    def erreur(self, position, message):
+        self.nb_erreurs += 1
+        if len(self.erreurs) < ERREURS_MAX:
+            self.erreurs.append({'position': position, 'erreur': message})
+
+    def to_dict(self):
+        return {
+            'importees': self.importees,
+            'nb_erreurs': self.nb_erreurs,
+            'erreurs': self.erreurs
+        }
+
+
+def _elements_tableau(flux, tampon):
+    """Éléments d'un tableau JSON lus bloc par bloc ; `tampon` commence après le '['"""
+    decodeur = json.JSONDecoder()
+    position = 0
+    numero = 0
+    fin_flux = False
+    # Vrai juste après un élément : seuls ',' et ']' peuvent suivre
+    apres_element = False
+
+    while True:
+        # Sauter les blancs et la virgule qui séparent deux éléments
+        while True:
+            while position < len(tampon) and tampon[position] in ' \t\r\n':
+                position += 1
+            if position < len(tampon) or fin_flux:
+                break
+            tampon, position = tampon[position:] + flux.read(TAILLE_BLOC), 0
+            fin_flux = position == len(tampon)
+
+        if position == len(tampon):
+            raise ErreurImport("Tableau JSON non terminé")
+        if tampon[position] == ']':
+            # [{},] : virgule finale
+            if numero and not apres_element:
+                raise ErreurImport(f"Élément {numero + 1} : JSON invalide (Expecting value)")
+            return
+        if apres_element:
+            if tampon[position] != ',':
+                raise ErreurImport(f"Élément {numero + 1} : JSON invalide (Expecting ',' delimiter)")
+            position += 1
+            apres_element = False
+            continue
+        if tampon[position] == ',':
+            # [,{}] ou [{},,{}] : élément vide
+            raise ErreurImport(f"Élément {numero + 1} : JSON invalide (Expecting value)")
+
+        try:
+            element, fin = decodeur.raw_decode(tampon, position)
+            # Un élément qui touche la fin du tampon peut être tronqué (nombre coupé en deux)
+            if fin == len(tampon) and not fin_flux:
+                raise json.JSONDecodeError("Élément incomplet", tampon, fin)
+        except json.JSONDecodeError as e:
+            if fin_flux:
+                raise ErreurImport(f"Élément {numero + 1} : JSON invalide ({e.msg})")
+            bloc = flux.read(TAILLE_BLOC)
+            fin_flux = not bloc
+            tampon, position = tampon[position:] + bloc, 0
+            continue
+
+        numero += 1
+        yield numero, element
+        position = fin
+        apres_element = True
+
+
+def _lignes(flux, tampon):
+    """Lignes d'un flux texte lu par blocs, fins de ligne comprises"""
+    while True:
+        bloc = flux.read(TAILLE_BLOC)
+        *lignes, tampon = (tampon + bloc).split('\n')
+        yield from (ligne + '\n' for ligne in lignes)
+        if not bloc:
+            if tampon:
+                yield tampon
+            return
+
+
+def _enregistrements_csv(flux, tampon):
+    """Enregistrements d'un CSV à en-tête (colonnes de CHAMPS_CSV, cellules vides ignorées)"""
+    lecteur = csv.DictReader(_lignes(flux, tampon))
+    try:
+        for numero, ligne in enumerate(lecteur, start=1):
+            try:
+                enregistrement = {}
+                for cle, valeur in ligne.items():
+                    if cle is None or valeur in (None, ''):
+                        continue
+                    if cle in CHAMPS_CSV_JSON:
+                        valeur = json.loads(valeur)
+                    elif cle in CHAMPS_CSV_ENTIERS:
+                        valeur = int(valeur)
+                    enregistrement[cle] = valeur
+            except ValueError as e:
+                yield numero, ValueError(f"colonne « {cle} » invalide ({e})")
+                continue
+            yield numero, enregistrement
+    except csv.Error as e:
+        raise ErreurImport(f"CSV invalide : {e}")
+
+
+def lire_enregistrements(flux):
+    """
+    Enregistrements d'un flux texte NDJSON, tableau JSON ou CSV : (position, objet),
+    position étant le numéro de ligne (NDJSON), de l'élément (tableau) ou de
+    l'enregistrement (CSV). Un enregistrement NDJSON ou CSV illisible donne
+    (position, ValueError) et la lecture continue.
+    """
+    tampon = flux.read(TAILLE_BLOC)
+    debut = len(tampon) - len(tampon.lstrip())
+    while debut == len(tampon):
+        bloc = flux.read(TAILLE_BLOC)
+        if not bloc:
+            return
+        tampon += bloc
+        debut = len(tampon) - len(tampon.lstrip())
+
+    if tampon[debut] == '[':
+        yield from _elements_tableau(flux, tampon[debut + 1:])
+        return
+    if tampon[debut] != '{':
+        yield from _enregistrements_csv(flux, tampon[debut:])
+        return
+
+    numero = 0
+    while True:
+        bloc = flux.read(TAILLE_BLOC)
+        # La dernière ligne du tampon peut être incomplète : gardée pour le bloc suivant
+        *lignes, tampon = (tampon + bloc).split('\n')
+        if not bloc:
+            lignes.append(tampon)
+        for ligne in lignes:
+            numero += 1
+            if ligne.strip():
+                try:
+                    yield numero, json.loads(ligne)
+                except json.JSONDecodeError as e:
+                    yield numero, e
+        if not bloc:
+            return
+
+
+def _texte(enregistrement, cle):
+    valeur = enregistrement.get(cle)
+    if not isinstance(valeur, str) or not valeur.strip():
+        raise ValueError(f"« {cle} » manquant ou vide")
+    return valeur
+
+
+def _liste_textes(valeur, cle):
+    if not isinstance(valeur, list) or not all(isinstance(texte, str) for texte in valeur):
+        raise ValueError(f"« {cle} » doit être une liste de textes")
+    return valeur
+
+
+def valeurs_qcm(enregistrement, chapitre_id):
+    """Colonnes d'une question QCM (rendus HTML compris) ; ValueError si invalide"""
+    options = _liste_textes(enregistrement.get('options'), 'options')
+    if len(options) != 4:
+        raise ValueError("« options » doit contenir 4 réponses")
+    reponse = enregistrement.get('reponse_correcte')
+    if not isinstance(reponse, int) or isinstance(reponse, bool) or not 0 <= reponse <= 3:
+        raise ValueError("« reponse_correcte » doit être un entier entre 0 et 3")
+
+    valeurs = {
+        'probleme': _texte(enregistrement, 'probleme'),
+        'option_a': options[0],
+        'option_b': options[1],
+        'option_c': options[2],
+        'option_d': options[3],
+        'reponse_correcte': reponse,
+        'explication': _texte(enregistrement, 'explication'),
+        'difficulte': _texte(enregistrement, 'difficulte'),
+        'chapitre_id': chapitre_id
+    }
+    valeurs.update(Question.rendus_html(valeurs))
+    return valeurs
+
+
+def valeurs_trous(enregistrement, chapitre_id):
+    """Colonnes d'une question à trous (rendu HTML compris) ; ValueError si invalide"""
+    probleme = _texte(enregistrement, 'probleme')
+    results = _liste_textes(enregistrement.get('results'), 'results')
+    if len(results) != probleme.count('[TROU]'):
+        raise ValueError("« results » doit contenir un mot par [TROU] de l'énoncé")
+    distracteurs = enregistrement.get('distracteurs')
+    if distracteurs is None:
+        distracteurs = [[] for _ in results]
+    if (not isinstance(distracteurs, list) or len(distracteurs) != len(results)
+            or not all(isinstance(mots, list) for mots in distracteurs)):
+        raise ValueError("« distracteurs » doit contenir une liste de mots par [TROU]")
+    for mots in distracteurs:
+        _liste_textes(mots, 'distracteurs')
+
+    valeurs = {
+        'probleme': probleme,
+        'results': results,
+        'distracteurs': distracteurs,
+        'difficulte': _texte(enregistrement, 'difficulte'),
+        'chapitre_id': chapitre_id
+    }
+    valeurs.update(QuestionsATrous.rendus_html(valeurs))
+    return valeurs
+
+
+MODELES_IMPORT = {
+    'qcm': (Question, valeurs_qcm),
+    'trous': (QuestionsATrous, valeurs_trous),
+}
+
+
+def carte_chapitres():
+    """(niveau, chapitre) -> id de chapitre, en une requête"""
+    lignes = db.session.execute(
+        select(Niveau.nom, Chapitre.nom, Chapitre.id).join(Chapitre.niveau)
+    )
+    return {(niveau, chapitre): chapitre_id for niveau, chapitre, chapitre_id in lignes}
+
+
+def importer_questions(flux, taille_lot=TAILLE_LOT):
+    """
+    Importe les questions d'un flux texte NDJSON, tableau JSON ou CSV, par lots de
+    `taille_lot` INSERT dans une seule transaction. Les enregistrements invalides
+    sont écartés et signalés dans le rapport ; une entrée illisible (ErreurImport)
+    ou une erreur de la base annule tout l'import. Renvoie un RapportImport.
+    """
+    rapport = RapportImport()
+    chapitres = carte_chapitres()
+    lots = {type_question: [] for type_question in MODELES_IMPORT}
+    compteurs = Counter()
+    # Ids déjà pris, chargés seulement si l'entrée impose des ids
+    ids_pris = {}
+
+    def inserer(type_question):
+        if lots[type_question]:
+            db.session.execute(insert(MODELES_IMPORT[type_question][0]), lots[type_question])
+            rapport.importees[type_question] += len(lots[type_question])
+            lots[type_question] = []
+
+    try:
+        for position, enregistrement in lire_enregistrements(flux):
+            try:
+                if isinstance(enregistrement, json.JSONDecodeError):
+                    raise ValueError(f"JSON invalide ({enregistrement.msg})")
+                if isinstance(enregistrement, ValueError):
+                    raise enregistrement
+                if not isinstance(enregistrement, dict):
+                    raise ValueError("un objet JSON est attendu")
+
+                type_question = enregistrement.get('type', 'qcm')
+                if type_question not in MODELES_IMPORT:
+                    raise ValueError(f"type inconnu : {type_question}")
+                modele, valeurs_question = MODELES_IMPORT[type_question]
+
+                cle = (enregistrement.get('niveau'), enregistrement.get('chapitre'))
+                if cle not in chapitres:
+                    raise ValueError(f"chapitre inconnu : {cle[0]}/{cle[1]}")
+                valeurs = valeurs_question(enregistrement, chapitres[cle])
+
+                if enregistrement.get('id') is not None:
+                    id_question = enregistrement['id']
+                    if not isinstance(id_question, int) or isinstance(id_question, bool) or id_question < 1:
+                        raise ValueError("« id » doit être un entier positif")
+                    if type_question not in ids_pris:
+                        ids_pris[type_question] = set(db.session.scalars(select(modele.id)))
+                    if id_question in ids_pris[type_question]:
+                        raise ValueError(f"id {id_question} déjà utilisé")
+                    ids_pris[type_question].add(id_question)
+                    valeurs['id'] = id_question
+            except ValueError as e:
+                rapport.erreur(position, str(e))
+                continue
+
+            lots[type_question].append(valeurs)
+            compteurs[(valeurs['chapitre_id'], type_question, valeurs['difficulte'])] += 1
+            if len(lots[type_question]) >= taille_lot:
+                inserer(type_question)
+
+        for type_question in lots:
+            inserer(type_question)
+
+        if sum(rapport.importees.values()):
+            CompteurQuestions.ajuster(compteurs)
+            QCMService.valider_catalogue()
+        else:
+            db.session.rollback()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return rapport
+
+
+def enregistrements_export(types=None, taille_lot=TAILLE_LOT):
+    """
+    Questions du catalogue au format d'import, triées par type puis par id. Les lignes
+    sont lues au fil de l'eau (yield_per) : la mémoire ne dépend pas de la taille du catalogue.
+    """
+    types = types or list(MODELES_IMPORT)
+    if 'qcm' in types:
+        requete = select(
+            Question.id, Niveau.nom.label('niveau'), Chapitre.nom.label('chapitre'), Question.difficulte,
+            Question.probleme, Question.option_a, Question.option_b, Question.option_c, Question.option_d,
+            Question.reponse_correcte, Question.explication
+        ).join(Question.chapitre).join(Chapitre.niveau).order_by(Question.id)
+        for ligne in db.session.execute(requete.execution_options(yield_per=taille_lot)):
+            yield {
+                'type': 'qcm', 'id': ligne.id, 'niveau': ligne.niveau, 'chapitre': ligne.chapitre,
+                'difficulte': ligne.difficulte, 'probleme': ligne.probleme,
+                'options': [ligne.option_a, ligne.option_b, ligne.option_c, ligne.option_d],
+                'reponse_correcte': ligne.reponse_correcte, 'explication': ligne.explication
+            }
+    if 'trous' in types:
+        requete = select(
+            QuestionsATrous.id, Niveau.nom.label('niveau'), Chapitre.nom.label('chapitre'),
+            QuestionsATrous.difficulte, QuestionsATrous.probleme, QuestionsATrous.results,
+            QuestionsATrous.distracteurs
+        ).join(QuestionsATrous.chapitre).join(Chapitre.niveau).order_by(QuestionsATrous.id)
+        for ligne in db.session.execute(requete.execution_options(yield_per=taille_lot)):
+            yield {
+                'type': 'trous', 'id': ligne.id, 'niveau': ligne.niveau, 'chapitre': ligne.chapitre,
+                'difficulte': ligne.difficulte, 'probleme': ligne.probleme,
+                'results': ligne.results,
+                'distracteurs': ligne.distracteurs
+            }
+
+
+def exporter_ndjson(types=None, taille_lot=TAILLE_LOT):
+    """Export NDJSON du catalogue, par morceaux de `taille_lot` lignes"""
+    morceau = []
+    for enregistrement in enregistrements_export(types, taille_lot):
+        morceau.append(json.dumps(enregistrement, ensure_ascii=False) + '\n')
+        if len(morceau) >= taille_lot:
+            yield ''.join(morceau)
+            morceau = []
+    if morceau:
+        yield ''.join(morceau)
+
+
+def exporter_csv(types=None, taille_lot=TAILLE_LOT):
+    """Export CSV du catalogue (colonnes CHAMPS_CSV), par morceaux de `taille_lot` lignes"""
+    tampon = io.StringIO()
+    ecrivain = csv.DictWriter(tampon, fieldnames=CHAMPS_CSV)
+    ecrivain.writeheader()
+    for numero, enregistrement in enumerate(enregistrements_export(types, taille_lot), start=1):
+        ecrivain.writerow({
+            cle: json.dumps(valeur, ensure_ascii=False) if cle in CHAMPS_CSV_JSON and valeur is not None else valeur
+            for cle, valeur in enregistrement.items()
+        })
+        if numero % taille_lot == 0:
+            yield tampon.getvalue()
+            tampon.seek(0)
+            tampon.truncate()
+    if tampon.getvalue():
+        yield tampon.getvalue()
+
+
+EXPORTS = {
+    'ndjson': (exporter_ndjson, 'application/x-ndjson'),
+    'csv': (exporter_csv, 'text/csv'),
+}
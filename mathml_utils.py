@@ -2,8 +2,13 @@
 Utilitaires pour la conversion et gestion de MathML dans les énoncés de tests
 """
 
+import logging
 import re
-from markupsafe import Markup
+import threading
+from collections import OrderedDict
+from markupsafe import Markup, escape
+
+logger = logging.getLogger('mathml')
 
 class MathMLConverter:
     """Convertisseur pour transformer des notations mathématiques simples en MathML"""
@@ -67,170 +72,443 @@ class MathMLConverter:
                 <mi>{nom}</mi>
             </math>"""
 
-def find_matching_paren(text, start_pos):
+# Jetons d'une expression [math:...] : opérateurs, parenthèses, virgules et
+# suites de texte (nombres, variables, espaces compris)
+_JETON = re.compile(r'(?P<op>[-+*/])|(?P<ouvrante>\()|(?P<fermante>\))|(?P<virgule>,)|(?P<texte>[^-+*/(),]+)')
+_NOM_FONCTION = re.compile(r'(sqrt|pow|frac)\s*$')
+_NOMBRE = re.compile(r'-?\d+([.,]\d+)?')
+_FONCTION = re.compile(r'(sqrt|pow|frac)\s*\(')
+
+_SYMBOLES_OPERATEURS = {'+': '+', '-': '-', '*': '×', '/': '÷'}
+
+
+def tokeniser_expression(expr):
     """
-    Trouve la parenthèse fermante correspondante à partir de start_pos
+    Découpe une expression en jetons (type, valeur, début, fin) en un seul passage.
+    Les suites d'espaces isolées sont ignorées ; un texte terminé par sqrt, pow
+    ou frac et suivi d'une parenthèse devient un jeton 'fonction'.
     """
-    count = 1
-    pos = start_pos + 1
+    jetons = []
+    for match in _JETON.finditer(expr):
+        type_jeton = match.lastgroup
+        valeur = match.group()
+        debut, fin = match.span()
 
-    while pos < len(text) and count > 0:
-        if text[pos] == '(':
-            count += 1
-        elif text[pos] == ')':
-            count -= 1
-        pos += 1
+        if type_jeton == 'texte':
+            if valeur.isspace():
+                continue
+            if expr.startswith('(', fin):
+                fonction = _NOM_FONCTION.search(valeur)
+                if fonction:
+                    if valeur[:fonction.start()].strip():
+                        jetons.append(('texte', valeur[:fonction.start()], debut, debut + fonction.start()))
+                    jetons.append(('fonction', fonction.group(1), debut + fonction.start(), fin))
+                    continue
 
-    return pos - 1 if count == 0 else -1
+        jetons.append((type_jeton, valeur, debut, fin))
+    return jetons
 
-def parse_math_expression(expr):
+
+class ExpressionTropComplexe(ValueError):
+    """Expression [math:...] au-delà des limites de longueur, de profondeur ou de nombre d'éléments"""
+
+    def __init__(self, motif, detail):
+        super().__init__(detail)
+        self.motif = motif
+
+
+class GardeMathML:
     """
-    Parse une expression mathématique complexe et la convertit en MathML
-    Supporte les expressions imbriquées comme sqrt(1 + sqrt(x))
+    Limites de coût de l'analyse des expressions [math:...] et compteurs des
+    expressions refusées. Une limite à None n'est pas appliquée.
     """
-    expr = expr.strip()
 
-    # Traiter les fonctions mathématiques (sqrt, pow, frac) de manière récursive
-    while True:
-        # Chercher la prochaine fonction
-        match = re.search(r'(sqrt|pow|frac)\s*\(', expr)
-        if not match:
-            break
+    def __init__(self, longueur_max=5000, profondeur_max=50, noeuds_max=5000):
+        self.longueur_max = longueur_max
+        self.profondeur_max = profondeur_max
+        self.noeuds_max = noeuds_max
+        self._verrou = threading.Lock()
+        self._refus = {'longueur': 0, 'profondeur': 0, 'noeuds': 0, 'erreur': 0}
 
-        func_name = match.group(1)
-        start_pos = match.start()
-        paren_start = match.end() - 1
+    def configurer(self, longueur_max, profondeur_max, noeuds_max):
+        self.longueur_max = longueur_max
+        self.profondeur_max = profondeur_max
+        self.noeuds_max = noeuds_max
 
-        # Trouver la parenthèse fermante correspondante
-        paren_end = find_matching_paren(expr, paren_start)
-        if paren_end == -1:
-            break
+    def signaler(self, motif):
+        with self._verrou:
+            self._refus[motif] += 1
 
-        # Extraire le contenu de la fonction
-        func_content = expr[paren_start + 1:paren_end]
-
-        # Traiter selon le type de fonction
-        if func_name == 'sqrt':
-            # Traiter récursivement le contenu
-            parsed_content = parse_complex_expression(func_content)
-            replacement = f"<msqrt>{parsed_content}</msqrt>"
-
-        elif func_name == 'pow':
-            # Séparer base et exposant
-            parts = split_function_args(func_content)
-            if len(parts) == 2:
-                base = parse_complex_expression(parts[0])
-                exp = parse_complex_expression(parts[1])
-                replacement = f"<msup>{base}{exp}</msup>"
-            else:
-                replacement = f"<mi>pow({func_content})</mi>"
-
-        elif func_name == 'frac':
-            # Séparer numérateur et dénominateur
-            parts = split_function_args(func_content)
-            if len(parts) == 2:
-                num = parse_complex_expression(parts[0])
-                den = parse_complex_expression(parts[1])
-                replacement = f"<mfrac>{num}{den}</mfrac>"
-            else:
-                replacement = f"<mi>frac({func_content})</mi>"
+    def statistiques(self):
+        with self._verrou:
+            return {
+                'longueur_max': self.longueur_max,
+                'profondeur_max': self.profondeur_max,
+                'noeuds_max': self.noeuds_max,
+                'refus': dict(self._refus)
+            }
+
+
+_garde = GardeMathML()
 
-        # Remplacer dans l'expression
-        expr = expr[:start_pos] + replacement + expr[paren_end + 1:]
 
-    return parse_complex_expression(expr)
+def _atome(texte):
+    """Nombre (<mn>) ou identifiant / texte libre (<mi>)"""
+    texte = texte.strip()
+    if _NOMBRE.fullmatch(texte):
+        return f"<mn>{texte}</mn>"
+    return f"<mi>{texte}</mi>"
 
-def split_function_args(content):
+
+class _AnalyseurMath:
     """
-    Sépare les arguments d'une fonction en tenant compte des parenthèses imbriquées
+    Analyseur descendant récursif des expressions [math:...]
+
+    Grammaire (priorité croissante) :
+        expression := terme (('+' | '-') terme)*
+        terme      := facteur (('*' | '/') facteur)*
+        facteur    := texte | signe facteur | '(' expression ')' | fonction '(' arguments ')'
+
+    Le MathML produit est une suite plate d'éléments ; les parenthèses de
+    regroupement ne sont pas affichées, sauf autour des facteurs juxtaposés
+    (2(x+1), (a+b)(a-b)), et un opérande manquant donne <mi></mi>. Hors des
+    arguments d'une fonction, 3,5 est un nombre décimal.
+    Au-delà de `profondeur_max` niveaux d'imbrication ou de `noeuds_max`
+    éléments, l'analyse s'arrête sur ExpressionTropComplexe.
     """
-    args = []
-    current_arg = ""
-    paren_count = 0
-
-    for char in content:
-        if char == ',' and paren_count == 0:
-            args.append(current_arg.strip())
-            current_arg = ""
+
+    def __init__(self, expr, profondeur_max=None, noeuds_max=None):
+        self.expr = expr
+        self.jetons = tokeniser_expression(expr)
+        self.pos = 0
+        self.profondeur = 0
+        self.profondeur_max = profondeur_max
+        self.noeuds = 0
+        self.noeuds_max = noeuds_max
+        self.dans_arguments = False
+
+    def _compter_noeud(self):
+        self.noeuds += 1
+        if self.noeuds_max is not None and self.noeuds > self.noeuds_max:
+            raise ExpressionTropComplexe('noeuds', f"plus de {self.noeuds_max} éléments")
+
+    def _entrer(self):
+        self.profondeur += 1
+        if self.profondeur_max is not None and self.profondeur > self.profondeur_max:
+            raise ExpressionTropComplexe('profondeur', f"plus de {self.profondeur_max} niveaux d'imbrication")
+
+    def _courant(self):
+        if self.pos < len(self.jetons):
+            return self.jetons[self.pos]
+        return None
+
+    def analyser(self):
+        morceaux = [self.expression()]
+        # Parenthèses fermantes ou virgules orphelines : conservées comme texte
+        while self.pos < len(self.jetons):
+            morceaux.append(f"<mi>{self.jetons[self.pos][1]}</mi>")
+            self.pos += 1
+            if self.pos < len(self.jetons):
+                morceaux.append(self.expression())
+        return ''.join(morceaux)
+
+    def expression(self):
+        morceaux = [self.terme(debut_expression=True)]
+        jeton = self._courant()
+        while jeton and jeton[0] == 'op' and jeton[1] in '+-':
+            self.pos += 1
+            self._compter_noeud()
+            morceaux.append(f"<mo>{jeton[1]}</mo>")
+            morceaux.append(self.terme(debut_expression=True))
+            jeton = self._courant()
+        return ''.join(morceaux)
+
+    def terme(self, debut_expression=False):
+        morceaux = []
+        facteurs = [self._facteur_juxtapose(signe_permis=debut_expression)]
+        jeton = self._courant()
+        while jeton:
+            if jeton[0] == 'op' and jeton[1] in '*/':
+                self.pos += 1
+                self._compter_noeud()
+                morceaux.append(self._juxtaposition(facteurs))
+                morceaux.append(f"<mo>{_SYMBOLES_OPERATEURS[jeton[1]]}</mo>")
+                facteurs = [self._facteur_juxtapose()]
+            elif jeton[0] in ('texte', 'ouvrante', 'fonction'):
+                # Facteurs juxtaposés, ex. 2(x+1)
+                facteurs.append(self._facteur_juxtapose())
+            else:
+                break
+            jeton = self._courant()
+        morceaux.append(self._juxtaposition(facteurs))
+        return ''.join(morceaux)
+
+    def _facteur_juxtapose(self, signe_permis=False):
+        """(MathML, groupe entre parenthèses ?) du facteur courant"""
+        jeton = self._courant()
+        groupe = jeton is not None and jeton[0] == 'ouvrante'
+        return self.facteur(signe_permis=signe_permis), groupe
+
+    @staticmethod
+    def _juxtaposition(facteurs):
+        """Facteurs juxtaposés : les groupes gardent leurs parenthèses, 3(2x - 5) ≠ 3 2x - 5"""
+        if len(facteurs) == 1:
+            return facteurs[0][0]
+        return ''.join(f"<mo>(</mo>{mathml}<mo>)</mo>" if groupe else mathml for mathml, groupe in facteurs)
+
+    def _texte(self):
+        """Jeton texte courant ; hors arguments de fonction, 3,5 est lu comme un seul nombre"""
+        debut, fin = self._courant()[2:]
+        self.pos += 1
+        if not self.dans_arguments and self.expr[debut:fin][-1:].isdigit():
+            virgule = self._courant()
+            suivant = self.jetons[self.pos + 1] if self.pos + 1 < len(self.jetons) else None
+            if (virgule and virgule[0] == 'virgule' and virgule[2] == fin and suivant
+                    and suivant[0] == 'texte' and suivant[2] == virgule[3] and suivant[1][:1].isdigit()):
+                self.pos += 2
+                fin = suivant[3]
+        return self.expr[debut:fin]
+
+    def facteur(self, signe_permis=False):
+        self._compter_noeud()
+        jeton = self._courant()
+        if jeton is None:
+            return "<mi></mi>"
+
+        type_jeton, valeur, debut, fin = jeton
+
+        if type_jeton == 'texte':
+            return _atome(self._texte())
+
+        if type_jeton == 'ouvrante':
+            return self.groupe()
+
+        if type_jeton == 'fonction':
+            return self.fonction()
+
+        if type_jeton == 'op' and valeur in '+-' and signe_permis:
+            # Signe en tête d'expression : collé au nombre ou au texte qui suit (-3, -x, -(a+b))
+            self.pos += 1
+            suivant = self._courant()
+            if suivant is None or suivant[0] in ('op', 'fermante', 'virgule'):
+                return f"<mi>{valeur}</mi>"
+            if suivant[0] == 'texte':
+                return _atome(valeur + self._texte())
+            if suivant[0] == 'ouvrante':
+                self.groupe()
+                return _atome(self.expr[debut:self.jetons[self.pos - 1][3]])
+            return f"<mo>{valeur}</mo>{self.fonction()}"
+
+        # Opérande manquant (opérateur en tête, parenthèse fermante...)
+        return "<mi></mi>"
+
+    def groupe(self):
+        """'(' expression ')' ; une parenthèse non refermée est fermée en fin d'expression"""
+        self._entrer()
+        self.pos += 1
+        dans_arguments, self.dans_arguments = self.dans_arguments, False
+        contenu = self.expression()
+        jeton = self._courant()
+        while jeton and jeton[0] == 'virgule':
+            # Virgule hors d'une fonction : conservée comme texte
+            self.pos += 1
+            contenu += f"<mi>,</mi>{self.expression()}"
+            jeton = self._courant()
+        if jeton and jeton[0] == 'fermante':
+            self.pos += 1
+        self.dans_arguments = dans_arguments
+        self.profondeur -= 1
+        return contenu
+
+    def fonction(self):
+        """sqrt(x), pow(base, exposant) ou frac(numérateur, dénominateur)"""
+        self._entrer()
+        nom = self._courant()[1]
+        self.pos += 1
+        ouvrante = self._courant()
+        self.pos += 1
+
+        # Arguments séparés par des virgules : (vide, MathML) pour chacun
+        dans_arguments, self.dans_arguments = self.dans_arguments, True
+        arguments = []
+        while True:
+            debut_argument = self.pos
+            mathml = self.expression()
+            vide = self.pos == debut_argument
+            arguments.append((vide, mathml))
+            jeton = self._courant()
+            if jeton and jeton[0] == 'virgule':
+                self.pos += 1
+                continue
+            break
+        self.dans_arguments = dans_arguments
+
+        jeton = self._courant()
+        if jeton and jeton[0] == 'fermante':
+            fin_contenu = jeton[2]
+            self.pos += 1
         else:
-            if char == '(':
-                paren_count += 1
-            elif char == ')':
-                paren_count -= 1
-            current_arg += char
+            fin_contenu = len(self.expr)
+        contenu = self.expr[ouvrante[3]:fin_contenu]
+        self.profondeur -= 1
+
+        if nom == 'sqrt':
+            if len(arguments) == 1:
+                return f"<msqrt>{arguments[0][1]}</msqrt>"
+            return f"<msqrt><mi>{contenu.strip()}</mi></msqrt>"
+
+        # Comme un découpage sur les virgules : un dernier argument vide est ignoré
+        if arguments[-1][0]:
+            arguments.pop()
 
-    if current_arg.strip():
-        args.append(current_arg.strip())
+        if len(arguments) == 2:
+            balise = 'msup' if nom == 'pow' else 'mfrac'
+            return f"<{balise}>{arguments[0][1]}{arguments[1][1]}</{balise}>"
+        return f"<mi>{nom}({contenu})</mi>"
 
-    return args
 
-def parse_complex_expression(expr):
+def parse_math_expression(expr):
     """
-    Parse une expression complexe en éléments MathML
-    Gère les opérateurs mathématiques et les expressions imbriquées
+    Parse une expression mathématique complexe et la convertit en MathML
+    Supporte les expressions imbriquées comme sqrt(1 + sqrt(x))
+
+    Analyse en un seul passage (jetons puis descente récursive), en temps
+    linéaire ; l'ancienne version est conservée dans tests/mathml_reference.py.
+    Lève ExpressionTropComplexe au-delà des limites fixées par
+    configurer_limites_mathml.
     """
     expr = expr.strip()
 
+    if _garde.longueur_max is not None and len(expr) > _garde.longueur_max:
+        raise ExpressionTropComplexe('longueur', f"plus de {_garde.longueur_max} caractères")
+
+    # Si c'est déjà du MathML, le retourner tel quel
+    if expr.startswith('<m') and expr.endswith('>') and not _FONCTION.search(expr):
+        return expr
+
     if not expr:
         return "<mi></mi>"
 
-    # Si l'expression contient encore des fonctions non traitées, les traiter
-    if re.search(r'(sqrt|pow|frac)\s*\(', expr):
-        return parse_math_expression(expr)
+    try:
+        return _AnalyseurMath(expr, _garde.profondeur_max, _garde.noeuds_max).analyser()
+    except RecursionError:
+        # Pile déjà chargée par l'appelant : traité comme une imbrication excessive
+        raise ExpressionTropComplexe('profondeur', "pile d'appels épuisée") from None
+
+
+def configurer_limites_mathml(longueur_max=5000, profondeur_max=50, noeuds_max=5000):
+    """Fixe les limites d'analyse des expressions [math:...] (None : pas de limite)"""
+    _garde.configurer(longueur_max, profondeur_max, noeuds_max)
+
+
+def statistiques_garde_mathml():
+    """Limites en vigueur et nombre d'expressions [math:...] refusées, par motif"""
+    return _garde.statistiques()
+
+
+# Ancien nom de l'analyseur des expressions sans fonction, conservé pour compatibilité
+parse_complex_expression = parse_math_expression
+
+# Fractions Unicode vers fractions classiques
+UNICODE_FRACTIONS = {
+    '½': '1/2',
+    '⅓': '1/3',
+    '⅔': '2/3',
+    '¼': '1/4',
+    '¾': '3/4',
+    '⅕': '1/5',
+    '⅖': '2/5',
+    '⅗': '3/5',
+    '⅘': '4/5',
+    '⅙': '1/6',
+    '⅚': '5/6',
+    '⅛': '1/8',
+    '⅜': '3/8',
+    '⅝': '5/8',
+    '⅞': '7/8',
+    '⅐': '1/7',
+    '⅑': '1/9',
+    '⅒': '1/10'
+}
 
-    # Si c'est déjà du MathML, le retourner tel quel
-    if expr.startswith('<m') and expr.endswith('>'):
-        return expr
+# Toutes les notations reconnues, analysées en un seul passage
+_NOTATION = re.compile(r'\[(math|frac|pow|sqrt|root|var):([^\]]+)\]')
+
+
+def _convertir_math(expr):
+    """
+    Nouvelle syntaxe pour expressions complexes [math:...]
+    Une expression refusée (trop longue, trop imbriquée...) est affichée en texte échappé.
+    """
+    try:
+        parsed = parse_math_expression(expr)
+        return f'<math class="math-inline">{parsed}</math>'
+    except ExpressionTropComplexe as e:
+        _garde.signaler(e.motif)
+        logger.warning("Expression [math:...] refusée (%s : %s), affichée en texte : %.80r", e.motif, e, expr)
+    except Exception:
+        _garde.signaler('erreur')
+        logger.exception("Erreur lors du parsing de %.80r", expr)
+    return str(escape(expr))
+
+
+def _convertir_fraction(frac):
+    """[frac:3/4] ou [frac:⅓]"""
+    frac = frac.strip()
+
+    # Gérer les fractions Unicode
+    if frac in UNICODE_FRACTIONS:
+        num, den = UNICODE_FRACTIONS[frac].split('/')
+        return MathMLConverter.fraction(num, den)
+
+    # Gérer les fractions classiques avec /
+    if '/' in frac:
+        num, _, den = frac.partition('/')
+        return MathMLConverter.fraction(num.strip(), den.strip())
+
+    # Si ce n'est ni Unicode ni avec /, laisser tel quel
+    return None
+
+
+def _convertir_puissance(expr):
+    """[pow:x^2]"""
+    if '^' in expr:
+        base, _, exp = expr.partition('^')
+        return MathMLConverter.puissance(base.strip(), exp.strip())
+    return None
+
+
+def _convertir_racine(value):
+    """[sqrt:16]"""
+    return MathMLConverter.racine(value.strip())
+
+
+def _convertir_racine_n(contenu):
+    """[root:8,3]"""
+    values = contenu.split(',')
+    if len(values) == 2:
+        radicande, indice = values
+        return MathMLConverter.racine(radicande.strip(), indice.strip())
+    return None
+
+
+def _convertir_variable(var):
+    """[var:x_1]"""
+    if '_' in var:
+        nom, _, indice = var.partition('_')
+        return MathMLConverter.variable(nom.strip(), indice.strip())
+    return MathMLConverter.variable(var.strip())
+
+
+_CONVERSIONS = {
+    'math': _convertir_math,
+    'frac': _convertir_fraction,
+    'pow': _convertir_puissance,
+    'sqrt': _convertir_racine,
+    'root': _convertir_racine_n,
+    'var': _convertir_variable
+}
 
-    # Si c'est juste un nombre
-    if re.match(r'^-?\d+(\.\d+)?$', expr):
-        return f"<mn>{expr}</mn>"
-
-    # Si c'est une variable simple
-    if re.match(r'^[a-zA-Z]$', expr):
-        return f"<mi>{expr}</mi>"
-
-    # Gérer les expressions avec opérateurs
-    # Priorité : *, /, puis +, -
-
-    # Chercher + ou - (priorité la plus faible)
-    for op in ['+', '-']:
-        # Chercher l'opérateur en dehors des parenthèses
-        paren_count = 0
-        for i, char in enumerate(expr):
-            if char == '(':
-                paren_count += 1
-            elif char == ')':
-                paren_count -= 1
-            elif char == op and paren_count == 0 and i > 0:  # Ne pas traiter le - initial
-                left = parse_complex_expression(expr[:i])
-                right = parse_complex_expression(expr[i+1:])
-                return f"{left}<mo>{op}</mo>{right}"
-
-    # Chercher * ou /
-    for op in ['*', '/']:
-        paren_count = 0
-        for i, char in enumerate(expr):
-            if char == '(':
-                paren_count += 1
-            elif char == ')':
-                paren_count -= 1
-            elif char == op and paren_count == 0:
-                left = parse_complex_expression(expr[:i])
-                right = parse_complex_expression(expr[i+1:])
-                op_symbol = '×' if op == '*' else '÷'
-                return f"{left}<mo>{op_symbol}</mo>{right}"
-
-    # Si l'expression est entre parenthèses, les enlever
-    if expr.startswith('(') and expr.endswith(')'):
-        return parse_complex_expression(expr[1:-1])
-
-    # Gérer les variables avec plusieurs caractères ou les expressions inconnues
-    if re.match(r'^[a-zA-Z_]\w*$', expr):
-        return f"<mi>{expr}</mi>"
-
-    # Par défaut, traiter comme du texte
-    return f"<mi>{expr}</mi>"
 
 def convert_math_notation(text):
     """
@@ -246,110 +524,159 @@ def convert_math_notation(text):
     - [sqrt:16] → racine simple (ancienne syntaxe)
     - [root:8,3] → racine n-ième
     - [var:x_1] → variable avec indice
+
+    Le texte est parcouru une seule fois de gauche à droite ; une notation
+    invalide (ex. [pow:x] sans ^) est laissée telle quelle.
     """
+    # La plupart des énoncés ne contiennent aucune notation
+    if '[' not in text:
+        return text
 
-    # Dictionnaire des fractions Unicode vers fractions classiques
-    unicode_fractions = {
-        '½': '1/2',
-        '⅓': '1/3',
-        '⅔': '2/3',
-        '¼': '1/4',
-        '¾': '3/4',
-        '⅕': '1/5',
-        '⅖': '2/5',
-        '⅗': '3/5',
-        '⅘': '4/5',
-        '⅙': '1/6',
-        '⅚': '5/6',
-        '⅛': '1/8',
-        '⅜': '3/8',
-        '⅝': '5/8',
-        '⅞': '7/8',
-        '⅐': '1/7',
-        '⅑': '1/9',
-        '⅒': '1/10'
-    }
-
-    # Nouvelle syntaxe pour expressions complexes [math:...]
-    def replace_math_expression(match):
-        expr = match.group(1)
-        try:
-            parsed = parse_math_expression(expr)
-            return f'<math class="math-inline">{parsed}</math>'
-        except Exception as e:
-            print(f"Erreur lors du parsing de '{expr}': {e}")
-            # En cas d'erreur, retourner l'expression originale avec un format de base
-            return f'<math class="math-inline"><mi>Erreur: {expr}</mi></math>'
-
-    text = re.sub(r'\[math:([^\]]+)\]', replace_math_expression, text)
-
-    # Ancienne syntaxe maintenue pour compatibilité
-    # Conversion des fractions [frac:3/4] ou [frac:⅓]
-    def replace_fraction(match):
-        frac = match.group(1).strip()
-
-        # Gérer les fractions Unicode
-        if frac in unicode_fractions:
-            num, den = unicode_fractions[frac].split('/')
-            return MathMLConverter.fraction(num, den)
-
-        # Gérer les fractions classiques avec /
-        if '/' in frac:
-            num, den = frac.split('/')
-            return MathMLConverter.fraction(num.strip(), den.strip())
-
-        # Si ce n'est ni Unicode ni avec /, retourner tel quel
-        return match.group(0)
-
-    text = re.sub(r'\[frac:([^\]]+)\]', replace_fraction, text)
-
-    # Conversion des puissances [pow:x^2]
-    def replace_power(match):
-        expr = match.group(1)
-        if '^' in expr:
-            base, exp = expr.split('^')
-            return MathMLConverter.puissance(base.strip(), exp.strip())
-        return match.group(0)
-
-    text = re.sub(r'\[pow:([^\]]+)\]', replace_power, text)
-
-    # Conversion des racines carrées [sqrt:16]
-    def replace_sqrt(match):
-        value = match.group(1).strip()
-        return MathMLConverter.racine(value)
-
-    text = re.sub(r'\[sqrt:([^\]]+)\]', replace_sqrt, text)
-
-    # Conversion des racines n-ièmes [root:8,3]
-    def replace_root(match):
-        values = match.group(1).split(',')
-        if len(values) == 2:
-            radicande, indice = values
-            return MathMLConverter.racine(radicande.strip(), indice.strip())
-        return match.group(0)
-
-    text = re.sub(r'\[root:([^\]]+)\]', replace_root, text)
-
-    # Conversion des variables avec indices [var:x_1]
-    def replace_variable(match):
-        var = match.group(1)
-        if '_' in var:
-            nom, indice = var.split('_')
-            return MathMLConverter.variable(nom.strip(), indice.strip())
-        else:
-            return MathMLConverter.variable(var.strip())
+    morceaux = []
+    position = 0
+    recherche = 0
+    while True:
+        match = _NOTATION.search(text, recherche)
+        if match is None:
+            break
 
-    text = re.sub(r'\[var:([^\]]+)\]', replace_variable, text)
+        remplacement = _CONVERSIONS[match.group(1)](match.group(2))
+        if remplacement is None:
+            # Notation laissée telle quelle : une autre peut commencer à l'intérieur
+            recherche = match.start() + 1
+            continue
 
-    return text
+        morceaux.append(text[position:match.start()])
+        morceaux.append(remplacement)
+        position = recherche = match.end()
+
+    if not morceaux:
+        return text
+    morceaux.append(text[position:])
+    return ''.join(morceaux)
+
+class MathMLCache:
+    """
+    Cache LRU borné et thread-safe des rendus MathML, indexé sur le texte source.
+    Le texte des questions ne change qu'à l'édition : les rendus sont réutilisés
+    d'une page à l'autre. Une taille maximale de 0 désactive le cache.
+    """
+
+    def __init__(self, taille_max=2048):
+        self.taille_max = taille_max
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+        self.succes = 0
+        self.echecs = 0
+        self.evictions = 0
+
+    def get(self, cle, calcul):
+        """Renvoie le rendu en cache pour `cle`, ou le calcule via `calcul()`"""
+        with self._verrou:
+            if cle in self._entrees:
+                self._entrees.move_to_end(cle)
+                self.succes += 1
+                return self._entrees[cle]
+            self.echecs += 1
+
+        valeur = calcul()
+
+        if self.taille_max > 0:
+            with self._verrou:
+                self._entrees[cle] = valeur
+                self._entrees.move_to_end(cle)
+                while len(self._entrees) > self.taille_max:
+                    self._entrees.popitem(last=False)
+                    self.evictions += 1
+        return valeur
+
+    def configurer(self, taille_max):
+        """Change la taille maximale (les entrées en trop sont évincées)"""
+        with self._verrou:
+            self.taille_max = taille_max
+            while len(self._entrees) > max(taille_max, 0):
+                self._entrees.popitem(last=False)
+                self.evictions += 1
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+
+    def statistiques(self):
+        with self._verrou:
+            return {
+                'taille': len(self._entrees),
+                'taille_max': self.taille_max,
+                'succes': self.succes,
+                'echecs': self.echecs,
+                'evictions': self.evictions
+            }
+
+# Cache partagé par les filtres Jinja2
+_cache_rendu = MathMLCache()
+
+def configurer_cache_mathml(taille_max):
+    """Fixe la taille maximale du cache des rendus MathML (0 pour le désactiver)"""
+    _cache_rendu.configurer(taille_max)
+
+def statistiques_cache_mathml():
+    """Compteurs du cache des rendus MathML (succès, échecs, évictions)"""
+    return _cache_rendu.statistiques()
 
 def mathml_filter(text):
     """Filtre Jinja2 pour convertir les notations mathématiques"""
     if text:
-        converted = convert_math_notation(str(text))
+        text = str(text)
+        converted = _cache_rendu.get(('mathml', text), lambda: convert_math_notation(text))
         return Markup(converted)
     return text
 
+# Nettoyage des bords du HTML produit par l'éditeur : <p> englobant, <p> vides,
+# <br> et &nbsp; en début ou en fin de texte. Les motifs de fin sont écrits à
+# l'envers et appliqués au texte retourné, pour un seul passage depuis chaque bout.
+_ENVELOPPE_P = re.compile(r'^<p>(.*)</p>$', re.DOTALL | re.IGNORECASE)
+_ENVELOPPE_P_ATTRIBUTS = re.compile(r'^\s*<p[^>]*>(.*)</p>\s*$', re.DOTALL | re.IGNORECASE)
+
+_BORDS_P_VIDES = (re.compile(r'(<p>\s*</p>\s*)+', re.IGNORECASE),
+                  re.compile(r'(\s*>p/<\s*>p<)+', re.IGNORECASE))
+_BORDS_BR = (re.compile(r'(<br\s*/?>\s*)+', re.IGNORECASE),
+             re.compile(r'(\s*>/?\s*rb<)+', re.IGNORECASE))
+_BORDS_NBSP = (re.compile(r'(&nbsp;\s*)+', re.IGNORECASE),
+               re.compile(r'(\s*;psbn&)+', re.IGNORECASE))
+
+
+def nettoyer_bords_html(text, enveloppe_avec_attributs=False, espaces_insecables=True):
+    """
+    Retire le <p> qui encapsule tout le texte puis, en début et en fin, les
+    <p> vides, les <br> et (si espaces_insecables) les &nbsp;.
+
+    enveloppe_avec_attributs : accepte un <p ...> englobant avec attributs et
+    des espaces autour (saisie de l'éditeur) au lieu d'un <p> exact.
+    """
+    enveloppe = _ENVELOPPE_P_ATTRIBUTS if enveloppe_avec_attributs else _ENVELOPPE_P
+    text = enveloppe.sub(r'\1', text)
+
+    etapes = (_BORDS_P_VIDES, _BORDS_BR, _BORDS_NBSP) if espaces_insecables else (_BORDS_P_VIDES, _BORDS_BR)
+
+    longueur = len(text)
+    inverse = text[::-1]
+    debut, fin = 0, longueur
+    for motif_debut, motif_fin in etapes:
+        match = motif_debut.match(text, debut, fin)
+        if match:
+            debut = match.end()
+        match = motif_fin.match(inverse, longueur - fin, longueur - debut)
+        if match:
+            fin = longueur - match.end()
+
+    return text[debut:fin].strip()
+
+def strip_paragraphs(text):
+    """Nettoie le HTML saisi dans l'éditeur (<p> englobant, <p> vides et <br> en début/fin)"""
+    if not text:
+        return text
+    return nettoyer_bords_html(str(text).strip(), enveloppe_avec_attributs=True, espaces_insecables=False)
+
 def clean_display_filter(text):
     """
     Filtre Jinja2 pour nettoyer les balises HTML parasites à l'affichage
@@ -358,28 +685,7 @@ def clean_display_filter(text):
     if not text:
         return text
 
-    # Convertir en string si ce n'est pas déjà fait
-    text = str(text)
-
-    # Supprimer les balises <p> qui encapsulent tout le contenu
-    text = re.sub(r'^<p>(.*)</p>$', r'\1', text, flags=re.DOTALL | re.IGNORECASE)
-
-    # Supprimer les balises <p> vides en début/fin
-    text = re.sub(r'^(<p>\s*</p>\s*)+', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'(<p>\s*</p>\s*)+$', '', text, flags=re.IGNORECASE)
-
-    # Supprimer les <br> en début/fin
-    text = re.sub(r'^(<br\s*/?>\s*)+', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'(<br\s*/?>\s*)+$', '', text, flags=re.IGNORECASE)
-
-    # Supprimer les espaces HTML en début/fin
-    text = re.sub(r'^(&nbsp;\s*)+', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'(&nbsp;\s*)+$', '', text, flags=re.IGNORECASE)
-
-    # Nettoyer les espaces en début/fin
-    text = text.strip()
-
-    return Markup(text)
+    return Markup(nettoyer_bords_html(str(text)))
 
 def mathml_clean_filter(text):
     """
@@ -388,13 +694,22 @@ def mathml_clean_filter(text):
     if not text:
         return text
 
-    # D'abord convertir les notations mathématiques
-    converted = mathml_filter(text)
+    text = str(text)
+
+    def convertir_et_nettoyer():
+        # D'abord convertir les notations mathématiques, puis nettoyer l'affichage
+        return str(clean_display_filter(convert_math_notation(text)))
 
-    # Puis nettoyer l'affichage
-    cleaned = clean_display_filter(converted)
+    return Markup(_cache_rendu.get(('mathml_clean', text), convertir_et_nettoyer))
 
-    return cleaned
+def rendre_html(text):
+    """
+    Rendu HTML stocké en base à côté du texte source : notations converties
+    en MathML et affichage nettoyé (équivalent du filtre mathml_clean)
+    """
+    if not text:
+        return text
+    return str(clean_display_filter(convert_math_notation(str(text))))
 
 # Exemples d'utilisation pour la documentation
 EXAMPLES = {
@@ -2,20 +2,47 @@
 """
 Script de migration complète des données JSON vers SQLAlchemy
 Migre les 96 questions avec structure relationnelle
+
+Usage :
+    python migration_sqlalchemy.py           # migration complète (recrée toutes les tables)
+    python migration_sqlalchemy.py schema    # mise à jour du schéma en place (tables, colonnes et index manquants)
+    python migration_sqlalchemy.py rendu     # recalcule le HTML pré-rendu de toutes les questions
+    python migration_sqlalchemy.py compteurs # recalcule les compteurs de questions par chapitre
+    python migration_sqlalchemy.py json      # convertit results / distracteurs des questions à trous au type JSON
+    python migration_sqlalchemy.py sync [--simulation] [--supprimer]
+                                             # applique seulement les différences avec qcm_optimise.json
+    python migration_sqlalchemy.py import questions.ndjson [--lot 1000]
+                                             # importe des questions (NDJSON, tableau JSON ou CSV, '-' : entrée standard)
+    python migration_sqlalchemy.py export catalogue.csv [--format csv] [--type qcm]
+                                             # exporte le catalogue (NDJSON ou CSV, '-' : sortie standard)
 """
 
+import argparse
+import hashlib
 import json
+from collections import Counter
 import sys
 import os
 from flask import Flask
-from models import db, Niveau, Chapitre, Question
+from sqlalchemy import JSON, inspect, select, insert, text, update, delete
+from sqlalchemy.orm import contains_eager
+import models
+from models import db, Niveau, Chapitre, Question, QuestionsATrous, CatalogueVersion
+from import_export import importer_questions, ErreurImport, TAILLE_LOT, EXPORTS
 
 # Configuration temporaire pour la migration
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///qcm_database.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///qcm_database.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
+NIVEAUX = [
+    {'nom': '6eme', 'ordre': 1, 'description': 'Première année du collège - 49 questions'},
+    {'nom': '5eme', 'ordre': 2, 'description': 'Deuxième année du collège - 13 questions'},
+    {'nom': '4eme', 'ordre': 3, 'description': 'Troisième année du collège - 13 questions'},
+    {'nom': '3eme', 'ordre': 4, 'description': 'Quatrième année du collège - 12 questions'}
+]
+
 def migrer_donnees_completes():
     """Migre toutes les données depuis qcm_optimise.json vers SQLAlchemy"""
 
@@ -24,7 +51,8 @@ def migrer_donnees_completes():
 
         # Supprimer toutes les données existantes
         db.drop_all()
-        db.create_all()
+        # Recrée aussi les triggers de l'index de recherche, supprimés avec les tables
+        models.mettre_a_jour_schema()
         print("✅ Tables recréées")
 
         # Charger les données JSON
@@ -36,15 +64,8 @@ def migrer_donnees_completes():
             return False
 
         # 1. Créer les niveaux
-        niveaux_data = [
-            {'nom': '6eme', 'ordre': 1, 'description': 'Première année du collège - 49 questions'},
-            {'nom': '5eme', 'ordre': 2, 'description': 'Deuxième année du collège - 13 questions'},
-            {'nom': '4eme', 'ordre': 3, 'description': 'Troisième année du collège - 13 questions'},
-            {'nom': '3eme', 'ordre': 4, 'description': 'Quatrième année du collège - 12 questions'}
-        ]
-
         niveaux_created = {}
-        for niveau_data in niveaux_data:
+        for niveau_data in NIVEAUX:
             niveau = Niveau(**niveau_data)
             db.session.add(niveau)
             db.session.flush()  # Pour obtenir l'ID
@@ -108,6 +129,7 @@ def migrer_donnees_completes():
                     difficulte=difficulte,
                     chapitre_id=chapitre_id
                 )
+                question.mettre_a_jour_html()
 
                 db.session.add(question)
                 questions_migrees += 1
@@ -118,6 +140,7 @@ def migrer_donnees_completes():
 
         # Commit toutes les données
         try:
+            models.CompteurQuestions.reconstruire()
             db.session.commit()
             print(f"✅ Migration terminée:")
             print(f"   • {questions_migrees} questions migrées avec succès")
@@ -133,6 +156,341 @@ def migrer_donnees_completes():
             db.session.rollback()
             return False
 
+def mettre_a_jour_schema():
+    """
+    Met à jour le schéma d'une base existante sans perte de données :
+    crée les tables, colonnes et index déclarés dans models.py qui manquent encore.
+    Peut être relancé sans risque.
+    """
+
+    with app.app_context():
+        print("🔄 Mise à jour du schéma...")
+
+        changements = models.mettre_a_jour_schema()
+        for changement in changements:
+            print(f"   • {changement}")
+
+        if not changements:
+            print("✅ Schéma déjà à jour")
+        else:
+            print(f"✅ {len(changements)} changements appliqués")
+        return True
+
+def rendre_catalogue(taille_lot=500):
+    """Recalcule les rendus HTML pré-calculés de toutes les questions (QCM et à trous)"""
+
+    with app.app_context():
+        models.mettre_a_jour_schema()
+        print("🔄 Rendu HTML du catalogue...")
+
+        for modele in (Question, QuestionsATrous):
+            nb = 0
+            for question in modele.query.order_by(modele.id).yield_per(taille_lot):
+                question.mettre_a_jour_html()
+                nb += 1
+            print(f"   • {nb} lignes de {modele.__tablename__} rendues")
+
+        # Les processus de l'application vident leur cache à la prochaine vérification
+        CatalogueVersion.incrementer()
+        db.session.commit()
+        print("✅ Rendu terminé")
+        return True
+
+def _decoder_json(brut):
+    """
+    Valeur du texte JSON brut d'une colonne, décodé une seule fois. Seule exception :
+    une chaîne contenant une liste JSON est une liste encodée deux fois et est rendue
+    décodée ; toute autre chaîne (ex. "mot") est gardée telle quelle.
+    """
+    valeur = json.loads(brut)
+    if isinstance(valeur, str) and valeur.lstrip().startswith('['):
+        try:
+            liste = json.loads(valeur)
+        except json.JSONDecodeError:
+            return valeur
+        if isinstance(liste, list):
+            return liste
+    return valeur
+
+def _forme_normale(brut, valeur):
+    """Vrai si `brut` est déjà `valeur` telle que l'écrit le type JSON (texte, ou décodée par le pilote)"""
+    return brut == valeur or brut == json.dumps(valeur)
+
+def convertir_json(taille_lot=500):
+    """
+    Passe les colonnes results et distracteurs des questions à trous au type JSON :
+    change le type des colonnes texte sur PostgreSQL (SQLite garde le texte tel quel)
+    et réécrit les valeurs qui ne sont pas sous forme normale (JSON encodé deux fois,
+    distracteurs manquants remplacés par une liste vide par trou).
+    Peut être relancé sans risque.
+    """
+
+    with app.app_context():
+        models.mettre_a_jour_schema()
+        print("🔄 Conversion des colonnes JSON des questions à trous...")
+
+        if db.engine.dialect.name == 'postgresql':
+            colonnes = {colonne['name']: colonne['type']
+                        for colonne in inspect(db.engine).get_columns(QuestionsATrous.__tablename__)}
+            for nom in ('results', 'distracteurs'):
+                if not isinstance(colonnes[nom], JSON):
+                    db.session.execute(text(
+                        f"ALTER TABLE {QuestionsATrous.__tablename__} "
+                        f"ALTER COLUMN {nom} TYPE JSON USING {nom}::json"
+                    ))
+                    print(f"   • Colonne {nom} convertie en JSON")
+
+        # Texte JSON brut, sans le décodage du type JSON ni celui du pilote
+        lignes = db.session.execute(text(
+            f"SELECT id, CAST(results AS TEXT), CAST(distracteurs AS TEXT) "
+            f"FROM {QuestionsATrous.__tablename__} ORDER BY id"
+        )).all()
+        a_modifier = []
+        nb_erreurs = 0
+        for question_id, results_brut, distracteurs_brut in lignes:
+            try:
+                results = _decoder_json(results_brut)
+                distracteurs = _decoder_json(distracteurs_brut)
+            except json.JSONDecodeError as e:
+                print(f"❌ Question à trous {question_id} : JSON invalide ({e})")
+                nb_erreurs += 1
+                continue
+            if not distracteurs:
+                distracteurs = [[] for _ in results]
+
+            if not (_forme_normale(results_brut, results) and _forme_normale(distracteurs_brut, distracteurs)):
+                a_modifier.append({'id': question_id, 'results': results, 'distracteurs': distracteurs})
+
+        for debut in range(0, len(a_modifier), taille_lot):
+            db.session.execute(update(QuestionsATrous), a_modifier[debut:debut + taille_lot])
+
+        print(f"   • {len(a_modifier)} questions à trous réécrites sur {len(lignes)}")
+        if nb_erreurs:
+            print(f"   • {nb_erreurs} questions à trous ignorées")
+
+        # Les processus de l'application vident leur cache à la prochaine vérification
+        CatalogueVersion.incrementer()
+        db.session.commit()
+        print("✅ Conversion terminée")
+        return nb_erreurs == 0
+
+# Colonnes comparées par la synchronisation (le rendu HTML en découle)
+COLONNES_SYNC = ('probleme', 'option_a', 'option_b', 'option_c', 'option_d',
+                 'reponse_correcte', 'explication', 'difficulte', 'chapitre_id')
+
+def empreinte_question(valeurs):
+    """Empreinte du contenu d'une question (dict colonne -> valeur)"""
+    contenu = json.dumps([valeurs[colonne] for colonne in COLONNES_SYNC], ensure_ascii=False)
+    return hashlib.sha1(contenu.encode('utf-8')).digest()
+
+def synchroniser_chapitres(data):
+    """
+    Crée les niveaux et chapitres manquants et met à jour ceux qui ont changé
+    (les chapitres absents du fichier sont gardés : des questions à trous peuvent y être rattachées).
+    Renvoie ((niveau, chapitre) -> id, nombre de chapitres créés ou modifiés).
+    """
+    niveaux = {niveau.nom: niveau for niveau in Niveau.query.all()}
+    for niveau_data in NIVEAUX:
+        if niveau_data['nom'] not in niveaux:
+            niveaux[niveau_data['nom']] = Niveau(**niveau_data)
+            db.session.add(niveaux[niveau_data['nom']])
+
+    chapitres = {(chapitre.niveau.nom, chapitre.nom): chapitre
+                 for chapitre in Chapitre.query.join(Chapitre.niveau).options(contains_eager(Chapitre.niveau))}
+    nb_changements = 0
+    for niveau_nom, chapitres_info in data.get('chapitres_info', {}).items():
+        for ordre, (chapitre_nom, info) in enumerate(chapitres_info.items(), start=1):
+            attendu = {'titre': info['titre'], 'description': info['description'],
+                       'pages': info['pages'], 'ordre': ordre}
+            chapitre = chapitres.get((niveau_nom, chapitre_nom))
+            if chapitre is None:
+                chapitre = Chapitre(nom=chapitre_nom, niveau=niveaux[niveau_nom], **attendu)
+                db.session.add(chapitre)
+                chapitres[(niveau_nom, chapitre_nom)] = chapitre
+                nb_changements += 1
+            elif any(getattr(chapitre, cle) != valeur for cle, valeur in attendu.items()):
+                for cle, valeur in attendu.items():
+                    setattr(chapitre, cle, valeur)
+                nb_changements += 1
+
+    db.session.flush()
+    return {cle: chapitre.id for cle, chapitre in chapitres.items()}, nb_changements
+
+def synchroniser_donnees(simulation=False, taille_lot=500, chemin='qcm_optimise.json', supprimer=False):
+    """
+    Synchronise les questions QCM avec qcm_optimise.json sans recréer la base : compare
+    l'empreinte de chaque question du fichier à celle de la base, puis applique par lots
+    les seuls INSERT, UPDATE et DELETE nécessaires, dans une transaction.
+    simulation : affiche le bilan sans rien modifier.
+    supprimer : supprime aussi les questions absentes du fichier ; sans cette option
+    elles sont conservées (questions créées depuis l'administration ou l'API).
+    """
+
+    with app.app_context():
+        models.mettre_a_jour_schema()
+        print(f"🔄 Synchronisation avec {chemin}{' (simulation)' if simulation else ''}...")
+
+        try:
+            with open(chemin, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            print(f"❌ Fichier {chemin} non trouvé")
+            return False
+
+        try:
+            chapitres, nb_chapitres = synchroniser_chapitres(data)
+
+            # Empreintes du fichier
+            source = {}
+            ids_fichier = set()
+            nb_erreurs = 0
+            for question_id, question_data in data['questions'].items():
+                ids_fichier.add(int(question_id))
+                try:
+                    tag = data['tags'][question_id]
+                    valeurs = {
+                        'id': int(question_id),
+                        'probleme': question_data['probleme'],
+                        'option_a': question_data['options'][0],
+                        'option_b': question_data['options'][1],
+                        'option_c': question_data['options'][2],
+                        'option_d': question_data['options'][3],
+                        'reponse_correcte': question_data['reponse_correcte'],
+                        'explication': question_data['explication'],
+                        'difficulte': tag['difficulte'],
+                        'chapitre_id': chapitres[(tag['niveau'], tag['chapitre'])]
+                    }
+                except (KeyError, IndexError) as e:
+                    # Question gardée telle quelle en base
+                    print(f"⚠️ Question {question_id} ignorée : données incomplètes ({e!r})")
+                    nb_erreurs += 1
+                    continue
+                source[valeurs['id']] = (empreinte_question(valeurs), valeurs)
+
+            # Comparaison avec la base, lue par lots
+            a_modifier = []
+            a_supprimer = []
+            absentes = 0
+            vus = set()
+            compteurs = Counter()
+            colonnes = [getattr(Question, colonne) for colonne in COLONNES_SYNC]
+            for ligne in db.session.execute(
+                    select(Question.id, *colonnes).execution_options(yield_per=taille_lot)):
+                vus.add(ligne.id)
+                if ligne.id not in ids_fichier:
+                    if not supprimer:
+                        absentes += 1
+                        continue
+                    a_supprimer.append(ligne.id)
+                elif ligne.id in source and source[ligne.id][0] != empreinte_question(ligne._mapping):
+                    a_modifier.append(ligne.id)
+                else:
+                    continue
+                compteurs[(ligne.chapitre_id, 'qcm', ligne.difficulte)] -= 1
+            a_inserer = [question_id for question_id in source if question_id not in vus]
+            for question_id in a_inserer + a_modifier:
+                valeurs = source[question_id][1]
+                compteurs[(valeurs['chapitre_id'], 'qcm', valeurs['difficulte'])] += 1
+
+            print(f"   • {nb_chapitres} chapitres créés ou modifiés")
+            print(f"   • {len(a_inserer)} questions à ajouter, {len(a_modifier)} à modifier, "
+                  f"{len(a_supprimer)} à supprimer, "
+                  f"{len(source) - len(a_modifier) - len(a_inserer)} inchangées")
+            for libelle, ids in (('ajout', a_inserer), ('modification', a_modifier), ('suppression', a_supprimer)):
+                if ids:
+                    apercu = ', '.join(str(question_id) for question_id in sorted(ids)[:20])
+                    print(f"     {libelle} : {apercu}{' ...' if len(ids) > 20 else ''}")
+            if nb_erreurs:
+                print(f"   • {nb_erreurs} questions du fichier ignorées")
+            if absentes:
+                print(f"   • {absentes} questions absentes du fichier conservées (--supprimer pour les retirer)")
+
+            if simulation or not (nb_chapitres or a_inserer or a_modifier or a_supprimer):
+                db.session.rollback()
+                print("✅ Aucune modification appliquée" if simulation else "✅ Base déjà à jour")
+                return True
+
+            def avec_rendus(question_id):
+                valeurs = dict(source[question_id][1])
+                valeurs.update(Question.rendus_html(valeurs))
+                return valeurs
+
+            for debut in range(0, len(a_inserer), taille_lot):
+                lot = a_inserer[debut:debut + taille_lot]
+                db.session.execute(insert(Question), [avec_rendus(question_id) for question_id in lot])
+            for debut in range(0, len(a_modifier), taille_lot):
+                lot = a_modifier[debut:debut + taille_lot]
+                db.session.execute(update(Question), [avec_rendus(question_id) for question_id in lot])
+            for debut in range(0, len(a_supprimer), taille_lot):
+                lot = a_supprimer[debut:debut + taille_lot]
+                db.session.execute(delete(Question).where(Question.id.in_(lot)))
+
+            models.CompteurQuestions.ajuster(compteurs)
+
+            # Les processus de l'application vident leur cache à la prochaine vérification
+            CatalogueVersion.incrementer()
+            db.session.commit()
+            print("✅ Synchronisation terminée")
+            return True
+
+        except Exception as e:
+            print(f"❌ Erreur lors de la synchronisation : {e}")
+            db.session.rollback()
+            return False
+
+def reconstruire_compteurs():
+    """Recalcule la table des compteurs de questions (par chapitre, type et difficulté)"""
+
+    with app.app_context():
+        models.mettre_a_jour_schema()
+        print("🔄 Calcul des compteurs de questions...")
+        nb_lignes = models.CompteurQuestions.reconstruire()
+        CatalogueVersion.incrementer()
+        db.session.commit()
+        print(f"✅ {nb_lignes} compteurs recalculés")
+        return True
+
+def importer_fichier(chemin, taille_lot=TAILLE_LOT):
+    """Importe en masse des questions depuis un fichier NDJSON, tableau JSON ou CSV ('-' : entrée standard)"""
+
+    with app.app_context():
+        models.mettre_a_jour_schema()
+        print(f"🔄 Import de {chemin}...")
+
+        flux = sys.stdin if chemin == '-' else open(chemin, 'r', encoding='utf-8-sig')
+        try:
+            rapport = importer_questions(flux, taille_lot)
+        except ErreurImport as e:
+            print(f"❌ {e} : import annulé")
+            return False
+        finally:
+            if flux is not sys.stdin:
+                flux.close()
+
+        for erreur in rapport.erreurs:
+            print(f"   ⚠️ {erreur['position']} : {erreur['erreur']}")
+        if rapport.nb_erreurs > len(rapport.erreurs):
+            print(f"   ⚠️ ... {rapport.nb_erreurs - len(rapport.erreurs)} autres erreurs")
+        print(f"✅ Import terminé : {rapport.importees['qcm']} questions QCM, "
+              f"{rapport.importees['trous']} questions à trous, {rapport.nb_erreurs} enregistrements écartés")
+        return True
+
+def exporter_fichier(chemin, format_export=None, types=None):
+    """Exporte le catalogue dans un fichier NDJSON ou CSV ('-' : sortie standard)"""
+
+    format_export = format_export or ('csv' if chemin.endswith('.csv') else 'ndjson')
+    with app.app_context():
+        sortie = sys.stdout if chemin == '-' else open(chemin, 'w', encoding='utf-8', newline='')
+        try:
+            for morceau in EXPORTS[format_export][0](types):
+                sortie.write(morceau)
+        finally:
+            if sortie is not sys.stdout:
+                sortie.close()
+        if sortie is not sys.stdout:
+            print(f"✅ Catalogue exporté dans {chemin} ({format_export})")
+        return True
+
 def verifier_integrite():
     """Vérifie l'intégrité des données migrées"""
 
@@ -162,6 +520,43 @@ def verifier_integrite():
 
 def main():
     """Migration principale"""
+    parser = argparse.ArgumentParser(description="Migration de la base QCM")
+    parser.add_argument('commande', nargs='?', default='complete', choices=['complete', 'sync', 'schema', 'rendu', 'compteurs', 'json', 'import', 'export'],
+                        help="complete : recrée la base depuis qcm_optimise.json ; "
+                             "sync : applique seulement les différences avec qcm_optimise.json ; "
+                             "schema : ajoute les tables, colonnes et index manquants sans toucher aux données ; "
+                             "rendu : recalcule le HTML pré-rendu des questions et les banques de mots des questions à trous ; "
+                             "compteurs : recalcule les compteurs de questions par chapitre ; "
+                             "json : convertit les colonnes results et distracteurs des questions à trous au type JSON ; "
+                             "import : ajoute les questions d'un fichier NDJSON, tableau JSON ou CSV ; "
+                             "export : écrit le catalogue dans un fichier NDJSON ou CSV")
+    parser.add_argument('fichier', nargs='?', help="Fichier à importer ou exporter ('-' : entrée ou sortie standard)")
+    parser.add_argument('--lot', type=int, default=TAILLE_LOT, help="Nombre de lignes par INSERT (import, sync, json)")
+    parser.add_argument('--simulation', action='store_true', help="sync : affiche les différences sans les appliquer")
+    parser.add_argument('--supprimer', action='store_true', help="sync : supprime aussi les questions absentes du fichier")
+    parser.add_argument('--format', choices=list(EXPORTS), help="export : format (d'après l'extension par défaut)")
+    parser.add_argument('--type', action='append', choices=['qcm', 'trous'], help="export : type de questions (tous par défaut)")
+    args = parser.parse_args()
+
+    if args.commande == 'schema':
+        return mettre_a_jour_schema()
+    if args.commande == 'rendu':
+        return rendre_catalogue()
+    if args.commande == 'compteurs':
+        return reconstruire_compteurs()
+    if args.commande == 'json':
+        return convertir_json(taille_lot=args.lot)
+    if args.commande == 'sync':
+        return synchroniser_donnees(simulation=args.simulation, taille_lot=args.lot, supprimer=args.supprimer)
+    if args.commande == 'import':
+        if not args.fichier:
+            parser.error("import : fichier à importer manquant")
+        return importer_fichier(args.fichier, args.lot)
+    if args.commande == 'export':
+        if not args.fichier:
+            parser.error("export : fichier de destination manquant")
+        return exporter_fichier(args.fichier, args.format, args.type)
+
     if not os.path.exists('qcm_optimise.json'):
         print("❌ Fichier qcm_optimise.json manquant")
         print("Veuillez d'abord créer ce fichier avec vos données")
@@ -1,10 +1,18 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, JSON, ForeignKey, Index, inspect, text
+from sqlalchemy import delete, func, insert, literal, select, update
 from sqlalchemy.orm import relationship
+from jinja2.utils import htmlsafe_json_dumps
+from markupsafe import Markup
+from mathml_utils import rendre_html
 import json
 
 db = SQLAlchemy()
 
+def _html_ou_rendu(html, source):
+    """Rendu stocké, ou calculé depuis la source si la colonne n'est pas encore remplie"""
+    return html if html is not None else rendre_html(source)
+
 class Niveau(db.Model):
     """Modèle pour les niveaux scolaires (6ème, 5ème, 4ème, 3ème)"""
     __tablename__ = 'niveaux'
@@ -31,6 +39,10 @@ class Niveau(db.Model):
 class Chapitre(db.Model):
     """Modèle pour les chapitres de cours"""
     __tablename__ = 'chapitres'
+    __table_args__ = (
+        # Recherche d'un chapitre par (niveau, nom)
+        Index('ix_chapitres_niveau_id_nom', 'niveau_id', 'nom'),
+    )
 
     id = Column(Integer, primary_key=True)
     nom = Column(String(50), nullable=False)
@@ -49,7 +61,11 @@ class Chapitre(db.Model):
     def __repr__(self):
         return f'<Chapitre {self.titre}>'
 
-    def to_dict(self):
+    def to_dict(self, nb_questions=None):
+        # Passer nb_questions quand il est déjà connu (COUNT groupé) évite de
+        # charger toutes les questions du chapitre
+        if nb_questions is None:
+            nb_questions = len(self.questions) if self.questions else 0
         return {
             'id': self.id,
             'nom': self.nom,
@@ -58,12 +74,16 @@ class Chapitre(db.Model):
             'pages': self.pages,
             'ordre': self.ordre,
             'niveau_id': self.niveau_id,
-            'nb_questions': len(self.questions) if self.questions else 0
+            'nb_questions': nb_questions
         }
 
 class Question(db.Model):
     """Modèle pour les questions QCM"""
     __tablename__ = 'questions'
+    __table_args__ = (
+        # Questions d'un chapitre triées par id
+        Index('ix_questions_chapitre_id_id', 'chapitre_id', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     probleme = Column(Text, nullable=False)
@@ -75,6 +95,14 @@ class Question(db.Model):
     explication = Column(Text, nullable=False)
     difficulte = Column(String(20), nullable=False)  # facile, moyen, difficile
 
+    # Rendus HTML (MathML) pré-calculés à l'écriture, affichés tels quels par les templates
+    probleme_html = Column(Text)
+    option_a_html = Column(Text)
+    option_b_html = Column(Text)
+    option_c_html = Column(Text)
+    option_d_html = Column(Text)
+    explication_html = Column(Text)
+
     # Clé étrangère
     chapitre_id = Column(Integer, ForeignKey('chapitres.id'), nullable=False)
 
@@ -89,11 +117,34 @@ class Question(db.Model):
         """Retourne les options sous forme de liste"""
         return [self.option_a, self.option_b, self.option_c, self.option_d]
 
+    @property
+    def options_html(self):
+        return [self.option_a_html, self.option_b_html, self.option_c_html, self.option_d_html]
+
+    # Colonnes texte dont le rendu HTML est stocké dans <colonne>_html
+    COLONNES_RENDUES = ('probleme', 'option_a', 'option_b', 'option_c', 'option_d', 'explication')
+
+    @classmethod
+    def rendus_html(cls, valeurs):
+        """Rendus HTML à stocker pour les textes sources de `valeurs` (colonne -> texte)"""
+        return {f'{colonne}_html': rendre_html(valeurs[colonne]) for colonne in cls.COLONNES_RENDUES}
+
+    def mettre_a_jour_html(self):
+        """Recalcule les rendus HTML à partir du texte source"""
+        sources = {colonne: getattr(self, colonne) for colonne in self.COLONNES_RENDUES}
+        for colonne, html in self.rendus_html(sources).items():
+            setattr(self, colonne, html)
+
     def to_dict(self):
         return {
             'id': self.id,
             'probleme': self.probleme,
             'options': self.options,
+            # Rendu à la volée seulement pour les lignes pas encore rétro-remplies
+            'probleme_html': _html_ou_rendu(self.probleme_html, self.probleme),
+            'options_html': [_html_ou_rendu(html, option)
+                             for html, option in zip(self.options_html, self.options)],
+            'explication_html': _html_ou_rendu(self.explication_html, self.explication),
             'reponse_correcte': self.reponse_correcte,
             'explication': self.explication,
             'difficulte': self.difficulte,
@@ -106,33 +157,74 @@ class Question(db.Model):
 class QuestionsATrous(db.Model):
     """Modèle pour les questions à trous"""
     __tablename__ = 'questions_a_trous'
+    __table_args__ = (
+        Index('ix_questions_a_trous_chapitre_id_id', 'chapitre_id', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     probleme = Column(Text, nullable=False)
-    results = Column(Text, nullable=False) # JSON list of correct words (ordered)
-    distracteurs = Column(Text, nullable=True) # JSON list of lists (distracteurs par trou)
+    # Décodés une fois au chargement de la ligne (type JSON), pas à chaque accès
+    results = Column(JSON, nullable=False) # liste des mots attendus, dans l'ordre des trous
+    distracteurs = Column(JSON(none_as_null=True), nullable=True) # liste de listes (distracteurs par trou)
     difficulte = Column(String(20), nullable=False)
     chapitre_id = Column(Integer, ForeignKey('chapitres.id'), nullable=False)
 
+    # Rendu HTML pré-calculé de l'énoncé, trous affichés « ... » (page de résultats)
+    probleme_html = Column(Text)
+    # Pré-calculés pour la page de la question, en JSON insérable tel quel dans un <script> :
+    # morceaux de l'énoncé entre les trous, et banque de mots triée (réponses et distracteurs)
+    segments_json = Column(Text)
+    choix_mots_json = Column(Text)
+
     chapitre = relationship('Chapitre')
 
     def __repr__(self):
         return f'<QuestionsATrous {self.id}: {self.probleme[:50]}...>'
 
+    # Colonnes sources des rendus pré-calculés
+    COLONNES_RENDUES = ('probleme', 'results', 'distracteurs')
+
+    @staticmethod
+    def rendus_html(valeurs):
+        """Rendus à stocker pour les colonnes sources de `valeurs` (colonne -> valeur)"""
+        mots = set(valeurs['results'])
+        for distracteurs in valeurs['distracteurs'] or []:
+            mots.update(distracteurs)
+        return {
+            'probleme_html': rendre_html(valeurs['probleme'].replace('[TROU]', '...')),
+            'segments_json': str(htmlsafe_json_dumps(valeurs['probleme'].split('[TROU]'))),
+            'choix_mots_json': str(htmlsafe_json_dumps(sorted(mots))),
+        }
+
+    def _rendus(self):
+        return self.rendus_html({colonne: getattr(self, colonne) for colonne in self.COLONNES_RENDUES})
+
+    def mettre_a_jour_html(self):
+        """Recalcule les rendus pré-calculés à partir des colonnes sources"""
+        for colonne, rendu in self._rendus().items():
+            setattr(self, colonne, rendu)
+
+    @property
+    def segments_script(self):
+        """Morceaux de l'énoncé entre les trous (JSON pour un <script>)"""
+        return Markup(self.segments_json if self.segments_json is not None else self._rendus()['segments_json'])
+
+    @property
+    def choix_mots_script(self):
+        """Mots à placer dans les trous, triés et sans doublons (JSON pour un <script>)"""
+        return Markup(self.choix_mots_json if self.choix_mots_json is not None else self._rendus()['choix_mots_json'])
+
     @property
     def results_list(self):
-        import json
-        return json.loads(self.results)
+        return self.results
 
     @property
     def distracteurs_list(self):
-        import json
         if self.distracteurs:
-            return json.loads(self.distracteurs)
-        return [[] for _ in self.results_list]
+            return self.distracteurs
+        return [[] for _ in self.results]
 
     def to_dict(self):
-        import json
         return {
             'id': self.id,
             'probleme': self.probleme,
@@ -144,3 +236,107 @@ class QuestionsATrous(db.Model):
             'chapitre_titre': self.chapitre.titre if self.chapitre else None,
         }
 
+
+class CatalogueVersion(db.Model):
+    """Version du catalogue, incrémentée à chaque écriture pour invalider les caches"""
+    __tablename__ = 'catalogue_version'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+    @staticmethod
+    def courante():
+        """Lit la version courante directement en base (0 si jamais incrémentée)"""
+        version = db.session.query(CatalogueVersion.version).filter_by(id=1).scalar()
+        return version or 0
+
+    @staticmethod
+    def incrementer():
+        """Incrémente la version dans la transaction en cours"""
+        ligne = db.session.get(CatalogueVersion, 1)
+        if ligne is None:
+            db.session.add(CatalogueVersion(id=1, version=1))
+        else:
+            ligne.version = CatalogueVersion.version + 1
+
+
+
+class CompteurQuestions(db.Model):
+    """
+    Nombre de questions par chapitre, type ('qcm' ou 'trous') et difficulté, tenu à
+    jour dans la transaction de chaque écriture : les listes de chapitres et les
+    statistiques se lisent ici sans compter les questions.
+    """
+    __tablename__ = 'compteurs_questions'
+
+    chapitre_id = Column(Integer, ForeignKey('chapitres.id'), primary_key=True)
+    type = Column(String(10), primary_key=True)
+    difficulte = Column(String(20), primary_key=True)
+    nombre = Column(Integer, nullable=False, default=0)
+
+    TYPES = {'qcm': Question, 'trous': QuestionsATrous}
+
+    @staticmethod
+    def ajuster(variations):
+        """Applique des variations {(chapitre_id, type, difficulte): delta} dans la transaction en cours"""
+        for (chapitre_id, type_question, difficulte), delta in variations.items():
+            if not delta:
+                continue
+            cle = {'chapitre_id': int(chapitre_id), 'type': type_question, 'difficulte': difficulte}
+            # UPDATE d'abord : il prend le verrou d'écriture, l'INSERT qui suit ne peut pas entrer en conflit
+            resultat = db.session.execute(
+                update(CompteurQuestions).filter_by(**cle).values(nombre=CompteurQuestions.nombre + delta)
+            )
+            if resultat.rowcount == 0:
+                db.session.execute(insert(CompteurQuestions).values(nombre=delta, **cle))
+
+    @staticmethod
+    def reconstruire():
+        """Recalcule tous les compteurs depuis les tables de questions, dans la transaction en cours"""
+        db.session.execute(delete(CompteurQuestions))
+        for type_question, modele in CompteurQuestions.TYPES.items():
+            db.session.execute(insert(CompteurQuestions).from_select(
+                ['chapitre_id', 'type', 'difficulte', 'nombre'],
+                select(modele.chapitre_id, literal(type_question), modele.difficulte, func.count(modele.id))
+                .group_by(modele.chapitre_id, modele.difficulte)
+            ))
+        return db.session.query(func.count()).select_from(CompteurQuestions).scalar()
+
+
+def mettre_a_jour_schema():
+    """
+    Met à jour en place le schéma d'une base existante, sans perte de données :
+    crée les tables, colonnes (nullables) et index déclarés ici qui manquent encore,
+    ainsi que les index de recherche plein texte.
+    Peut être relancé sans risque. Renvoie la liste des changements effectués.
+    """
+    changements = []
+
+    # create_all ne touche pas aux tables existantes
+    db.create_all()
+
+    inspecteur = inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            colonnes = {colonne['name'] for colonne in inspecteur.get_columns(table.name)}
+            for colonne in table.columns:
+                if colonne.name not in colonnes:
+                    type_sql = colonne.type.compile(dialect=db.engine.dialect)
+                    conn.execute(text(
+                        f'ALTER TABLE {preparer.quote(table.name)} '
+                        f'ADD COLUMN {preparer.quote(colonne.name)} {type_sql}'
+                    ))
+                    changements.append(f"Colonne {table.name}.{colonne.name} ajoutée")
+
+            index_existants = {index['name'] for index in inspecteur.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in index_existants:
+                    index.create(bind=conn)
+                    changements.append(f"Index {index.name} créé sur {table.name}")
+
+    # Index plein texte (FTS5) et triggers de synchronisation
+    from recherche import installer_recherche
+    changements.extend(installer_recherche())
+
+    return changements
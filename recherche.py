@@ -0,0 +1,223 @@
+"""
+Recherche plein texte dans le catalogue (index SQLite FTS5)
+
+Chaque table indexée a une table virtuelle FTS5 « à contenu externe » : l'index
+ne stocke que les jetons, le texte reste dans la table source. Des triggers
+tiennent l'index à jour à chaque INSERT, UPDATE ou DELETE, quel que soit le
+chemin d'écriture (routes, scripts de migration, sqlite3 en ligne de commande).
+Les colonnes JSON (mots des questions à trous) sont indexées par leurs chaînes
+décodées, et non par leur texte JSON où « équation » est écrit « \u00e9quation ».
+
+Sans FTS5 (autre base que SQLite, SQLite compilé sans le module), la recherche
+se rabat sur des LIKE, sans classement par pertinence.
+"""
+
+import json
+import re
+from sqlalchemy import JSON, Text, and_, cast, func, literal_column, or_, table, column, text
+from sqlalchemy.exc import OperationalError
+from models import db, Question, QuestionsATrous
+
+# Colonnes indexées par table, avec leur poids dans le classement bm25
+# (un mot trouvé dans l'énoncé compte plus que dans une option ou l'explication)
+INDEX_RECHERCHE = {
+    Question: {
+        'probleme': 5.0,
+        'option_a': 2.0,
+        'option_b': 2.0,
+        'option_c': 2.0,
+        'option_d': 2.0,
+        'explication': 1.0,
+    },
+    QuestionsATrous: {
+        'probleme': 5.0,
+        'results': 2.0,
+        'distracteurs': 1.0,
+    },
+}
+
+# Accents ignorés : « equation » trouve « équation »
+TOKENIZER = 'unicode61 remove_diacritics 2'
+
+# Au-delà, les mots suivants de la recherche sont ignorés
+MOTS_MAX = 16
+
+_MOT = re.compile(r'\w+')
+
+# Vrai / faux une fois l'index installé (ou refusé) pour une base donnée
+_disponible = {}
+
+
+def nom_index(modele):
+    """Nom de la table FTS5 d'un modèle indexé (questions -> questions_fts)"""
+    return f"{modele.__tablename__}_fts"
+
+
+def _colonne_json(modele, colonne):
+    """Vrai si la colonne est de type JSON"""
+    return isinstance(modele.__table__.c[colonne].type, JSON)
+
+
+def _texte_indexe(modele, colonne, prefixe=''):
+    """Expression SQL du texte indexé d'une colonne : chaînes d'une colonne JSON séparées par des espaces"""
+    reference = f'{prefixe}{colonne}'
+    if _colonne_json(modele, colonne):
+        return f"(SELECT group_concat(value, ' ') FROM json_tree({reference}) WHERE type = 'text')"
+    return reference
+
+
+def _ddl_index(modele):
+    """
+    Table virtuelle et triggers de synchronisation d'un modèle :
+    nom -> (type d'objet, DDL tel que l'enregistre sqlite_master)
+    """
+    source = modele.__tablename__
+    index = nom_index(modele)
+    colonnes = list(INDEX_RECHERCHE[modele])
+    liste = ', '.join(colonnes)
+    nouvelles = ', '.join(_texte_indexe(modele, colonne, 'new.') for colonne in colonnes)
+    anciennes = ', '.join(_texte_indexe(modele, colonne, 'old.') for colonne in colonnes)
+
+    inserer = f"INSERT INTO {index}(rowid, {liste}) VALUES (new.id, {nouvelles});"
+    retirer = f"INSERT INTO {index}({index}, rowid, {liste}) VALUES ('delete', old.id, {anciennes});"
+
+    objets = {}
+    objets[index] = ('TABLE', (
+        f"CREATE VIRTUAL TABLE {index} USING fts5("
+        f"{liste}, content='{source}', content_rowid='id', tokenize='{TOKENIZER}')"
+    ))
+    objets[f'{index}_ai'] = ('TRIGGER', f"CREATE TRIGGER {index}_ai AFTER INSERT ON {source} BEGIN {inserer} END")
+    objets[f'{index}_ad'] = ('TRIGGER', f"CREATE TRIGGER {index}_ad AFTER DELETE ON {source} BEGIN {retirer} END")
+    # Seules les colonnes indexées déclenchent la mise à jour (pas les rendus HTML)
+    objets[f'{index}_au'] = ('TRIGGER', f"CREATE TRIGGER {index}_au AFTER UPDATE OF {liste} ON {source} "
+                                        f"BEGIN {retirer} {inserer} END")
+    return objets
+
+
+def _reconstruire(conn, modele):
+    """
+    Réindexe toute la table source. Pas de commande 'rebuild' : elle indexerait le
+    texte JSON brut des colonnes JSON (et FTS5 refuse json_tree dans une vue de contenu).
+    """
+    index = nom_index(modele)
+    colonnes = list(INDEX_RECHERCHE[modele])
+    textes = ', '.join(_texte_indexe(modele, colonne) for colonne in colonnes)
+    conn.execute(text(f"INSERT INTO {index}({index}) VALUES ('delete-all')"))
+    conn.execute(text(
+        f"INSERT INTO {index}(rowid, {', '.join(colonnes)}) SELECT id, {textes} FROM {modele.__tablename__}"
+    ))
+
+
+def installer_recherche():
+    """
+    Crée les index FTS5 et leurs triggers qui manquent ou dont la définition a changé,
+    puis reconstruit les index concernés (index créé, triggers disparus avec une table
+    source recréée ou d'une version précédente).
+    Peut être relancé sans risque. Renvoie la liste des changements effectués.
+    """
+    cle = str(db.engine.url)
+    if db.engine.dialect.name != 'sqlite':
+        _disponible[cle] = False
+        return []
+
+    changements = []
+    try:
+        with db.engine.begin() as conn:
+            existants = dict(conn.execute(text(
+                "SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'trigger')"
+            )).all())
+
+            for modele in INDEX_RECHERCHE:
+                index = nom_index(modele)
+                a_reconstruire = False
+                for nom, (type_objet, ddl) in _ddl_index(modele).items():
+                    if existants.get(nom) == ddl:
+                        continue
+                    if nom in existants:
+                        conn.execute(text(f"DROP {type_objet} {nom}"))
+                    conn.execute(text(ddl))
+                    a_reconstruire = True
+                if a_reconstruire:
+                    _reconstruire(conn, modele)
+                    changements.append(f"Index de recherche {index} construit")
+    except OperationalError as e:
+        # SQLite compilé sans FTS5 : recherche par LIKE
+        if 'fts5' not in str(e):
+            raise
+        _disponible[cle] = False
+        return []
+
+    _disponible[cle] = True
+    return changements
+
+
+def recherche_disponible():
+    """Vrai si l'index FTS5 est utilisable sur la base courante"""
+    cle = str(db.engine.url)
+    if cle not in _disponible:
+        if db.engine.dialect.name != 'sqlite':
+            _disponible[cle] = False
+        else:
+            nom = nom_index(Question)
+            _disponible[cle] = db.session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = :nom"), {'nom': nom}
+            ).first() is not None
+    return _disponible[cle]
+
+
+def mots_recherche(saisie):
+    """Mots de la saisie, sans ponctuation ni opérateur (au plus MOTS_MAX)"""
+    return _MOT.findall(saisie or '')[:MOTS_MAX]
+
+
+def requete_fts(mots):
+    """
+    Requête FTS5 : chaque mot est cité (la saisie ne peut pas injecter d'opérateur
+    ou de colonne) et cherché comme préfixe ; tous les mots doivent être présents.
+    """
+    return ' '.join(f'"{mot}"*' for mot in mots)
+
+
+def _motif_like(texte):
+    """Motif LIKE « contient `texte` », caractères spéciaux échappés par '!'"""
+    return '%' + texte.replace('!', '!!').replace('%', '!%').replace('_', '!_') + '%'
+
+
+def _conditions_like(modele, colonne, mot):
+    """
+    Conditions « la colonne contient `mot` ». Une colonne JSON est cherchée dans son
+    texte, où les caractères non ASCII peuvent être échappés (é -> \u00e9).
+    """
+    if not _colonne_json(modele, colonne):
+        return [getattr(modele, colonne).ilike(_motif_like(mot), escape='!')]
+    texte = cast(getattr(modele, colonne), Text)
+    formes = {mot, json.dumps(mot)[1:-1]}
+    return [texte.ilike(_motif_like(forme), escape='!') for forme in sorted(formes)]
+
+
+def filtrer_recherche(requete, modele, saisie):
+    """
+    Restreint `requete` (qui sélectionne `modele`) aux lignes contenant tous les mots
+    de `saisie`, les plus pertinentes d'abord. Une saisie sans mot ne filtre rien.
+    Renvoie (requête filtrée, critères de tri).
+    """
+    mots = mots_recherche(saisie)
+    if not mots:
+        return requete, (modele.id,)
+
+    if not recherche_disponible():
+        requete = requete.filter(and_(*[
+            or_(*[condition for colonne in INDEX_RECHERCHE[modele]
+                  for condition in _conditions_like(modele, colonne, mot)])
+            for mot in mots
+        ]))
+        return requete, (modele.id,)
+
+    index = nom_index(modele)
+    fts = table(index, column('rowid'))
+    requete = requete.join(fts, fts.c.rowid == modele.id).filter(
+        literal_column(index).match(requete_fts(mots))
+    )
+    # bm25 est négatif : plus il est petit, plus la ligne est pertinente
+    rang = func.bm25(literal_column(index), *INDEX_RECHERCHE[modele].values())
+    return requete, (rang, modele.id)
@@ -1,90 +1,349 @@
-from models import db, Niveau, Chapitre, Question
-from sqlalchemy import func
+from models import db, Niveau, Chapitre, Question, QuestionsATrous, CatalogueVersion, CompteurQuestions
+from sqlalchemy import func, and_
+from sqlalchemy.orm import contains_eager, defer
+from cache import CatalogueCache
+from recherche import filtrer_recherche, mots_recherche
+
+# Cache des lectures du catalogue, vidé à chaque écriture via valider_catalogue()
+catalogue_cache = CatalogueCache(CatalogueVersion.courante)
+
+# Champs de la liste d'administration des questions (paramètre fields=) et colonnes lues pour chacun
+CHAMPS_QUESTIONS_ADMIN = {
+    'id': (Question.id,),
+    'probleme': (Question.probleme,),
+    'options': (Question.option_a, Question.option_b, Question.option_c, Question.option_d),
+    'reponse_correcte': (Question.reponse_correcte,),
+    'explication': (Question.explication,),
+    'difficulte': (Question.difficulte,),
+    'chapitre_id': (Question.chapitre_id,),
+    'chapitre_nom': (Chapitre.nom,),
+    'chapitre_titre': (Chapitre.titre,),
+    'niveau_nom': (Niveau.nom,)
+}
 
 class QCMService:
     """Service pour gérer les opérations QCM avec SQLAlchemy"""
 
+    @staticmethod
+    def valider_catalogue():
+        """Commit une écriture du catalogue et invalide les caches de lecture"""
+        CatalogueVersion.incrementer()
+        db.session.commit()
+        catalogue_cache.invalider()
+
     @staticmethod
     def get_niveaux():
         """Récupère tous les niveaux"""
+        return catalogue_cache.get(('niveaux',), QCMService._charger_niveaux)
+
+    @staticmethod
+    def _charger_niveaux():
         return [niveau.to_dict() for niveau in Niveau.query.order_by(Niveau.ordre).all()]
 
     @staticmethod
     def get_chapitres_par_niveau(niveau_nom):
         """Récupère les chapitres d'un niveau avec le nombre de questions"""
-        chapitres = db.session.query(
-            Chapitre,
-            func.count(Question.id).label('nb_questions')
-        ).join(Niveau).outerjoin(Question).filter(
-            Niveau.nom == niveau_nom
-        ).group_by(Chapitre.id).order_by(Chapitre.ordre).all()
+        return catalogue_cache.get(('chapitres', niveau_nom),
+                                   lambda: QCMService._charger_chapitres_par_niveau(niveau_nom))
+
+    @staticmethod
+    def _nb_questions_chapitres(requete, type_question='qcm'):
+        """Joint à une requête sur Chapitre la somme de ses compteurs de questions"""
+        return requete.add_columns(
+            func.coalesce(func.sum(CompteurQuestions.nombre), 0).label('nb_questions')
+        ).outerjoin(CompteurQuestions, and_(
+            CompteurQuestions.chapitre_id == Chapitre.id,
+            CompteurQuestions.type == type_question
+        )).group_by(Chapitre.id)
 
-        result = []
-        for chapitre, nb_questions in chapitres:
-            chapitre_dict = chapitre.to_dict()
-            chapitre_dict['nb_questions'] = nb_questions
-            result.append(chapitre_dict)
+    @staticmethod
+    def _charger_chapitres_par_niveau(niveau_nom):
+        chapitres = QCMService._nb_questions_chapitres(
+            db.session.query(Chapitre).join(Niveau).filter(Niveau.nom == niveau_nom)
+        ).order_by(Chapitre.ordre).all()
 
-        return result
+        return [chapitre.to_dict(nb_questions=nb_questions) for chapitre, nb_questions in chapitres]
 
     @staticmethod
-    def get_questions_niveau(niveau_nom):
-        """Récupère toutes les questions d'un niveau"""
-        questions = Question.query.join(Chapitre).join(Niveau).filter(
-            Niveau.nom == niveau_nom
-        ).order_by(Question.id).all()
+    def requete_questions():
+        """Requête des questions avec chapitre et niveau chargés par la même jointure"""
+        return Question.query.join(Question.chapitre).join(Chapitre.niveau).options(
+            contains_eager(Question.chapitre).contains_eager(Chapitre.niveau)
+        )
 
-        return [question.to_dict() for question in questions]
+    @staticmethod
+    def _filtrer_portee(requete, niveau_nom, chapitre_nom=None):
+        """Restreint une requête jointe sur Chapitre/Niveau à un niveau ou à un chapitre"""
+        requete = requete.filter(Niveau.nom == niveau_nom)
+        if chapitre_nom is not None:
+            requete = requete.filter(Chapitre.nom == chapitre_nom)
+        return requete
 
     @staticmethod
-    def get_questions_chapitre(niveau_nom, chapitre_nom):
-        """Récupère les questions d'un chapitre spécifique"""
-        questions = Question.query.join(Chapitre).join(Niveau).filter(
-            Niveau.nom == niveau_nom,
-            Chapitre.nom == chapitre_nom
-        ).order_by(Question.id).all()
+    def compter_questions(niveau_nom, chapitre_nom=None):
+        """Nombre de questions d'un niveau (ou d'un chapitre), lu dans les compteurs et mis en cache"""
+        return catalogue_cache.get(
+            ('nb_questions', niveau_nom, chapitre_nom),
+            lambda: QCMService._filtrer_portee(
+                QCMService._somme_compteurs(), niveau_nom, chapitre_nom
+            ).scalar()
+        )
+
+    @staticmethod
+    def _somme_compteurs(type_question='qcm'):
+        """Somme des compteurs d'un type de questions, jointe sur Chapitre/Niveau pour les filtres"""
+        return db.session.query(func.coalesce(func.sum(CompteurQuestions.nombre), 0)).select_from(
+            CompteurQuestions
+        ).join(Chapitre, Chapitre.id == CompteurQuestions.chapitre_id).join(Chapitre.niveau).filter(
+            CompteurQuestions.type == type_question
+        )
+
+    @staticmethod
+    def get_question_position(niveau_nom, position, chapitre_nom=None):
+        """
+        Récupère uniquement la question à la position donnée (questions triées par id)
+        d'un niveau ou d'un chapitre, sans charger les autres. None si hors limites.
+        """
+        if position < 0:
+            return None
+        return catalogue_cache.get(
+            ('question_position', niveau_nom, chapitre_nom, position),
+            lambda: QCMService._charger_question_position(niveau_nom, position, chapitre_nom)
+        )
+
+    @staticmethod
+    def _charger_question_position(niveau_nom, position, chapitre_nom):
+        question = QCMService._filtrer_portee(
+            QCMService.requete_questions(), niveau_nom, chapitre_nom
+        ).order_by(Question.id).offset(position).limit(1).first()
+        return question.to_dict() if question else None
+
+    @staticmethod
+    def get_questions_par_ids(question_ids):
+        """Récupère plusieurs questions en une seule requête, sous forme de dict {id: question}"""
+        if not question_ids:
+            return {}
+        questions = QCMService.requete_questions().filter(Question.id.in_(set(question_ids))).all()
+        return {question.id: question.to_dict() for question in questions}
+
+    @staticmethod
+    def _filtrer_admin(requete, niveau_nom=None, chapitre_nom=None, difficulte=None):
+        """Filtres optionnels de la liste d'administration (requête jointe sur Chapitre/Niveau)"""
+        if niveau_nom:
+            requete = requete.filter(Niveau.nom == niveau_nom)
+        if chapitre_nom:
+            requete = requete.filter(Chapitre.nom == chapitre_nom)
+        if difficulte:
+            requete = requete.filter(Question.difficulte == difficulte)
+        return requete
 
-        return [question.to_dict() for question in questions]
+    @staticmethod
+    def lister_questions_admin(niveau_nom=None, chapitre_nom=None, difficulte=None,
+                               apres_id=None, limite=100, champs=None, recherche=None, decalage=0):
+        """
+        Page de la liste d'administration, triée par id : `apres_id` est le dernier id
+        de la page précédente (pagination par curseur). Seules les colonnes des `champs`
+        demandés (clés de CHAMPS_QUESTIONS_ADMIN, tous par défaut) sont lues.
+        Avec `recherche`, les questions contenant tous les mots sont triées par pertinence
+        et paginées par `decalage` (nombre de résultats déjà renvoyés) ; `apres_id` n'y
+        est pas accepté.
+        Renvoie (questions, curseur suivant, décalage suivant) : l'un des deux est None
+        selon le mode, les deux en fin de liste.
+        """
+        champs = list(champs or CHAMPS_QUESTIONS_ADMIN)
+        colonnes = [Question.id]
+        for champ in champs:
+            colonnes.extend(CHAMPS_QUESTIONS_ADMIN[champ])
+
+        requete = db.session.query(*colonnes).select_from(Question).join(Question.chapitre).join(Chapitre.niveau)
+        requete = QCMService._filtrer_admin(requete, niveau_nom, chapitre_nom, difficulte)
+        requete, tri = filtrer_recherche(requete, Question, recherche)
+        # Le classement par pertinence n'a pas de clé stable : pagination par décalage
+        par_decalage = bool(mots_recherche(recherche))
+        if par_decalage and apres_id is not None:
+            raise ValueError("Une recherche se pagine par décalage, pas par curseur")
+        requete = requete.order_by(*tri)
+        if par_decalage:
+            requete = requete.offset(decalage)
+        elif apres_id is not None:
+            requete = requete.filter(Question.id > apres_id)
+        lignes = requete.limit(limite + 1).all()
+
+        questions = []
+        for ligne in lignes[:limite]:
+            question = {}
+            position = 1
+            for champ in champs:
+                nb_colonnes = len(CHAMPS_QUESTIONS_ADMIN[champ])
+                valeurs = ligne[position:position + nb_colonnes]
+                question[champ] = list(valeurs) if nb_colonnes > 1 else valeurs[0]
+                position += nb_colonnes
+            questions.append(question)
+
+        curseur_suivant = decalage_suivant = None
+        if len(lignes) > limite:
+            if par_decalage:
+                decalage_suivant = decalage + limite
+            else:
+                curseur_suivant = lignes[limite - 1][0]
+        return questions, curseur_suivant, decalage_suivant
+
+    @staticmethod
+    def compter_questions_admin(niveau_nom=None, chapitre_nom=None, difficulte=None, recherche=None):
+        """Nombre total de questions correspondant aux filtres de la liste d'administration"""
+        # Les recherches libres comptent les résultats et ne sont pas mises en cache : une clé par saisie
+        if recherche:
+            requete = QCMService._filtrer_admin(
+                db.session.query(func.count(Question.id)).select_from(Question)
+                .join(Question.chapitre).join(Chapitre.niveau),
+                niveau_nom, chapitre_nom, difficulte
+            )
+            return filtrer_recherche(requete, Question, recherche)[0].scalar()
+
+        def compter():
+            requete = QCMService._somme_compteurs()
+            if niveau_nom:
+                requete = requete.filter(Niveau.nom == niveau_nom)
+            if chapitre_nom:
+                requete = requete.filter(Chapitre.nom == chapitre_nom)
+            if difficulte:
+                requete = requete.filter(CompteurQuestions.difficulte == difficulte)
+            return requete.scalar()
+
+        return catalogue_cache.get(('nb_questions_admin', niveau_nom, chapitre_nom, difficulte), compter)
+
+    @staticmethod
+    def get_niveaux_trous():
+        """
+        Niveaux dans l'ordre, avec l'id de leur première question à trous (None s'il n'y
+        en a pas) et leur nombre de questions à trous
+        """
+        return catalogue_cache.get(('niveaux_trous',), QCMService._charger_niveaux_trous)
+
+    @staticmethod
+    def _charger_niveaux_trous():
+        lignes = db.session.query(
+            Niveau.nom, func.min(QuestionsATrous.id), func.count(QuestionsATrous.id)
+        ).outerjoin(Niveau.chapitres).outerjoin(
+            QuestionsATrous, QuestionsATrous.chapitre_id == Chapitre.id
+        ).group_by(Niveau.id, Niveau.nom, Niveau.ordre).order_by(Niveau.ordre).all()
+
+        return [{'nom': nom, 'premiere_question_id': premiere, 'nb_questions': nombre}
+                for nom, premiere, nombre in lignes]
+
+    @staticmethod
+    def compter_questions_trous(niveau_nom):
+        """Nombre de questions à trous d'un niveau (0 pour un niveau inconnu)"""
+        return next((niveau['nb_questions'] for niveau in QCMService.get_niveaux_trous()
+                     if niveau['nom'] == niveau_nom), 0)
+
+    @staticmethod
+    def get_question_trous_position(niveau_nom, position):
+        """
+        Question à trous à la position donnée (questions du niveau triées par id), sans
+        charger les autres ni décoder ses mots : la page n'affiche que les rendus
+        pré-calculés. None si hors limites.
+        """
+        if position < 0:
+            return None
+        return QuestionsATrous.query.join(Chapitre).join(Niveau).filter(
+            Niveau.nom == niveau_nom
+        ).options(
+            defer(QuestionsATrous.results), defer(QuestionsATrous.distracteurs)
+        ).order_by(QuestionsATrous.id).offset(position).limit(1).first()
+
+    @staticmethod
+    def rechercher_questions_trous(recherche, niveau_nom=None, chapitre_nom=None, decalage=0, limite=50):
+        """
+        Questions à trous contenant tous les mots de `recherche`, les plus pertinentes
+        d'abord (toutes, par id, si la recherche est vide). Renvoie (questions, total,
+        décalage de la page suivante ou None).
+        """
+        requete = db.session.query(
+            QuestionsATrous.id, QuestionsATrous.probleme, QuestionsATrous.difficulte,
+            Chapitre.nom, Chapitre.titre, Niveau.nom
+        ).select_from(QuestionsATrous).join(QuestionsATrous.chapitre).join(Chapitre.niveau)
+        if niveau_nom:
+            requete = requete.filter(Niveau.nom == niveau_nom)
+        if chapitre_nom:
+            requete = requete.filter(Chapitre.nom == chapitre_nom)
+        requete, tri = filtrer_recherche(requete, QuestionsATrous, recherche)
+
+        total = requete.with_entities(func.count(QuestionsATrous.id)).order_by(None).scalar()
+        lignes = requete.order_by(*tri).offset(decalage).limit(limite + 1).all()
+
+        questions = [{
+            'id': id_question,
+            'probleme': probleme,
+            'difficulte': difficulte,
+            'chapitre_nom': chapitre_nom_ligne,
+            'chapitre_titre': chapitre_titre,
+            'niveau_nom': niveau_nom_ligne
+        } for id_question, probleme, difficulte, chapitre_nom_ligne, chapitre_titre, niveau_nom_ligne
+            in lignes[:limite]]
+        suivant = decalage + limite if len(lignes) > limite else None
+        return questions, total, suivant
 
     @staticmethod
     def get_chapitre_info(niveau_nom, chapitre_nom):
         """Récupère les informations d'un chapitre avec le nombre de questions"""
-        result = db.session.query(
-            Chapitre,
-            func.count(Question.id).label('nb_questions')
-        ).join(Niveau).outerjoin(Question).filter(
-            Niveau.nom == niveau_nom,
-            Chapitre.nom == chapitre_nom
-        ).group_by(Chapitre.id).first()
+        return catalogue_cache.get(('chapitre_info', niveau_nom, chapitre_nom),
+                                   lambda: QCMService._charger_chapitre_info(niveau_nom, chapitre_nom))
+
+    @staticmethod
+    def _charger_chapitre_info(niveau_nom, chapitre_nom):
+        result = QCMService._nb_questions_chapitres(
+            db.session.query(Chapitre).join(Niveau).filter(
+                Niveau.nom == niveau_nom,
+                Chapitre.nom == chapitre_nom
+            )
+        ).first()
 
         if result:
             chapitre, nb_questions = result
-            chapitre_dict = chapitre.to_dict()
-            chapitre_dict['nb_questions'] = nb_questions
-            chapitre_dict['niveau_nom'] = chapitre.niveau.nom
+            chapitre_dict = chapitre.to_dict(nb_questions=nb_questions)
+            chapitre_dict['niveau_nom'] = niveau_nom
             return chapitre_dict
 
         return None
 
     @staticmethod
     def get_statistiques():
-        """Récupère les statistiques globales"""
-        # Total questions
-        total_questions = Question.query.count()
-
-        # Par niveau - correction de l'ambiguïté de jointure
-        stats_par_niveau = db.session.query(
-            Niveau.nom,
-            func.count(Question.id).label('nb_questions')
-        ).select_from(Niveau).outerjoin(Chapitre).outerjoin(Question).group_by(
-            Niveau.id, Niveau.nom
-        ).order_by(Niveau.ordre).all()
+        """Récupère les statistiques globales (depuis les compteurs), mises en cache"""
+        return catalogue_cache.get(('statistiques',), QCMService._charger_statistiques)
 
-        par_niveau = {niveau: nb for niveau, nb in stats_par_niveau}
+    @staticmethod
+    def _charger_statistiques():
+        lignes = db.session.query(
+            Niveau.nom, CompteurQuestions.type, CompteurQuestions.difficulte,
+            func.sum(CompteurQuestions.nombre)
+        ).select_from(CompteurQuestions).join(Chapitre, Chapitre.id == CompteurQuestions.chapitre_id).join(
+            Chapitre.niveau
+        ).group_by(Niveau.nom, CompteurQuestions.type, CompteurQuestions.difficulte).all()
+
+        # Tous les niveaux apparaissent, même sans question
+        niveaux = [niveau['nom'] for niveau in QCMService.get_niveaux()]
+        par_niveau = dict.fromkeys(niveaux, 0)
+        par_niveau_trous = dict.fromkeys(niveaux, 0)
+        par_difficulte = {}
+        par_difficulte_trous = {}
+        for niveau, type_question, difficulte, nombre in lignes:
+            if not nombre:
+                continue
+            if type_question == 'qcm':
+                par_niveau[niveau] = par_niveau.get(niveau, 0) + nombre
+                par_difficulte[difficulte] = par_difficulte.get(difficulte, 0) + nombre
+            else:
+                par_niveau_trous[niveau] = par_niveau_trous.get(niveau, 0) + nombre
+                par_difficulte_trous[difficulte] = par_difficulte_trous.get(difficulte, 0) + nombre
 
         return {
-            'total_questions': total_questions,
-            'par_niveau': par_niveau
+            'total_questions': sum(par_niveau.values()),
+            'par_niveau': par_niveau,
+            'par_difficulte': par_difficulte,
+            'total_questions_trous': sum(par_niveau_trous.values()),
+            'par_niveau_trous': par_niveau_trous,
+            'par_difficulte_trous': par_difficulte_trous
         }
 
     @staticmethod
@@ -112,9 +371,11 @@ class QCMService:
             difficulte=difficulte,
             chapitre_id=chapitre.id
         )
+        question.mettre_a_jour_html()
 
         db.session.add(question)
-        db.session.commit()
+        CompteurQuestions.ajuster({(chapitre.id, 'qcm', difficulte): 1})
+        QCMService.valider_catalogue()
 
         return question.id
 
@@ -125,6 +386,8 @@ class QCMService:
         if not question:
             return False
 
+        ancien_compteur = (question.chapitre_id, 'qcm', question.difficulte)
+
         # Mettre à jour les champs autorisés
         champs_autorises = ['probleme', 'option_a', 'option_b', 'option_c', 'option_d',
                            'reponse_correcte', 'explication', 'difficulte']
@@ -132,8 +395,12 @@ class QCMService:
         for field, value in kwargs.items():
             if field in champs_autorises and hasattr(question, field):
                 setattr(question, field, value)
+        question.mettre_a_jour_html()
 
-        db.session.commit()
+        nouveau_compteur = (question.chapitre_id, 'qcm', question.difficulte)
+        if nouveau_compteur != ancien_compteur:
+            CompteurQuestions.ajuster({ancien_compteur: -1, nouveau_compteur: 1})
+        QCMService.valider_catalogue()
         return True
 
     @staticmethod
@@ -144,7 +411,8 @@ class QCMService:
             return False
 
         db.session.delete(question)
-        db.session.commit()
+        CompteurQuestions.ajuster({(question.chapitre_id, 'qcm', question.difficulte): -1})
+        QCMService.valider_catalogue()
         return True
 
     @staticmethod
@@ -234,6 +502,8 @@ class QCMService:
             question = Question.query.get(question_data['id'])
             if not question:
                 question = Question(**question_data)
+                question.mettre_a_jour_html()
                 db.session.add(question)
 
-        db.session.commit()
+        CompteurQuestions.reconstruire()
+        QCMService.valider_catalogue()
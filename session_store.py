@@ -0,0 +1,276 @@
+"""
+Sessions côté serveur : le cookie ne transporte plus qu'un identifiant opaque
+
+Les données de session (réponses en cours, progressions sauvegardées) sont
+stockées dans une petite base SQLite locale ou dans un fichier par session.
+Les sessions expirées sont supprimées périodiquement, selon la même durée de
+vie que le cookie (permanent_session_lifetime).
+"""
+
+import os
+import re
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import closing
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+# Identifiants générés par secrets.token_urlsafe(32)
+_SID_VALIDE = re.compile(r'^[A-Za-z0-9_-]{43}$')
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dont seul l'identifiant `sid` est envoyé au navigateur"""
+
+    # Clés donnant des droits : quand elles changent, la session change d'identifiant
+    # (un identifiant connu avant la connexion ne doit pas devenir une session admin)
+    CLES_PRIVILEGES = ('admin_access', 'qcm_admin_access', 'ressources_access')
+
+    def __init__(self, initial=None, sid=None, new=False, expiration=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expiration = expiration
+        self.modified = False
+        self.accessed = False
+        self.sid_precedent = None
+        self.privileges_initiaux = self.privileges()
+
+    def privileges(self):
+        """Droits accordés par la session (lus sans la marquer comme consultée)"""
+        return tuple(bool(dict.get(self, cle)) for cle in self.CLES_PRIVILEGES)
+
+    def regenerer(self):
+        """Change d'identifiant en gardant les données ; l'ancien est supprimé à l'enregistrement"""
+        if self.sid_precedent is None:
+            self.sid_precedent = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class StockageSqlite:
+    """Sessions stockées dans une table SQLite dédiée (hors base du catalogue)"""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        os.makedirs(os.path.dirname(os.path.abspath(chemin)), exist_ok=True)
+        with closing(self._connexion()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                ' id TEXT PRIMARY KEY,'
+                ' donnees TEXT NOT NULL,'
+                ' expiration REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_sessions_expiration ON sessions (expiration)')
+
+    def _connexion(self):
+        return sqlite3.connect(self.chemin, timeout=10)
+
+    def lire(self, sid):
+        with closing(self._connexion()) as conn:
+            return conn.execute(
+                'SELECT donnees, expiration FROM sessions WHERE id = ? AND expiration > ?',
+                (sid, time.time())
+            ).fetchone()
+
+    def ecrire(self, sid, donnees, expiration):
+        with closing(self._connexion()) as conn, conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO sessions (id, donnees, expiration) VALUES (?, ?, ?)',
+                (sid, donnees, expiration)
+            )
+
+    def supprimer(self, sid):
+        with closing(self._connexion()) as conn, conn:
+            conn.execute('DELETE FROM sessions WHERE id = ?', (sid,))
+
+    def balayer(self, maintenant):
+        with closing(self._connexion()) as conn, conn:
+            return conn.execute('DELETE FROM sessions WHERE expiration <= ?', (maintenant,)).rowcount
+
+
+class StockageFichiers:
+    """Sessions stockées dans un fichier par session (première ligne : expiration)"""
+
+    def __init__(self, dossier):
+        self.dossier = dossier
+        os.makedirs(dossier, exist_ok=True)
+
+    def _chemin(self, sid):
+        return os.path.join(self.dossier, sid)
+
+    def _lire_fichier(self, chemin):
+        try:
+            with open(chemin, encoding='utf-8') as f:
+                expiration = float(f.readline())
+                return f.read(), expiration
+        except (OSError, ValueError):
+            return None
+
+    def lire(self, sid):
+        contenu = self._lire_fichier(self._chemin(sid))
+        if contenu is None or contenu[1] <= time.time():
+            return None
+        return contenu
+
+    def ecrire(self, sid, donnees, expiration):
+        # Écriture atomique : un lecteur concurrent ne voit jamais un fichier partiel
+        fd, temporaire = tempfile.mkstemp(dir=self.dossier, prefix='.tmp-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(f'{expiration}\n{donnees}')
+        os.replace(temporaire, self._chemin(sid))
+
+    def supprimer(self, sid):
+        try:
+            os.remove(self._chemin(sid))
+        except FileNotFoundError:
+            pass
+
+    def balayer(self, maintenant):
+        supprimees = 0
+        for nom in os.listdir(self.dossier):
+            if not _SID_VALIDE.match(nom):
+                continue
+            contenu = self._lire_fichier(self._chemin(nom))
+            if contenu is None or contenu[1] <= maintenant:
+                self.supprimer(nom)
+                supprimees += 1
+        return supprimees
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Interface de session Flask adossée à un stockage serveur (StockageSqlite ou StockageFichiers).
+
+    L'expiration côté serveur est repoussée à chaque modification et, pour une
+    session inchangée, au plus une fois par `intervalle_rafraichissement`
+    secondes afin d'éviter une écriture à chaque requête.
+    """
+
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSideSession
+
+    def __init__(self, stockage, intervalle_nettoyage=3600, intervalle_rafraichissement=3600):
+        self.stockage = stockage
+        self.intervalle_nettoyage = intervalle_nettoyage
+        self.intervalle_rafraichissement = intervalle_rafraichissement
+        self._dernier_nettoyage = 0.0
+        self._verrou_nettoyage = threading.Lock()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and _SID_VALIDE.match(sid):
+            ligne = self.stockage.lire(sid)
+            if ligne is not None:
+                donnees, expiration = ligne
+                try:
+                    return self.session_class(self.serializer.loads(donnees), sid=sid, expiration=expiration)
+                except ValueError:
+                    pass
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        partitioned = self.get_cookie_partitioned(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        # Session vidée : supprimer les données et le cookie
+        if not session:
+            if session.modified:
+                if not session.new:
+                    self.stockage.supprimer(session.sid_precedent or session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       partitioned=partitioned, samesite=samesite, httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        if session.privileges() != session.privileges_initiaux:
+            session.regenerer()
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        if session.sid_precedent is not None:
+            self.stockage.supprimer(session.sid_precedent)
+
+        maintenant = time.time()
+        expiration_cookie = self.get_expiration_time(app, session)
+        expiration = maintenant + app.permanent_session_lifetime.total_seconds()
+
+        deja_rafraichie = (
+            session.expiration is not None
+            and expiration - session.expiration < self.intervalle_rafraichissement
+        )
+        if session.modified or session.new or not deja_rafraichie:
+            self.stockage.ecrire(session.sid, self.serializer.dumps(dict(session)), expiration)
+
+        response.set_cookie(name, session.sid, expires=expiration_cookie, httponly=httponly,
+                            domain=domain, path=path, secure=secure,
+                            partitioned=partitioned, samesite=samesite)
+        response.vary.add('Cookie')
+
+        self._nettoyer_si_necessaire(maintenant)
+
+    def _nettoyer_si_necessaire(self, maintenant):
+        """Supprime les sessions expirées au plus une fois par intervalle_nettoyage"""
+        if maintenant - self._dernier_nettoyage < self.intervalle_nettoyage:
+            return
+        if not self._verrou_nettoyage.acquire(blocking=False):
+            return
+        try:
+            self._dernier_nettoyage = maintenant
+            self.stockage.balayer(maintenant)
+        finally:
+            self._verrou_nettoyage.release()
+
+
+def init_sessions(app):
+    """Installe l'interface de session choisie par SESSION_BACKEND (sqlite, filesystem ou cookie)"""
+    app.config.setdefault('SESSION_BACKEND', os.getenv('SESSION_BACKEND', 'sqlite'))
+    app.config.setdefault('SESSION_SQLITE_PATH', os.getenv(
+        'SESSION_SQLITE_PATH', os.path.join(app.instance_path, 'sessions.db')))
+    app.config.setdefault('SESSION_FILE_DIR', os.getenv(
+        'SESSION_FILE_DIR', os.path.join(app.instance_path, 'sessions')))
+    app.config.setdefault('SESSION_CLEANUP_INTERVAL', 3600)
+
+    backend = app.config['SESSION_BACKEND']
+    if backend == 'cookie':
+        return
+    if backend == 'sqlite':
+        stockage = StockageSqlite(app.config['SESSION_SQLITE_PATH'])
+    elif backend == 'filesystem':
+        stockage = StockageFichiers(app.config['SESSION_FILE_DIR'])
+    else:
+        raise ValueError(f"SESSION_BACKEND inconnu : {backend}")
+
+    app.session_interface = ServerSideSessionInterface(
+        stockage, intervalle_nettoyage=app.config['SESSION_CLEANUP_INTERVAL'])
@@ -0,0 +1,134 @@
+"""
+Instrumentation SQL par requête HTTP : nombre de requêtes, temps passé en base et requêtes lentes
+
+Activée par SQL_PROFILING=1. Chaque réponse reçoit un en-tête Server-Timing
+(visible dans l'onglet Réseau du navigateur) et les requêtes plus lentes que
+SQL_SLOW_QUERY_MS sont écrites dans un fichier journal tournant.
+
+L'en-tête ne contient que des durées et des nombres de requêtes ; le début du
+texte SQL des plus lentes n'y est ajouté qu'en mode debug ou pour une session
+administrateur. Les paramètres des requêtes lentes (qui peuvent contenir des
+saisies des utilisateurs) ne sont journalisés qu'avec SQL_SLOW_QUERY_LOG_PARAMS=1.
+"""
+
+import logging
+import os
+import time
+from logging.handlers import RotatingFileHandler
+
+from flask import current_app, g, has_request_context, request, session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('sql_lentes')
+
+# Nombre de requêtes les plus lentes conservées pour chaque requête HTTP
+NB_PLUS_LENTES = 3
+
+# Longueur maximale du texte SQL affiché dans la description Server-Timing
+TAILLE_DESCRIPTION = 80
+
+
+def init_sql_profiler(app):
+    """Branche l'instrumentation sur les événements SQLAlchemy si SQL_PROFILING est actif"""
+    app.config.setdefault('SQL_PROFILING', os.getenv('SQL_PROFILING', '0') == '1')
+    app.config.setdefault('SQL_SLOW_QUERY_MS', float(os.getenv('SQL_SLOW_QUERY_MS', 100)))
+    app.config.setdefault('SQL_SLOW_QUERY_LOG', os.getenv(
+        'SQL_SLOW_QUERY_LOG', os.path.join(app.instance_path, 'sql_lentes.log')))
+    app.config.setdefault('SQL_SLOW_QUERY_LOG_PARAMS', os.getenv('SQL_SLOW_QUERY_LOG_PARAMS', '0') == '1')
+    app.config.setdefault('SQL_SLOW_QUERY_LOG_MAX_BYTES', 1024 * 1024)
+    app.config.setdefault('SQL_SLOW_QUERY_LOG_BACKUPS', 3)
+
+    if not app.config['SQL_PROFILING']:
+        return
+
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(os.path.abspath(app.config['SQL_SLOW_QUERY_LOG'])), exist_ok=True)
+        handler = RotatingFileHandler(
+            app.config['SQL_SLOW_QUERY_LOG'],
+            maxBytes=app.config['SQL_SLOW_QUERY_LOG_MAX_BYTES'],
+            backupCount=app.config['SQL_SLOW_QUERY_LOG_BACKUPS'],
+            encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    if not event.contains(Engine, 'before_cursor_execute', _avant_execution):
+        event.listen(Engine, 'before_cursor_execute', _avant_execution)
+        event.listen(Engine, 'after_cursor_execute', _apres_execution)
+
+    app.after_request(_ajouter_server_timing)
+
+
+def _statistiques():
+    """Statistiques SQL de la requête HTTP courante"""
+    if 'sql_stats' not in g:
+        g.sql_stats = {'nb': 0, 'duree_ms': 0.0, 'plus_lentes': []}
+    return g.sql_stats
+
+
+def _avant_execution(conn, cursor, statement, parameters, context, executemany):
+    # Porté par le contexte d'exécution : rien ne reste sur la connexion si la requête échoue
+    if context is not None:
+        context.debut_sql = time.perf_counter()
+
+
+def _apres_execution(conn, cursor, statement, parameters, context, executemany):
+    debut = getattr(context, 'debut_sql', None)
+    if debut is None:
+        return
+    duree_ms = (time.perf_counter() - debut) * 1000
+
+    # Les requêtes exécutées hors requête HTTP (démarrage, scripts) ne sont pas suivies
+    if not has_request_context():
+        return
+
+    stats = _statistiques()
+    stats['nb'] += 1
+    stats['duree_ms'] += duree_ms
+
+    plus_lentes = stats['plus_lentes']
+    plus_lentes.append((duree_ms, statement))
+    plus_lentes.sort(key=lambda item: item[0], reverse=True)
+    del plus_lentes[NB_PLUS_LENTES:]
+
+    if duree_ms >= current_app.config['SQL_SLOW_QUERY_MS']:
+        message = '%.1f ms %s %s [%s] %s'
+        arguments = [duree_ms, request.method, request.path, request.endpoint, ' '.join(statement.split())]
+        if current_app.config['SQL_SLOW_QUERY_LOG_PARAMS']:
+            message += ' | %.200r'
+            arguments.append(parameters)
+        logger.info(message, *arguments)
+
+
+def _ajouter_server_timing(response):
+    stats = g.get('sql_stats')
+    if stats is None:
+        stats = {'nb': 0, 'duree_ms': 0.0, 'plus_lentes': []}
+
+    details = _details_visibles()
+    metriques = [f'db;dur={stats["duree_ms"]:.2f};desc="{stats["nb"]} queries"']
+    for rang, (duree_ms, statement) in enumerate(stats['plus_lentes'], start=1):
+        metrique = f'db-slow-{rang};dur={duree_ms:.2f}'
+        if details:
+            metrique += f';desc="{_description(statement)}"'
+        metriques.append(metrique)
+
+    response.headers.add('Server-Timing', ', '.join(metriques))
+    return response
+
+
+def _details_visibles():
+    """Le texte SQL n'est envoyé qu'en mode debug ou à une session administrateur"""
+    return current_app.debug or bool(session.get('admin_access') or session.get('qcm_admin_access'))
+
+
+def _description(statement):
+    """Début de la requête SQL sur une ligne, utilisable dans une chaîne entre guillemets d'en-tête"""
+    texte = ' '.join(statement.split())
+    if len(texte) > TAILLE_DESCRIPTION:
+        texte = texte[:TAILLE_DESCRIPTION - 3] + '...'
+    texte = texte.encode('ascii', 'replace').decode('ascii')
+    return texte.replace('\\', '\\\\').replace('"', '\\"')
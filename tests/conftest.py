@@ -0,0 +1,135 @@
+"""
+Configuration commune des tests : l'application est importée sur une base SQLite
+temporaire (initialisée avec les données de test de QCMService) et des sessions
+stockées dans le même dossier temporaire. Chaque test repart d'une copie de la
+base initiale : l'ordre d'exécution n'a pas d'effet sur les résultats.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import event
+
+_DOSSIER = tempfile.mkdtemp(prefix='qcm-tests-')
+_BASE = os.path.join(_DOSSIER, 'qcm_test.db')
+_BASE_INITIALE = os.path.join(_DOSSIER, 'qcm_test_initiale.db')
+os.environ['DATABASE_URL'] = f"sqlite:///{_BASE}"
+os.environ['SESSION_BACKEND'] = 'sqlite'
+os.environ['SESSION_SQLITE_PATH'] = os.path.join(_DOSSIER, 'sessions.db')
+os.environ['ADMIN_PWD'] = 'admin-test'
+os.environ['QCM_ADMIN_PWD'] = 'qcm-test'
+os.environ['PAGE_CACHE'] = '0'
+os.environ['SQL_PROFILING'] = '1'
+os.environ['SQL_SLOW_QUERY_LOG'] = os.path.join(_DOSSIER, 'sql_lentes.log')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as application, cache_pages  # noqa: E402
+from models import db, Chapitre, CompteurQuestions, Question, QuestionsATrous  # noqa: E402
+from services import QCMService, catalogue_cache  # noqa: E402
+
+
+def _fermer_base():
+    """Libère les connexions ouvertes sur la base du catalogue"""
+    with application.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+_fermer_base()
+shutil.copyfile(_BASE, _BASE_INITIALE)
+
+
+@pytest.fixture(autouse=True)
+def base_initiale():
+    """Remet la base initiale et vide les caches en mémoire avant chaque test"""
+    _fermer_base()
+    shutil.copyfile(_BASE_INITIALE, _BASE)
+    catalogue_cache.invalider()
+    cache_pages.vider()
+    yield
+
+
+@pytest.fixture
+def app():
+    application.config['TESTING'] = True
+    return application
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    client.post('/login_ressources', data={'mot_de_passe': os.environ['ADMIN_PWD']})
+    return client
+
+
+class CompteurRequetes:
+    """Compte les requêtes SQL exécutées par le moteur du catalogue"""
+
+    def __init__(self, moteur):
+        self.moteur = moteur
+        self.requetes = []
+
+    def _compter(self, conn, cursor, statement, parameters, context, executemany):
+        self.requetes.append(statement)
+
+    def __enter__(self):
+        self.requetes = []
+        event.listen(self.moteur, 'before_cursor_execute', self._compter)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.moteur, 'before_cursor_execute', self._compter)
+
+    def __len__(self):
+        return len(self.requetes)
+
+
+@pytest.fixture
+def compter_requetes(app):
+    """Fabrique de CompteurRequetes : `with compter_requetes() as requetes: ...`"""
+    with app.app_context():
+        moteur = db.engine
+    return lambda: CompteurRequetes(moteur)
+
+
+@pytest.fixture
+def ajouter_questions(app):
+    """
+    Ajoute `nombre` questions QCM et `nombre` questions à trous, réparties dans quatre
+    nouveaux chapitres du niveau du premier chapitre ; renvoie le nom de ce niveau
+    """
+    def ajouter(nombre):
+        with app.app_context():
+            niveau = Chapitre.query.order_by(Chapitre.id).first().niveau
+            ordre = Chapitre.query.count()
+            chapitres = [Chapitre(nom=f'chapitre_test_{ordre + i}', titre=f'Chapitre de test {ordre + i}',
+                                  description='', pages='', ordre=ordre + i, niveau_id=niveau.id)
+                         for i in range(4)]
+            db.session.add_all(chapitres)
+            db.session.flush()
+            for i in range(nombre):
+                chapitre = chapitres[i % len(chapitres)]
+                db.session.add(Question(
+                    probleme=f'Question supplémentaire {i}', option_a='a', option_b='b',
+                    option_c='c', option_d='d', reponse_correcte=i % 4,
+                    explication='explication', difficulte='facile', chapitre_id=chapitre.id
+                ))
+                question = QuestionsATrous(
+                    probleme=f'Le [TROU] numéro {i}', results=['mot'], distracteurs=[['autre']],
+                    difficulte='facile', chapitre_id=chapitre.id
+                )
+                question.mettre_a_jour_html()
+                db.session.add(question)
+            db.session.flush()
+            CompteurQuestions.reconstruire()
+            QCMService.valider_catalogue()
+            return niveau.nom
+    return ajouter
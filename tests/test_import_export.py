@@ -0,0 +1,40 @@
+"""Lecture des tableaux JSON importés au fil de l'eau"""
+
+import io
+
+import pytest
+
+import import_export
+from import_export import ErreurImport, lire_enregistrements
+
+
+@pytest.fixture(params=[import_export.TAILLE_BLOC, 1], ids=['bloc', 'caractere'])
+def taille_bloc(request, monkeypatch):
+    """Lecture par blocs normaux, puis caractère par caractère (éléments coupés entre deux blocs)"""
+    monkeypatch.setattr(import_export, 'TAILLE_BLOC', request.param)
+
+
+def _lire(texte):
+    return list(lire_enregistrements(io.StringIO(texte)))
+
+
+@pytest.mark.parametrize('texte, attendu', [
+    ('[]', []),
+    (' [ ] ', []),
+    ('[{"a": 1}]', [(1, {'a': 1})]),
+    ('[{"a": 1} , {"b": 22}\n]', [(1, {'a': 1}), (2, {'b': 22})]),
+])
+def test_tableaux_valides(taille_bloc, texte, attendu):
+    assert _lire(texte) == attendu
+
+
+@pytest.mark.parametrize('texte', ['[{},,{}]', '[{},]', '[,{}]', '[,]', '[{} {}]', '[{}', '[{},'])
+def test_tableaux_mal_formes(taille_bloc, texte):
+    with pytest.raises(ErreurImport):
+        _lire(texte)
+
+
+def test_import_api_refuse_un_element_vide(admin_client):
+    reponse = admin_client.post('/admin/api/import', data='[{},,{}]')
+    assert reponse.status_code == 400
+    assert 'JSON invalide' in reponse.get_json()['error']
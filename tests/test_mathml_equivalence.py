@@ -0,0 +1,128 @@
+"""
+Équivalence des implémentations de mathml_utils avec les anciennes (mathml_reference)
+sur les exemples de la documentation et des corpus générés par benchmark_mathml,
+et non-régression des formes que l'ancien analyseur rendait en texte brut
+(produits implicites, nombres décimaux à virgule)
+"""
+
+import random
+import sys
+
+import pytest
+
+import benchmark_mathml
+import mathml_reference
+import mathml_utils
+
+GRAINES = (42, 7)
+TAILLE_CORPUS = 400
+
+# Rendus attendus des produits implicites et des décimaux à virgule : les
+# parenthèses d'un facteur juxtaposé sont conservées, 3,5 reste un seul nombre
+CORPUS_NON_REGRESSION = {
+    '3(2x - 5)': '<mn>3</mn><mo>(</mo><mi>2x</mi><mo>-</mo><mn>5</mn><mo>)</mo>',
+    '2(x+1) - 3': '<mn>2</mn><mo>(</mo><mi>x</mi><mo>+</mo><mn>1</mn><mo>)</mo><mo>-</mo><mn>3</mn>',
+    '(a+b)(a-b)': '<mo>(</mo><mi>a</mi><mo>+</mo><mi>b</mi><mo>)</mo>'
+                  '<mo>(</mo><mi>a</mi><mo>-</mo><mi>b</mi><mo>)</mo>',
+    'sqrt(x)(y)': '<msqrt><mi>x</mi></msqrt><mo>(</mo><mi>y</mi><mo>)</mo>',
+    '-(a+b)(c)': '<mi>-(a+b)</mi><mo>(</mo><mi>c</mi><mo>)</mo>',
+    '(a+b)*2': '<mi>a</mi><mo>+</mo><mi>b</mi><mo>×</mo><mn>2</mn>',
+    '3,5 + 2': '<mn>3,5</mn><mo>+</mo><mn>2</mn>',
+    '-3,5 * x': '<mn>-3,5</mn><mo>×</mo><mi>x</mi>',
+    '2,5(x - 1,25)': '<mn>2,5</mn><mo>(</mo><mi>x</mi><mo>-</mo><mn>1,25</mn><mo>)</mo>',
+    'frac(3,5)': '<mfrac><mn>3</mn><mn>5</mn></mfrac>',
+    'pow(1,5, 2)': '<mi>pow(1,5, 2)</mi>',
+    'frac((1,5), 2)': '<mfrac><mn>1,5</mn><mn>2</mn></mfrac>',
+    'x, y': '<mi>x</mi><mi>,</mi><mi>y</mi>',
+}
+
+
+@pytest.fixture(autouse=True)
+def sans_limites(app):
+    """Les anciennes implémentations n'ont pas de limites d'analyse : comparer sans garde"""
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    mathml_utils.configurer_limites_mathml(None, None, None)
+    yield
+    mathml_utils.configurer_limites_mathml(app.config['MATHML_MAX_LENGTH'], app.config['MATHML_MAX_DEPTH'],
+                                           app.config['MATHML_MAX_NODES'])
+
+
+def _divergences(fonction, entrees):
+    nouvelle = getattr(mathml_utils, fonction)
+    ancienne = getattr(mathml_reference, fonction)
+    return [entree for entree in entrees if str(nouvelle(entree)) != str(ancienne(entree))]
+
+
+def test_expressions_des_exemples():
+    assert _divergences('parse_math_expression', benchmark_mathml.corpus_exemples()) == []
+
+
+@pytest.mark.parametrize('graine', GRAINES)
+def test_expressions_generees(graine):
+    rng = random.Random(graine)
+    expressions = [benchmark_mathml.generer_expression(rng, rng.randint(1, 4)) for _ in range(TAILLE_CORPUS)]
+    # Les expressions dont le rendu de référence est cassé ne sont pas comparées
+    expressions = [expr for expr in expressions
+                   if benchmark_mathml.mathml_bien_forme(mathml_reference.parse_math_expression(expr))]
+    assert expressions
+    assert _divergences('parse_math_expression', expressions) == []
+
+
+@pytest.mark.parametrize('expression', CORPUS_NON_REGRESSION)
+def test_corpus_non_regression(expression):
+    assert mathml_utils.parse_math_expression(expression) == CORPUS_NON_REGRESSION[expression]
+
+
+def _decimal(rng):
+    return f"{rng.randint(0, 99)},{rng.randint(0, 99)}"
+
+
+@pytest.mark.parametrize('graine', GRAINES)
+def test_produits_implicites_generes(graine):
+    """k(E1)(E2)... : chaque groupe garde ses parenthèses autour du rendu de son contenu"""
+    rng = random.Random(graine)
+    for _ in range(TAILLE_CORPUS):
+        coefficient = rng.choice(['2', '3', 'x', 'aire', _decimal(rng), f"sqrt({_decimal(rng)})"])
+        groupes = [benchmark_mathml.generer_expression(rng, rng.randint(1, 3)) for _ in range(rng.randint(1, 3))]
+        expr = coefficient + ''.join(f"({groupe})" for groupe in groupes)
+        attendu = mathml_utils.parse_math_expression(coefficient) + ''.join(
+            f"<mo>(</mo>{mathml_utils.parse_math_expression(groupe)}<mo>)</mo>" for groupe in groupes)
+        rendu = mathml_utils.parse_math_expression(expr)
+        assert rendu == attendu, expr
+        assert benchmark_mathml.mathml_bien_forme(rendu), expr
+
+
+@pytest.mark.parametrize('graine', GRAINES)
+def test_decimaux_a_virgule_generes(graine):
+    """Un décimal à virgule donne un seul <mn>, sauf entre les arguments d'une fonction"""
+    rng = random.Random(graine)
+    for _ in range(TAILLE_CORPUS):
+        nombres = [_decimal(rng) for _ in range(rng.randint(1, 4))]
+        operateurs = [rng.choice('+-*/') for _ in nombres[1:]]
+        espace = rng.choice(['', ' '])
+        expr = nombres[0] + ''.join(f"{espace}{op}{espace}{nombre}" for op, nombre in zip(operateurs, nombres[1:]))
+        attendu = f"<mn>{nombres[0]}</mn>" + ''.join(
+            f"<mo>{mathml_utils._SYMBOLES_OPERATEURS[op]}</mo><mn>{nombre}</mn>"
+            for op, nombre in zip(operateurs, nombres[1:]))
+        assert mathml_utils.parse_math_expression(expr) == attendu, expr
+
+        numerateur, denominateur = nombres[0].split(',')
+        assert mathml_utils.parse_math_expression(f"frac({nombres[0]})") == \
+            f"<mfrac><mn>{numerateur}</mn><mn>{denominateur}</mn></mfrac>"
+
+
+@pytest.mark.parametrize('graine', GRAINES)
+def test_enonces(graine):
+    """Corpus de non-régression de convert_math_notation : notations valides, invalides et crochets simples"""
+    rng = random.Random(graine)
+    textes = list(mathml_utils.EXAMPLES.values()) + [benchmark_mathml.generer_texte(rng) for _ in range(TAILLE_CORPUS)]
+    assert _divergences('convert_math_notation', textes) == []
+
+
+@pytest.mark.parametrize('graine', GRAINES)
+@pytest.mark.parametrize('fonction', ['strip_paragraphs', 'clean_display_filter'])
+def test_nettoyage_html(graine, fonction):
+    rng = random.Random(graine)
+    fragments = [benchmark_mathml.generer_html(rng) for _ in range(TAILLE_CORPUS * 5)]
+    fragments += list(benchmark_mathml.cas_de_mesure_nettoyage().values())
+    assert _divergences(fonction, fragments) == []
@@ -0,0 +1,63 @@
+"""Synchronisation avec qcm_optimise.json et conversion des colonnes JSON (migration_sqlalchemy)"""
+
+import json
+
+import pytest
+from sqlalchemy import text
+
+import migration_sqlalchemy
+from models import db, Question, QuestionsATrous
+
+
+@pytest.fixture(autouse=True)
+def fermer_base_migration():
+    """Le script a sa propre application : ses connexions sont fermées avant la remise de la base initiale"""
+    yield
+    with migration_sqlalchemy.app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def fichier_vide(tmp_path):
+    """Fichier de synchronisation sans aucune question"""
+    chemin = tmp_path / 'qcm_optimise.json'
+    chemin.write_text(json.dumps({'questions': {}, 'tags': {}, 'chapitres_info': {}}), encoding='utf-8')
+    return str(chemin)
+
+
+def _nb_questions():
+    with migration_sqlalchemy.app.app_context():
+        return Question.query.count()
+
+
+def test_sync_conserve_les_questions_absentes_du_fichier(fichier_vide):
+    nombre = _nb_questions()
+    assert nombre
+    assert migration_sqlalchemy.synchroniser_donnees(chemin=fichier_vide)
+    assert _nb_questions() == nombre
+
+
+def test_sync_supprimer(fichier_vide):
+    assert migration_sqlalchemy.synchroniser_donnees(chemin=fichier_vide, supprimer=True)
+    assert _nb_questions() == 0
+
+
+def test_conversion_json_decode_une_seule_fois(ajouter_questions):
+    ajouter_questions(2)
+    with migration_sqlalchemy.app.app_context():
+        ids = [question_id for (question_id,) in
+               db.session.query(QuestionsATrous.id).order_by(QuestionsATrous.id).limit(2)]
+        assert len(ids) == 2
+        # Une chaîne JSON et une liste encodée deux fois
+        bruts = {ids[0]: json.dumps('mot'), ids[1]: json.dumps(json.dumps(['mot']))}
+        for question_id, brut in bruts.items():
+            db.session.execute(text("UPDATE questions_a_trous SET results = :brut WHERE id = :id"),
+                               {'brut': brut, 'id': question_id})
+        db.session.commit()
+
+    assert migration_sqlalchemy.convertir_json()
+
+    with migration_sqlalchemy.app.app_context():
+        assert db.session.get(QuestionsATrous, ids[0]).results == 'mot'
+        assert db.session.get(QuestionsATrous, ids[1]).results == ['mot']
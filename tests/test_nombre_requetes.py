@@ -0,0 +1,105 @@
+"""
+Nombre de requêtes SQL par page : il ne doit pas dépendre de la taille du catalogue
+(pas de requête par question affichée ou corrigée).
+"""
+
+from models import Chapitre, Niveau, Question, QuestionsATrous
+from services import catalogue_cache
+
+
+def _ids_niveau(app, modele, niveau):
+    with app.app_context():
+        return [question_id for (question_id,) in modele.query.with_entities(modele.id).join(
+            Chapitre).join(Niveau).filter(Niveau.nom == niveau).order_by(modele.id)]
+
+
+def _niveau_ajouts(app):
+    """Niveau du premier chapitre, où ajouter_questions ajoute ses questions"""
+    with app.app_context():
+        return Chapitre.query.order_by(Chapitre.id).first().niveau.nom
+
+
+def _requetes_a_froid(client, compter_requetes, url):
+    """Requêtes d'un GET sur `url`, caches du catalogue vides"""
+    catalogue_cache.invalider()
+    with compter_requetes() as requetes:
+        reponse = client.get(url)
+    assert reponse.status_code == 200
+    return len(requetes)
+
+
+def _mesurer(app, client, compter_requetes, ajouter_questions, preparer, url):
+    """Requêtes de `url` après l'ajout de 5 questions de chaque type, puis de 40 autres"""
+    niveau = ajouter_questions(5)
+    preparer(niveau)
+    petit = _requetes_a_froid(client, compter_requetes, url)
+    ajouter_questions(40)
+    preparer(niveau)
+    grand = _requetes_a_froid(client, compter_requetes, url)
+    return petit, grand
+
+
+def test_question(app, client, compter_requetes, ajouter_questions):
+    def preparer(niveau):
+        client.get(f'/niveau/{niveau}')
+        with client.session_transaction() as session:
+            session['question_courante'] = len(_ids_niveau(app, Question, niveau)) - 1
+
+    petit, grand = _mesurer(app, client, compter_requetes, ajouter_questions, preparer, '/question')
+    assert petit == grand
+
+
+def test_resultats(app, client, compter_requetes, ajouter_questions):
+    def preparer(niveau):
+        client.get(f'/niveau/{niveau}')
+        ids = _ids_niveau(app, Question, niveau)
+        with client.session_transaction() as session:
+            session['question_ids'] = ids
+            session['reponses'] = [0] * len(ids)
+
+    petit, grand = _mesurer(app, client, compter_requetes, ajouter_questions, preparer, '/resultats')
+    assert petit == grand
+
+
+def test_resultats_trous(app, client, compter_requetes, ajouter_questions):
+    def preparer(niveau):
+        with client.session_transaction() as session:
+            session['reponses_a_trous'] = {
+                str(question_id): ['mot'] for question_id in _ids_niveau(app, QuestionsATrous, niveau)
+            }
+
+    petit, grand = _mesurer(app, client, compter_requetes, ajouter_questions, preparer, '/resultats_trous')
+    assert petit == grand
+
+
+def test_admin_api_questions(app, admin_client, compter_requetes, ajouter_questions):
+    petit, grand = _mesurer(app, admin_client, compter_requetes, ajouter_questions,
+                            lambda niveau: None, '/admin/api/questions?limit=500')
+    assert petit == grand
+
+
+def test_lancer_test_trous(app, client, compter_requetes, ajouter_questions):
+    """Chaque étape ne charge que la question courante, sans ses mots JSON"""
+    def preparer(niveau):
+        client.get('/annuler_test_trous')
+
+    petit, grand = _mesurer(app, client, compter_requetes, ajouter_questions, preparer,
+                            f'/lancer_test_trous/{_niveau_ajouts(app)}')
+    assert petit == grand
+
+    with compter_requetes() as requetes:
+        client.get(f'/lancer_test_trous/{_niveau_ajouts(app)}')
+    lectures = [requete for requete in requetes.requetes if 'FROM questions_a_trous' in requete]
+    assert lectures and not any('questions_a_trous.results' in requete for requete in lectures)
+
+
+def test_lancer_test_trous_parcourt_le_niveau(app, client, ajouter_questions):
+    niveau = ajouter_questions(5)
+    attendus = _ids_niveau(app, QuestionsATrous, niveau)
+    client.get('/annuler_test_trous')
+    assert client.get(f'/lancer_test_trous/{niveau}').status_code == 200
+    for _ in attendus:
+        client.post(f'/lancer_test_trous/{niveau}', data={'reponses_a_trous': '["mot"]'})
+    assert attendus
+    with client.session_transaction() as session:
+        assert sorted(int(question_id) for question_id in session['reponses_a_trous']) == attendus
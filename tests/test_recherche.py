@@ -0,0 +1,105 @@
+"""
+Recherche plein texte dans les questions à trous (mots attendus et distracteurs en JSON)
+et pagination des recherches de la liste d'administration
+"""
+
+import pytest
+from sqlalchemy import text
+
+import recherche
+from models import db, Chapitre, QuestionsATrous
+from services import QCMService
+
+
+@pytest.fixture
+def question_accentuee(app):
+    with app.app_context():
+        chapitre = Chapitre.query.order_by(Chapitre.id).first()
+        question = QuestionsATrous(
+            probleme='Résoudre une [TROU] du premier degré', results=['équation'],
+            distracteurs=[['dérivée', 'inéquation']], difficulte='facile', chapitre_id=chapitre.id
+        )
+        question.mettre_a_jour_html()
+        db.session.add(question)
+        QCMService.valider_catalogue()
+        question_id = question.id
+    yield question_id
+    with app.app_context():
+        db.session.delete(db.session.get(QuestionsATrous, question_id))
+        QCMService.valider_catalogue()
+
+
+def _ids_trouves(client, saisie):
+    reponse = client.get('/admin/api/questions_trous', query_string={'q': saisie, 'limit': 500})
+    assert reponse.status_code == 200
+    return [question['id'] for question in reponse.get_json()['questions']]
+
+
+@pytest.mark.parametrize('saisie', ['équation', 'equation', 'derivee', 'dérivée', 'inéqu'])
+def test_mots_accentues_trouves(admin_client, question_accentuee, saisie):
+    assert question_accentuee in _ids_trouves(admin_client, saisie)
+
+
+def test_mots_modifies_reindexes(app, admin_client, question_accentuee):
+    with app.app_context():
+        question = db.session.get(QuestionsATrous, question_accentuee)
+        question.results = ['intégrale']
+        db.session.commit()
+        QCMService.valider_catalogue()
+    assert question_accentuee in _ids_trouves(admin_client, 'integrale')
+    assert question_accentuee not in _ids_trouves(admin_client, 'equation')
+
+
+def test_index_existant_reconstruit_avec_les_mots_decodes(app, admin_client, question_accentuee):
+    """Une base dont l'index contient le JSON brut est réindexée par installer_recherche"""
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(text('DROP TRIGGER questions_a_trous_fts_ai'))
+            conn.execute(text("INSERT INTO questions_a_trous_fts(questions_a_trous_fts) VALUES ('rebuild')"))
+        assert any('questions_a_trous_fts' in changement for changement in recherche.installer_recherche())
+        assert recherche.installer_recherche() == []
+    assert question_accentuee in _ids_trouves(admin_client, 'équation')
+
+
+@pytest.mark.parametrize('saisie', ['équation', 'dérivée'])
+def test_recherche_like_sans_fts(app, admin_client, question_accentuee, saisie):
+    with app.app_context():
+        cle = str(db.engine.url)
+    recherche._disponible[cle] = False
+    try:
+        assert question_accentuee in _ids_trouves(admin_client, saisie)
+    finally:
+        recherche._disponible[cle] = True
+
+
+def _page(client, parametres):
+    """Réponse JSON d'une page de /admin/api/questions"""
+    reponse = client.get('/admin/api/questions', query_string=parametres)
+    assert reponse.status_code == 200
+    return reponse.get_json()
+
+
+def _parcourir(client, parametres, cle_suite, parametre_suite):
+    """Ids de toutes les pages de /admin/api/questions, en suivant `cle_suite` de chaque réponse"""
+    ids, suite = [], None
+    while True:
+        page = dict(parametres, limit=7, **({parametre_suite: suite} if suite is not None else {}))
+        donnees = _page(client, page)
+        ids.extend(question['id'] for question in donnees['questions'])
+        suite = donnees[cle_suite]
+        if suite is None:
+            return ids
+
+
+def test_recherche_paginee_par_decalage(app, admin_client, ajouter_questions):
+    ajouter_questions(20)
+    ids = _parcourir(admin_client, {'q': 'supplementaire'}, 'decalage_suivant', 'offset')
+    assert len(ids) == len(set(ids)) == 20
+
+    tous = _parcourir(admin_client, {}, 'curseur_suivant', 'cursor')
+    assert tous == sorted(tous) and set(ids) <= set(tous)
+
+
+@pytest.mark.parametrize('parametres', [{'q': 'supplementaire', 'cursor': 3}, {'offset': 3}])
+def test_curseur_et_decalage_non_melanges(admin_client, parametres):
+    assert admin_client.get('/admin/api/questions', query_string=parametres).status_code == 400
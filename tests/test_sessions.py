@@ -0,0 +1,36 @@
+"""Sessions côté serveur : changement d'identifiant quand les droits changent"""
+
+import os
+
+
+def _sid(client, app):
+    cookie = client.get_cookie(app.config.get('SESSION_COOKIE_NAME', 'session'))
+    return cookie.value if cookie else None
+
+
+def test_connexion_change_identifiant_de_session(app, client):
+    client.get('/niveau/6eme')
+    sid_avant = _sid(client, app)
+    assert sid_avant
+
+    client.post('/login_ressources', data={'mot_de_passe': os.environ['ADMIN_PWD']})
+    sid_apres = _sid(client, app)
+    assert sid_apres and sid_apres != sid_avant
+    assert client.get('/admin').status_code == 200
+
+    # L'identifiant connu avant la connexion ne donne pas accès à l'administration
+    intrus = app.test_client()
+    intrus.set_cookie(app.config.get('SESSION_COOKIE_NAME', 'session'), sid_avant)
+    assert intrus.get('/admin').status_code == 302
+
+
+def test_deconnexion_change_identifiant_de_session(app, admin_client):
+    admin_client.get('/niveau/6eme')
+    sid_admin = _sid(admin_client, app)
+
+    admin_client.get('/logout_ressources')
+    assert _sid(admin_client, app) != sid_admin
+
+    ancien = app.test_client()
+    ancien.set_cookie(app.config.get('SESSION_COOKIE_NAME', 'session'), sid_admin)
+    assert ancien.get('/admin').status_code == 302
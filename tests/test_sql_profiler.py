@@ -0,0 +1,64 @@
+"""Instrumentation SQL (SQL_PROFILING=1 dans conftest) : en-tête Server-Timing et journal des requêtes lentes"""
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import sql_profiler
+from models import db
+
+
+def _metriques(reponse):
+    """{nom: paramètres} des métriques de l'en-tête Server-Timing"""
+    metriques = {}
+    for metrique in reponse.headers['Server-Timing'].split(', '):
+        nom, _, parametres = metrique.partition(';')
+        metriques[nom] = parametres
+    return metriques
+
+
+def _journal(app):
+    for handler in sql_profiler.logger.handlers:
+        handler.flush()
+    with open(app.config['SQL_SLOW_QUERY_LOG'], encoding='utf-8') as fichier:
+        return fichier.read()
+
+
+def test_visiteur_ne_recoit_que_les_durees(client):
+    metriques = _metriques(client.get('/test_trous'))
+    assert metriques['db'].startswith('dur=') and metriques['db'].endswith('queries"')
+    assert 'db-slow-1' in metriques
+    assert all('desc=' not in parametres for nom, parametres in metriques.items() if nom != 'db')
+
+
+def test_administrateur_recoit_le_debut_du_sql(admin_client):
+    metriques = _metriques(admin_client.get('/test_trous'))
+    description = metriques['db-slow-1'].split('desc="', 1)[1]
+    assert description.startswith('SELECT ')
+    assert len(description) <= sql_profiler.TAILLE_DESCRIPTION + 10
+
+
+def test_requete_en_erreur_ne_fausse_pas_les_suivantes(app):
+    with app.test_request_context('/'):
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                db.session.execute(text('SELECT * FROM table_absente'))
+            db.session.rollback()
+        db.session.execute(text('SELECT 1'))
+        metriques = _metriques(app.process_response(app.response_class()))
+
+    assert metriques['db'].endswith('desc="1 queries"')
+    assert float(metriques['db'].split('dur=', 1)[1].split(';')[0]) < 1000
+
+
+@pytest.mark.parametrize('avec_parametres', [False, True])
+def test_journal_des_requetes_lentes(app, admin_client, monkeypatch, avec_parametres):
+    monkeypatch.setitem(app.config, 'SQL_SLOW_QUERY_MS', 0)
+    monkeypatch.setitem(app.config, 'SQL_SLOW_QUERY_LOG_PARAMS', avec_parametres)
+    saisie = f'saisie{int(avec_parametres)}zorglub'
+
+    assert admin_client.get(f'/admin/api/questions?q={saisie}').status_code == 200
+
+    lignes = [ligne for ligne in _journal(app).splitlines() if '/admin/api/questions' in ligne]
+    assert lignes
+    assert any(saisie in ligne for ligne in lignes) == avec_parametres
@@ -0,0 +1,23 @@
+"""Compteurs du rendu MathML exposés à l'administration"""
+
+import mathml_utils
+
+
+def test_acces_reserve_aux_administrateurs(client):
+    assert client.get('/admin/api/statistiques/mathml').status_code == 302
+
+
+def test_compteurs_du_cache_et_des_limites(app, admin_client):
+    avant = admin_client.get('/admin/api/statistiques/mathml').get_json()
+
+    mathml_utils.mathml_filter('[math:x + 1] compteur de test')
+    mathml_utils.mathml_filter('[math:x + 1] compteur de test')
+    mathml_utils.convert_math_notation('[math:' + '+'.join(['x'] * (app.config['MATHML_MAX_LENGTH'] + 1)) + ']')
+
+    reponse = admin_client.get('/admin/api/statistiques/mathml')
+    assert reponse.headers['Cache-Control'] == 'no-store'
+    apres = reponse.get_json()
+    assert apres['cache']['succes'] >= avant['cache']['succes'] + 1
+    assert apres['cache']['echecs'] >= avant['cache']['echecs'] + 1
+    assert apres['limites']['longueur_max'] == app.config['MATHML_MAX_LENGTH']
+    assert apres['limites']['refus']['longueur'] == avant['limites']['refus']['longueur'] + 1